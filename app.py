@@ -17,6 +17,15 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Count and time MongoDB commands and log slow ones; must be registered before any MongoClient is created
+from pymongo import monitoring
+from services.metrics import metrics, mongo_command_metrics
+from services.slow_queries import slow_query_log
+from services.query_counter import query_counter
+monitoring.register(mongo_command_metrics)
+monitoring.register(slow_query_log)
+monitoring.register(query_counter)
+
 # Initialize Flask app
 # Serve static frontend from FRONTEND directory
 app = Flask(__name__, static_folder='FRONTEND', static_url_path='')
@@ -47,6 +56,20 @@ except Exception as e:
     mongo_client = MockMongoClient()
     app.config['MONGO_CLIENT'] = mongo_client
     logger.info("✅ Mock MongoDB initialized")
+    # mongomock emits no command events, so the N+1 detector counts its collection calls instead
+    if query_counter.mode != 'off':
+        query_counter.install_mongomock()
+
+# Slow commands are written to a capped collection and explained through this client
+slow_query_log.set_database(mongo_client['ecofarm-quest'])
+
+# Server-Sent Events configuration
+app.config['STREAM_HEARTBEAT_SECONDS'] = int(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+app.config['STREAM_TRANSPORT'] = os.getenv('STREAM_TRANSPORT', 'memory')  # memory, mongo
+
+# Upload storage configuration
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'cloudinary' if os.getenv('CLOUDINARY_CLOUD_NAME') else 'local')  # local, cloudinary
+app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 
 # Mail Configuration
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -66,13 +89,38 @@ else:
 jwt = JWTManager(app)
 mail = Mail(app)
 
-# Rate limiting
+# Revoked tokens (logout) are checked against an in-memory denylist synced from MongoDB
+from services.revocation import token_denylist
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return token_denylist.is_revoked(jwt_payload['jti'])
+
+# Uploads are written to local disk or Cloudinary depending on STORAGE_BACKEND
+from services.storage import upload_storage
+upload_storage.init_app(app)
+
+# Rate limiting (can be switched off for local load tests)
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"]
 )
 
+# Prometheus metrics (per-route latency, in-flight requests, status counts, MongoDB commands)
+metrics.init_app(app)
+limiter.exempt(app.view_functions['metrics'])
+
+# Request-scoped identity map (repeated loads share an instance, saves are flushed before the response).
+# after_request handlers run in reverse registration order, so registering it after metrics means the
+# flush (and a 500 from a failed flush) is included in the recorded latency and status
+from services.identity import identity_map
+identity_map.init_app(app)
+
+# N+1 query detection in development and tests (QUERY_COUNTER_MODE=warn|raise)
+query_counter.init_app(app)
+
 # Import routes
 from routes.auth import auth_bp
 from routes.users import users_bp
@@ -80,6 +128,9 @@ from routes.courses import courses_bp
 from routes.community import community_bp
 from routes.achievements import achievements_bp
 from routes.upload import upload_bp
+from routes.stream import stream_bp
+from routes.sync import sync_bp
+from routes.admin import admin_bp
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -88,6 +139,51 @@ app.register_blueprint(courses_bp, url_prefix='/api/courses')
 app.register_blueprint(community_bp, url_prefix='/api/community')
 app.register_blueprint(achievements_bp, url_prefix='/api/achievements')
 app.register_blueprint(upload_bp, url_prefix='/api/upload')
+app.register_blueprint(stream_bp, url_prefix='/api/stream')
+app.register_blueprint(sync_bp, url_prefix='/api/sync')
+app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+# Resumable uploads send many small requests; the per-IP limits would stall large files
+limiter.exempt(app.view_functions['upload.upload_session_chunk'])
+limiter.exempt(app.view_functions['upload.get_upload_session'])
+
+# Fan stream events out across workers when running more than one process
+if app.config['STREAM_TRANSPORT'] == 'mongo':
+    from services.events import event_broker, MongoTransport
+    try:
+        event_broker.set_transport(MongoTransport(mongo_client['ecofarm-quest']))
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to start Mongo stream transport, using in-process delivery: {e}")
+
+# Ensure database indexes (TTL retention for notifications, sync idempotency keys, etc.)
+from models.notification import Notification
+from models.learning_event import LearningEvent
+from models.upload import UploadBlob, UploadImage
+from models.community import Discussion, DiscussionReply, UserAchievement, AchievementLeaderboard, CommunityStats, Leaderboard
+from services import progress_sync
+from services.resumable import resumable_uploads
+from services.identity import user_cache
+# Each call gets its own try so one failing index (e.g. on legacy data) does not skip the rest
+for ensure_indexes in (
+    Notification.ensure_indexes,
+    LearningEvent.ensure_indexes,
+    Discussion.ensure_indexes,
+    DiscussionReply.ensure_indexes,
+    UserAchievement.ensure_indexes,
+    AchievementLeaderboard.ensure_indexes,
+    CommunityStats.ensure_indexes,
+    Leaderboard.ensure_indexes,
+    progress_sync.ensure_indexes,
+    UploadBlob.ensure_indexes,
+    UploadImage.ensure_indexes,
+    resumable_uploads.ensure_indexes,
+    token_denylist.ensure_indexes,
+    slow_query_log.ensure_indexes
+):
+    try:
+        ensure_indexes()
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to create database indexes ({ensure_indexes.__module__}.{ensure_indexes.__qualname__}): {e}")
 
 # Error handlers
 @app.errorhandler(404)
@@ -123,6 +219,9 @@ def health_check():
         'database': {
             'mongodb': mongo_status,
             'uri': MONGODB_URI.split('@')[-1] if '@' in MONGODB_URI else MONGODB_URI
+        },
+        'caches': {
+            'users': user_cache.stats()
         }
     })
 
@@ -0,0 +1,135 @@
+import pytest
+import random
+import os
+import sys
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Dataset size and backend (see scripts/run_benchmarks.py)
+BENCHMARK_BACKEND = os.getenv('BENCHMARK_BACKEND', 'mongomock')  # mongomock, mongod
+BENCHMARK_USERS = int(os.getenv('BENCHMARK_USERS', 500))
+BENCHMARK_COURSES = int(os.getenv('BENCHMARK_COURSES', 10))
+BENCHMARK_DISCUSSIONS = int(os.getenv('BENCHMARK_DISCUSSIONS', 2000))
+BENCHMARK_ROUNDS = int(os.getenv('BENCHMARK_ROUNDS', 50))
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+os.environ['SECRET_KEY'] = 'benchmark-secret-key'
+os.environ['JWT_SECRET_KEY'] = 'benchmark-jwt-secret-key'
+if BENCHMARK_BACKEND == 'mongomock':
+    # Nothing listens on port 1, so every model falls back to mongomock
+    os.environ['MONGODB_URI'] = 'mongodb://127.0.0.1:1/ecofarm-quest'
+
+from app import app, limiter
+from flask_jwt_extended import create_access_token
+from mongomock import MongoClient as MockMongoClient
+from models.user import User, users_collection
+from models.course import Course, courses_collection, lessons_collection, quizzes_collection
+from models.community import (
+    Discussion, Leaderboard, CommunityStats, discussions_collection, replies_collection, leaderboard_collection,
+    leaderboard_daily_collection, user_achievements_collection, achievement_leaderboard_collection,
+    user_activity_collection
+)
+from models.progress import (
+    CourseProgress, user_progress_collection, course_progress_collection, lesson_progress_collection
+)
+from models.learning_event import learning_events_collection
+from models.notification import notifications_collection
+from scripts.seed_database import create_sample_lessons, create_sample_quiz
+
+VILLAGES = ['Green Valley', 'Sunrise Farm', 'Eco Fields', 'River Bend', 'Hill Top']
+DISTRICTS = ['Nashik', 'Pune', 'Satara']
+CATEGORIES = ['water', 'soil', 'crops', 'general']
+TOPICS = ['irrigation', 'composting', 'pest control', 'crop rotation', 'drip lines', 'organic manure']
+
+# Collections holding per-user documents created while seeding or benchmarking
+USER_COLLECTIONS = [
+    (user_progress_collection, 'user_id'), (course_progress_collection, 'user_id'),
+    (lesson_progress_collection, 'user_id'), (learning_events_collection, 'user_id'),
+    (notifications_collection, 'user_id'), (leaderboard_collection, 'user_id'),
+    (leaderboard_daily_collection, 'user_id'), (user_achievements_collection, 'user_id'),
+    (achievement_leaderboard_collection, 'user_id'), (user_activity_collection, '_id'),
+    (discussions_collection, 'author_id'), (replies_collection, 'author_id')
+]
+
+class Dataset:
+    """Seeded users, courses and discussions shared by every benchmark"""
+
+    def __init__(self):
+        self.users = []
+        self.tokens = []
+        self.courses = []
+        self.lessons = {}
+        self.quizzes = {}
+
+    def seed(self):
+        rng = random.Random(42)
+        # One hash for every user: login cost is the same and seeding stays fast
+        password = User.hash_password(BENCHMARK_PASSWORD)
+        for i in range(BENCHMARK_USERS):
+            user = User(
+                name=f'Benchmark Farmer {i}',
+                email=f'farmer{i}@benchmark.invalid',
+                password=password,
+                location=f'{rng.choice(VILLAGES)}, {rng.choice(DISTRICTS)}',
+                is_verified=True
+            ).save()
+            self.users.append(user)
+            Leaderboard.update_user_rank(user.id, rng.randint(0, 5000))
+        with app.app_context():
+            self.tokens = [create_access_token(identity=user.id) for user in self.users]
+
+        for i in range(BENCHMARK_COURSES):
+            course = Course(
+                title=f'Benchmark Course {i}',
+                description=f'Benchmark course about {rng.choice(TOPICS)}',
+                category=CATEGORIES[i % len(CATEGORIES)]
+            ).save()
+            create_sample_lessons(course.id, course.title)
+            create_sample_quiz(course.id, course.title)
+            self.courses.append(course)
+            self.lessons[course.id] = [str(lesson['_id']) for lesson in lessons_collection.find({'course_id': course.id})]
+            self.quizzes[course.id] = str(quizzes_collection.find_one({'course_id': course.id})['_id'])
+
+        # User i is enrolled in course i % BENCHMARK_COURSES
+        for i, user in enumerate(self.users):
+            CourseProgress(user_id=user.id, course_id=self.courses[i % len(self.courses)].id).save()
+
+        for i in range(BENCHMARK_DISCUSSIONS):
+            author = self.users[i % len(self.users)]
+            topic = rng.choice(TOPICS)
+            Discussion(
+                title=f'Question about {topic} #{i}',
+                content=f'How do you handle {topic} on a small farm?',
+                category=rng.choice(CATEGORIES),
+                author_id=author.id,
+                author_name=author.name
+            ).save()
+        return self
+
+    def clean(self):
+        """Remove everything the benchmarks created (matters when running against a shared mongod)"""
+        user_ids = [user.id for user in self.users]
+        for collection, field in USER_COLLECTIONS:
+            collection.delete_many({field: {'$in': user_ids}})
+        users_collection.delete_many({'email': {'$regex': r'@benchmark\.invalid$'}})
+        lessons_collection.delete_many({'course_id': {'$in': list(self.lessons)}})
+        quizzes_collection.delete_many({'course_id': {'$in': list(self.quizzes)}})
+        courses_collection.delete_many({'title': {'$regex': '^Benchmark Course '}})
+        CommunityStats.reconcile()
+
+@pytest.fixture(scope='session')
+def dataset():
+    """Seed the benchmark dataset once per run"""
+    if BENCHMARK_BACKEND == 'mongod' and isinstance(users_collection.database.client, MockMongoClient):
+        pytest.exit(f"BENCHMARK_BACKEND=mongod but no MongoDB answered at {os.getenv('MONGODB_URI')}")
+    # Benchmarks replay many requests from one address
+    limiter.enabled = False
+    data = Dataset().seed()
+    yield data
+    data.clean()
+
+@pytest.fixture(scope='session')
+def client(dataset):
+    """Test client bound to the seeded app"""
+    return app.test_client()
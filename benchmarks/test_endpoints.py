@@ -0,0 +1,58 @@
+from itertools import count
+from conftest import BENCHMARK_ROUNDS, BENCHMARK_PASSWORD
+
+def run(benchmark, client, request, expected_status=200):
+    """Benchmark one request function (called with the round number) for a fixed number of rounds"""
+    rounds = count()
+
+    def call():
+        response = request(next(rounds))
+        assert response.status_code == expected_status, response.get_data(as_text=True)
+
+    benchmark.pedantic(call, rounds=BENCHMARK_ROUNDS, warmup_rounds=1, iterations=1)
+
+def auth(dataset, i):
+    return {'Authorization': f'Bearer {dataset.tokens[i % len(dataset.tokens)]}'}
+
+def test_login(benchmark, client, dataset):
+    users = dataset.users
+    run(benchmark, client, lambda i: client.post('/api/auth/login', json={
+        'email': users[i % len(users)].email, 'password': BENCHMARK_PASSWORD
+    }))
+
+def test_get_courses(benchmark, client, dataset):
+    run(benchmark, client, lambda i: client.get('/api/courses/'))
+
+def test_get_course(benchmark, client, dataset):
+    courses = dataset.courses
+    run(benchmark, client, lambda i: client.get(f'/api/courses/{courses[i % len(courses)].id}'))
+
+def test_complete_lesson(benchmark, client, dataset):
+    def complete(i):
+        # User i is enrolled in course i % courses; each pass over the users moves on to the next lesson
+        course = dataset.courses[i % len(dataset.users) % len(dataset.courses)]
+        lessons = dataset.lessons[course.id]
+        lesson_id = lessons[(i // len(dataset.users)) % len(lessons)]
+        return client.post(f'/api/courses/{course.id}/lessons/{lesson_id}/complete',
+                           headers=auth(dataset, i), json={'time_spent': 5})
+    run(benchmark, client, complete)
+
+def test_submit_quiz(benchmark, client, dataset):
+    def submit(i):
+        course = dataset.courses[i % len(dataset.courses)]
+        return client.post(f'/api/courses/{course.id}/quiz/{dataset.quizzes[course.id]}/submit',
+                           headers=auth(dataset, i), json={'answers': [3, i % 4]})
+    run(benchmark, client, submit)
+
+def test_get_discussions(benchmark, client, dataset):
+    run(benchmark, client, lambda i: client.get('/api/community/discussions?limit=20'))
+
+def test_get_discussions_search(benchmark, client, dataset):
+    run(benchmark, client, lambda i: client.get('/api/community/discussions?search=irrigation&limit=20'))
+
+def test_get_leaderboard(benchmark, client, dataset):
+    run(benchmark, client, lambda i: client.get('/api/community/leaderboard?limit=50'))
+
+def test_update_leaderboard(benchmark, client, dataset):
+    run(benchmark, client, lambda i: client.post('/api/community/leaderboard/update',
+                                                 headers=auth(dataset, i), json={'points': 1000 + i}))
@@ -3,12 +3,14 @@ from .course import Course, Lesson, Quiz, QuizQuestion
 from .progress import UserProgress, CourseProgress, LessonProgress
 from .community import Discussion, DiscussionReply, Achievement, Leaderboard
 from .notification import Notification
+from .learning_event import LearningEvent
 
 __all__ = [
     'User',
     'Course', 'Lesson', 'Quiz', 'QuizQuestion',
     'UserProgress', 'CourseProgress', 'LessonProgress',
     'Discussion', 'DiscussionReply', 'Achievement', 'Leaderboard',
-    'Notification'
+    'Notification',
+    'LearningEvent'
 ]
 
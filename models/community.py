@@ -1,6 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReturnDocument, DESCENDING, ASCENDING
+from models.user import users_collection
+from services.profiles import profile_store, avatar_emoji
+from services.events import event_broker
+from services.achievements import achievement_engine, parse_requirement
+from services.identity import user_cache
+import base64
+import re
 import os
 
 # MongoDB connection with fallback to mock for development
@@ -18,7 +25,35 @@ db = client['ecofarm-quest']
 discussions_collection = db['discussions']
 replies_collection = db['discussion_replies']
 achievements_collection = db['achievements']
+user_achievements_collection = db['user_achievements']
+achievement_leaderboard_collection = db['achievement_leaderboard']
 leaderboard_collection = db['leaderboard']
+leaderboard_daily_collection = db['leaderboard_daily_scores']
+leaderboard_windows_collection = db['leaderboard_windows']
+community_stats_collection = db['community_stats']
+user_activity_collection = db['user_activity']
+
+# Users count as active if they posted or made progress within this many days
+COMMUNITY_ACTIVE_WINDOW_DAYS = int(os.getenv('COMMUNITY_ACTIVE_WINDOW_DAYS', 7))
+COMMUNITY_TOP_CATEGORIES = 5
+COMMUNITY_STATS_ID = 'global'
+
+def record_user_stat(user_id, stat, amount=1):
+    """Count a community action in the user's learning_stats and evaluate the achievements on it"""
+    if not user_id or not ObjectId.is_valid(user_id):
+        return []
+    previous = users_collection.find_one_and_update(
+        {'_id': ObjectId(user_id)},
+        {'$inc': {f'learning_stats.{stat}': amount}},
+        projection={'learning_stats': 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return []
+    user_cache.invalidate(user_id)
+    previous_stats = previous.get('learning_stats') or {}
+    stats = dict(previous_stats, **{stat: previous_stats.get(stat, 0) + amount})
+    return achievement_engine.on_stats_changed(user_id, stats, previous_stats)
 
 class Discussion:
     def __init__(self, **kwargs):
@@ -66,8 +101,10 @@ class Discussion:
         """Save discussion to database"""
         discussion_data = self.to_dict()
         if self.id:
-            # Update existing discussion
+            # Update existing discussion (to_dict() renders dates as strings; keep the stored datetimes)
             discussion_data['updated_at'] = datetime.utcnow()
+            discussion_data['last_reply_at'] = self.last_reply_at
+            discussion_data.pop('created_at')
             discussions_collection.update_one(
                 {'_id': ObjectId(self.id)},
                 {'$set': {k: v for k, v in discussion_data.items() if k != 'id'}}
@@ -78,8 +115,16 @@ class Discussion:
             discussion_data['updated_at'] = datetime.utcnow()
             result = discussions_collection.insert_one(discussion_data)
             self.id = str(result.inserted_id)
+            CommunityStats.increment(discussions=1, category=self.category)
+            CommunityStats.record_activity(self.author_id)
+            record_user_stat(self.author_id, 'discussions_started')
         return self
 
+    @staticmethod
+    def ensure_indexes():
+        """Create the author index (used to propagate profile changes)"""
+        discussions_collection.create_index('author_id')
+
     @staticmethod
     def find_by_id(discussion_id):
         """Find discussion by ID"""
@@ -131,12 +176,16 @@ class Discussion:
         if author_id not in self.participants:
             self.participants.append(author_id)
         self.save()
+        if author_id != self.author_id:
+            # Answering someone else's question counts towards the helpful-farmer achievements
+            record_user_stat(author_id, 'helpful_actions')
 
     def like_discussion(self, user_id):
         """Like a discussion"""
         # In a real implementation, you'd track who liked what
         self.like_count += 1
         self.save()
+        record_user_stat(self.author_id, 'total_likes')
 
 class DiscussionReply:
     def __init__(self, **kwargs):
@@ -170,8 +219,9 @@ class DiscussionReply:
         """Save reply to database"""
         reply_data = self.to_dict()
         if self.id:
-            # Update existing reply
+            # Update existing reply (created_at stays a datetime for cursor pagination)
             reply_data['updated_at'] = datetime.utcnow()
+            reply_data.pop('created_at')
             replies_collection.update_one(
                 {'_id': ObjectId(self.id)},
                 {'$set': {k: v for k, v in reply_data.items() if k != 'id'}}
@@ -182,8 +232,33 @@ class DiscussionReply:
             reply_data['updated_at'] = datetime.utcnow()
             result = replies_collection.insert_one(reply_data)
             self.id = str(result.inserted_id)
+            CommunityStats.increment(replies=1)
+            CommunityStats.record_activity(self.author_id)
+            self.publish_created()
         return self
 
+    def publish_created(self):
+        """Push the new reply to everyone participating in the thread"""
+        discussion_data = None
+        if self.discussion_id and ObjectId.is_valid(self.discussion_id):
+            discussion_data = discussions_collection.find_one(
+                {'_id': ObjectId(self.discussion_id)},
+                {'author_id': 1, 'participants': 1}
+            )
+        if not discussion_data:
+            return
+        recipients = set(discussion_data.get('participants', []))
+        recipients.add(discussion_data.get('author_id'))
+        recipients.discard(self.author_id)
+        event_broker.publish('discussion_reply', self.to_dict(), recipients)
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the thread pagination index"""
+        replies_collection.create_index([('discussion_id', 1), ('created_at', 1), ('_id', 1)])
+        # Used to find an author's replies when their profile changes
+        replies_collection.create_index('author_id')
+
     @staticmethod
     def find_by_discussion_id(discussion_id, skip=0, limit=50):
         """Find replies for a discussion"""
@@ -193,6 +268,146 @@ class DiscussionReply:
             replies.append(DiscussionReply(**reply_data))
         return replies
 
+    @staticmethod
+    def encode_cursor(reply):
+        """Opaque cursor pointing just after a reply"""
+        value = f"{reply.created_at.isoformat()}|{reply.id}"
+        return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor into (created_at, ObjectId), raising ValueError if malformed"""
+        try:
+            created_at, reply_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            return datetime.fromisoformat(created_at), ObjectId(reply_id)
+        except Exception:
+            raise ValueError('Invalid cursor')
+
+    @staticmethod
+    def find_page(discussion_id, cursor=None, limit=50):
+        """One page of a thread in (created_at, _id) order, returning (replies, next_cursor)"""
+        query = {'discussion_id': discussion_id}
+        if cursor:
+            created_at, reply_id = DiscussionReply.decode_cursor(cursor)
+            query['$or'] = [
+                {'created_at': {'$gt': created_at}},
+                {'created_at': created_at, '_id': {'$gt': reply_id}}
+            ]
+        replies = []
+        # Fetch one extra reply to know whether another page exists
+        for reply_data in replies_collection.find(query).sort([('created_at', 1), ('_id', 1)]).limit(limit + 1):
+            reply_data['_id'] = str(reply_data['_id'])
+            replies.append(DiscussionReply(**reply_data))
+        next_cursor = DiscussionReply.encode_cursor(replies[limit - 1]) if len(replies) > limit else None
+        return replies[:limit], next_cursor
+
+    @staticmethod
+    def hydrate_authors(items):
+        """Replace stored author name/avatar with current profiles (one batched lookup)"""
+        profiles = profile_store.get_many([item.author_id for item in items])
+        for item in items:
+            profile = profiles.get(item.author_id)
+            if profile:
+                item.author_name = profile['name']
+                item.author_avatar = avatar_emoji(profile['avatar'])
+        return items
+
+def _category_key(category):
+    """Field name for a category counter (dots would be read as a path)"""
+    return str(category or 'general').replace('.', '_').lstrip('$')
+
+class CommunityStats:
+    """Community totals kept in a single document, updated as content and progress are written"""
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the active-user window index"""
+        user_activity_collection.create_index('last_active_at')
+
+    @staticmethod
+    def increment(discussions=0, replies=0, knowledge_points=0, category=None):
+        """Apply counter deltas to the stats document"""
+        deltas = {
+            'total_discussions': discussions,
+            'total_replies': replies,
+            'total_knowledge_points': knowledge_points
+        }
+        if category is not None and discussions:
+            deltas[f'categories.{_category_key(category)}'] = discussions
+        deltas = {field: amount for field, amount in deltas.items() if amount}
+        if deltas:
+            community_stats_collection.update_one(
+                {'_id': COMMUNITY_STATS_ID},
+                {'$inc': deltas, '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+
+    @staticmethod
+    def record_activity(user_id, active_at=None):
+        """Mark a user active, counting them if they were not already active in the window"""
+        if not user_id:
+            return
+        active_at = active_at or datetime.utcnow()
+        window_start = datetime.utcnow() - timedelta(days=COMMUNITY_ACTIVE_WINDOW_DAYS)
+        previous = user_activity_collection.find_one_and_update(
+            {'_id': user_id},
+            {'$max': {'last_active_at': active_at}},
+            upsert=True
+        )
+        was_active = previous is not None and previous.get('last_active_at', window_start) >= window_start
+        if active_at >= window_start and not was_active:
+            # Users leaving the window are only dropped by reconcile()
+            community_stats_collection.update_one(
+                {'_id': COMMUNITY_STATS_ID},
+                {'$inc': {'active_users': 1}, '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+
+    @staticmethod
+    def reconcile():
+        """Recompute every counter from the source collections (run periodically)"""
+        now = datetime.utcnow()
+        categories = {
+            _category_key(count['_id']): count['count'] for count in discussions_collection.aggregate([
+                {'$group': {'_id': '$category', 'count': {'$sum': 1}}}
+            ])
+        }
+        knowledge_points = next(users_collection.aggregate([
+            {'$group': {'_id': None, 'total': {'$sum': '$learning_stats.knowledge_points'}}}
+        ]), {}).get('total', 0)
+        stats = {
+            'total_discussions': discussions_collection.count_documents({}),
+            'total_replies': replies_collection.count_documents({}),
+            'total_knowledge_points': knowledge_points,
+            'active_users': user_activity_collection.count_documents(
+                {'last_active_at': {'$gte': now - timedelta(days=COMMUNITY_ACTIVE_WINDOW_DAYS)}}
+            ),
+            'categories': categories,
+            'updated_at': now,
+            'reconciled_at': now
+        }
+        community_stats_collection.replace_one({'_id': COMMUNITY_STATS_ID}, stats, upsert=True)
+        return stats
+
+    @staticmethod
+    def get():
+        """Read the stats document, building it on first use"""
+        stats = community_stats_collection.find_one({'_id': COMMUNITY_STATS_ID})
+        if not stats or 'reconciled_at' not in stats:
+            stats = CommunityStats.reconcile()
+        top_categories = sorted(stats.get('categories', {}).items(), key=lambda item: item[1], reverse=True)
+        return {
+            'total_discussions': stats.get('total_discussions', 0),
+            'total_replies': stats.get('total_replies', 0),
+            'active_users': stats.get('active_users', 0),
+            'active_window_days': COMMUNITY_ACTIVE_WINDOW_DAYS,
+            'total_knowledge_points': stats.get('total_knowledge_points', 0),
+            'top_categories': [
+                {'name': name, 'count': count} for name, count in top_categories[:COMMUNITY_TOP_CATEGORIES] if count > 0
+            ],
+            'updated_at': stats['updated_at'].isoformat() if stats.get('updated_at') else None
+        }
+
 class Achievement:
     def __init__(self, **kwargs):
         self.id = kwargs.get('_id')
@@ -220,7 +435,8 @@ class Achievement:
         }
 
     def save(self):
-        """Save achievement to database"""
+        """Save achievement to database (raises UnknownRequirementError for a requirement no stat is kept for)"""
+        parse_requirement(self.requirement)
         achievement_data = self.to_dict()
         if self.id:
             achievements_collection.update_one(
@@ -231,6 +447,7 @@ class Achievement:
             achievement_data['created_at'] = datetime.utcnow()
             result = achievements_collection.insert_one(achievement_data)
             self.id = str(result.inserted_id)
+        achievement_engine.invalidate()
         return self
 
     @staticmethod
@@ -251,6 +468,197 @@ class Achievement:
             achievements.append(Achievement(**achievement_data))
         return achievements
 
+class UserAchievement:
+    def __init__(self, **kwargs):
+        self.id = kwargs.get('_id')
+        self.user_id = kwargs.get('user_id')
+        self.achievement_id = kwargs.get('achievement_id')
+        self.points = kwargs.get('points', 0)
+        self.unlocked_at = kwargs.get('unlocked_at', datetime.utcnow())
+
+    def to_dict(self):
+        """Convert user achievement object to dictionary"""
+        return {
+            'id': str(self.id) if self.id else None,
+            'user_id': self.user_id,
+            'achievement_id': self.achievement_id,
+            'points': self.points,
+            'unlocked_at': self.unlocked_at.isoformat() if self.unlocked_at else None
+        }
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the unlock index (one unlock per user per achievement)"""
+        user_achievements_collection.create_index([('user_id', 1), ('achievement_id', 1)], unique=True)
+
+    @staticmethod
+    def unlock(user_id, achievement):
+        """Record an unlock, returning None if the user already had it"""
+        unlock = UserAchievement(user_id=user_id, achievement_id=achievement.id, points=achievement.points)
+        result = user_achievements_collection.update_one(
+            {'user_id': user_id, 'achievement_id': achievement.id},
+            {'$setOnInsert': {'points': unlock.points, 'unlocked_at': unlock.unlocked_at}},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            return None
+        unlock.id = str(result.upserted_id)
+        AchievementLeaderboard.record_unlock(user_id, unlock.points)
+        return unlock
+
+    @staticmethod
+    def find_by_user_id(user_id, achievement_ids=None):
+        """Find a user's unlocks, optionally limited to some achievements"""
+        query = {'user_id': user_id}
+        if achievement_ids is not None:
+            query['achievement_id'] = {'$in': list(achievement_ids)}
+        unlocks = []
+        for unlock_data in user_achievements_collection.find(query):
+            unlock_data['_id'] = str(unlock_data['_id'])
+            unlocks.append(UserAchievement(**unlock_data))
+        return unlocks
+
+# Sort order of the achievement leaderboard (ties broken by user_id so ranks are stable)
+ACHIEVEMENT_RANK_ORDER = [('achievements_unlocked', DESCENDING), ('total_points', DESCENDING), ('user_id', ASCENDING)]
+
+def _public_profiles(user_ids):
+    """Name/avatar/location for several users, as leaderboard row fields"""
+    return {
+        user_id: {'user_name': profile['name'], 'user_avatar': avatar_emoji(profile['avatar']), 'location': profile['location']}
+        for user_id, profile in profile_store.get_many(user_ids).items()
+    }
+
+class AchievementLeaderboard:
+    """Materialized view of user_achievements: one row per user, updated on every unlock"""
+
+    def __init__(self, **kwargs):
+        self.id = kwargs.get('_id')
+        self.user_id = kwargs.get('user_id')
+        self.user_name = kwargs.get('user_name', '')
+        self.user_avatar = kwargs.get('user_avatar', '')
+        self.location = kwargs.get('location', '')
+        self.achievements_unlocked = kwargs.get('achievements_unlocked', 0)
+        self.total_points = kwargs.get('total_points', 0)
+        self.rank = kwargs.get('rank')
+        self.updated_at = kwargs.get('updated_at', datetime.utcnow())
+
+    def to_dict(self):
+        """Convert leaderboard row to dictionary"""
+        return {
+            'rank': self.rank,
+            'user_id': self.user_id,
+            'user_name': self.user_name,
+            'user_avatar': self.user_avatar,
+            'location': self.location,
+            'achievements_unlocked': self.achievements_unlocked,
+            'total_points': self.total_points,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the per-user and rank order indexes"""
+        achievement_leaderboard_collection.create_index('user_id', unique=True)
+        achievement_leaderboard_collection.create_index(ACHIEVEMENT_RANK_ORDER)
+
+    @staticmethod
+    def record_unlock(user_id, points):
+        """Fold one unlock into the user's row"""
+        row = achievement_leaderboard_collection.find_one_and_update(
+            {'user_id': user_id},
+            {'$inc': {'achievements_unlocked': 1, 'total_points': points}, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True,
+            projection={'user_name': 1}
+        )
+        if row is None:
+            # First unlock for this user, copy the public profile onto the row
+            profile = _public_profiles([user_id]).get(user_id)
+            if profile:
+                achievement_leaderboard_collection.update_one({'user_id': user_id}, {'$set': profile})
+
+    @staticmethod
+    def find_top(limit=10):
+        """Top `limit` rows in rank order"""
+        entries = []
+        for rank, row in enumerate(achievement_leaderboard_collection.find().sort(ACHIEVEMENT_RANK_ORDER).limit(limit), 1):
+            row['_id'] = str(row['_id'])
+            entries.append(AchievementLeaderboard(rank=rank, **row))
+        return entries
+
+    @staticmethod
+    def find_by_user_id(user_id):
+        """A user's row with its rank (rows ranked ahead of it, counted on the rank index)"""
+        row = achievement_leaderboard_collection.find_one({'user_id': user_id})
+        if not row:
+            return None
+        unlocked, points = row.get('achievements_unlocked', 0), row.get('total_points', 0)
+        ahead = achievement_leaderboard_collection.count_documents({'$or': [
+            {'achievements_unlocked': {'$gt': unlocked}},
+            {'achievements_unlocked': unlocked, 'total_points': {'$gt': points}},
+            {'achievements_unlocked': unlocked, 'total_points': points, 'user_id': {'$lt': user_id}}
+        ]})
+        row['_id'] = str(row['_id'])
+        return AchievementLeaderboard(rank=ahead + 1, **row)
+
+    @staticmethod
+    def rebuild():
+        """Recompute the whole view from user_achievements (repair only, unlocks keep it current)"""
+        totals = list(user_achievements_collection.aggregate([
+            {'$group': {'_id': '$user_id', 'achievements_unlocked': {'$sum': 1}, 'total_points': {'$sum': '$points'}}}
+        ]))
+        profiles = _public_profiles([total['_id'] for total in totals])
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne({'user_id': total['_id']}, {'$set': dict(
+                profiles.get(total['_id'], {}),
+                achievements_unlocked=total['achievements_unlocked'],
+                total_points=total['total_points'],
+                updated_at=now
+            )}, upsert=True)
+            for total in totals
+        ]
+        if operations:
+            achievement_leaderboard_collection.bulk_write(operations, ordered=False)
+        achievement_leaderboard_collection.delete_many({'user_id': {'$nin': [total['_id'] for total in totals]}})
+        return len(operations)
+
+# Boards every user is placed on, and the partition key used for the global board
+LEADERBOARD_CATEGORIES = ['global', 'district', 'village']
+GLOBAL_PARTITION = 'all'
+# Sort order within a partition (ties broken by user_id so ranks are stable)
+LEADERBOARD_RANK_ORDER = [('points', DESCENDING), ('user_id', ASCENDING)]
+# Rolling boards built from daily score buckets, and their length in days
+LEADERBOARD_WINDOWS = {'weekly': 7, 'monthly': 30}
+# Daily buckets outlive the longest window by this many days, so the TTL monitor (which runs in
+# the background) cannot remove a bucket before roll_windows has subtracted it
+LEADERBOARD_BUCKET_GRACE_DAYS = int(os.getenv('LEADERBOARD_BUCKET_GRACE_DAYS', 7))
+
+# Window start days as of the last day this worker rolled the windows
+_window_starts = {'day': None, 'starts': {}}
+
+def _day_key(value):
+    return value.strftime('%Y-%m-%d')
+
+def _partition_key(name):
+    """Slug used as a partition key ("Green Valley Village" -> "green-valley-village")"""
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+def location_partitions(location):
+    """Derive the user's boards from User.location ("village, district[, state]")
+
+    Village keys are scoped under the district ("nashik/green-valley-village") so same-named
+    villages in different districts get separate boards.
+    """
+    parts = [part.strip() for part in (location or '').split(',') if part.strip()]
+    partitions = {'global': (GLOBAL_PARTITION, '')}
+    district = _partition_key(parts[1]) if len(parts) > 1 else ''
+    if district:
+        partitions['district'] = (district, parts[1])
+    if parts and _partition_key(parts[0]):
+        village = _partition_key(parts[0])
+        partitions['village'] = (f'{district}/{village}' if district else village, parts[0])
+    return partitions
+
 class Leaderboard:
     def __init__(self, **kwargs):
         self.id = kwargs.get('_id')
@@ -261,6 +669,8 @@ class Leaderboard:
         self.points = kwargs.get('points', 0)
         self.rank = kwargs.get('rank', 0)
         self.category = kwargs.get('category', 'global')  # global, village, district
+        self.partition = kwargs.get('partition', GLOBAL_PARTITION)
+        self.partition_name = kwargs.get('partition_name', '')
         self.updated_at = kwargs.get('updated_at', datetime.utcnow())
 
     def to_dict(self):
@@ -274,12 +684,16 @@ class Leaderboard:
             'points': self.points,
             'rank': self.rank,
             'category': self.category,
+            'partition': self.partition,
+            'partition_name': self.partition_name,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
     def save(self):
         """Save leaderboard entry to database"""
         leaderboard_data = self.to_dict()
+        # Ranks are computed from the rank index on read
+        leaderboard_data.pop('rank')
         if self.id:
             leaderboard_data['updated_at'] = datetime.utcnow()
             leaderboard_collection.update_one(
@@ -293,43 +707,179 @@ class Leaderboard:
         return self
 
     @staticmethod
-    def find_by_category(category, limit=50):
-        """Find leaderboard entries by category"""
+    def ensure_indexes():
+        """Create the per-partition rank index and the per-user board index"""
+        # Rows written before partitioning belong to the single board of their category
+        leaderboard_collection.update_many({'partition': {'$exists': False}}, {'$set': {'partition': GLOBAL_PARTITION}})
+        leaderboard_collection.create_index([('category', ASCENDING), ('partition', ASCENDING)] + LEADERBOARD_RANK_ORDER)
+        Leaderboard.remove_duplicates()
+        leaderboard_collection.create_index([('user_id', ASCENDING), ('category', ASCENDING)], unique=True)
+        leaderboard_daily_collection.create_index([('user_id', ASCENDING), ('day', ASCENDING)], unique=True)
+        leaderboard_daily_collection.create_index('day')
+        leaderboard_daily_collection.create_index('expires_at', expireAfterSeconds=0)
+
+    @staticmethod
+    def remove_duplicates():
+        """Keep only the most recently updated row per user and board (legacy data predates the unique index)"""
+        duplicates = leaderboard_collection.aggregate([
+            {'$sort': {'updated_at': -1}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'category': '$category'},
+                'ids': {'$push': '$_id'},
+                'count': {'$sum': 1}
+            }},
+            {'$match': {'count': {'$gt': 1}}}
+        ])
+        stale = [row_id for group in duplicates for row_id in group['ids'][1:]]
+        if stale:
+            leaderboard_collection.delete_many({'_id': {'$in': stale}})
+        return len(stale)
+
+    @staticmethod
+    def find_by_category(category, limit=50, partition=None):
+        """Top `limit` entries of a board, in rank order"""
+        if category in LEADERBOARD_WINDOWS:
+            Leaderboard.roll_windows()
         entries = []
-        for entry_data in leaderboard_collection.find({'category': category}).sort('points', -1).limit(limit):
+        query = {'category': category, 'partition': partition or GLOBAL_PARTITION}
+        for rank, entry_data in enumerate(leaderboard_collection.find(query).sort(LEADERBOARD_RANK_ORDER).limit(limit), 1):
             entry_data['_id'] = str(entry_data['_id'])
+            entry_data['rank'] = rank
             entries.append(Leaderboard(**entry_data))
         return entries
 
+    @staticmethod
+    def find_rank(user_id, category='global'):
+        """A user's entry on one of their boards, ranked by counting entries ahead on the rank index
+
+        The count walks every index key ahead of the user, so a rank costs O(log N + rank): cheap
+        near the top of a board, linear in the rank further down.
+        """
+        if category in LEADERBOARD_WINDOWS:
+            Leaderboard.roll_windows()
+        entry_data = leaderboard_collection.find_one({'user_id': user_id, 'category': category})
+        if not entry_data:
+            return None
+        points = entry_data.get('points', 0)
+        ahead = leaderboard_collection.count_documents({
+            'category': category,
+            'partition': entry_data.get('partition', GLOBAL_PARTITION),
+            '$or': [{'points': {'$gt': points}}, {'points': points, 'user_id': {'$lt': user_id}}]
+        })
+        entry_data['_id'] = str(entry_data['_id'])
+        entry_data['rank'] = ahead + 1
+        return Leaderboard(**entry_data)
+
     @staticmethod
     def update_user_rank(user_id, points, category='global'):
-        """Update user's rank in leaderboard"""
-        entry = leaderboard_collection.find_one({'user_id': user_id, 'category': category})
-        if entry:
-            leaderboard_collection.update_one(
-                {'_id': entry['_id']},
-                {'$set': {'points': points, 'updated_at': datetime.utcnow()}}
+        """Set the user's score on their global, district and village boards, returning their ranks
+
+        Writes are one bulk upsert; each returned rank costs a find_rank count, O(log N + rank).
+        """
+        profile = _public_profiles([user_id]).get(user_id, {})
+        partitions = location_partitions(profile.get('location'))
+        if category not in LEADERBOARD_CATEGORIES:
+            partitions = {category: (GLOBAL_PARTITION, '')}
+
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'user_id': user_id, 'category': board},
+                {'$set': dict(profile, points=points, partition=partition, partition_name=name, updated_at=now)},
+                upsert=True
             )
-        else:
-            # Create new entry
-            leaderboard_collection.insert_one({
+            for board, (partition, name) in partitions.items()
+        ]
+        leaderboard_collection.bulk_write(operations, ordered=False)
+        if category in LEADERBOARD_CATEGORIES:
+            # Drop rows on partitions the user moved away from and boards they no longer have a location for
+            leaderboard_collection.delete_many({
                 'user_id': user_id,
-                'points': points,
-                'category': category,
-                'updated_at': datetime.utcnow()
+                'category': {'$in': LEADERBOARD_CATEGORIES},
+                '$nor': [{'category': board, 'partition': partition} for board, (partition, _) in partitions.items()]
             })
-        
-        # Update ranks for all users in this category
-        Leaderboard.update_ranks(category)
+
+        ranks = {}
+        for board in partitions:
+            entry = Leaderboard.find_rank(user_id, board)
+            ranks[board] = entry.rank if entry else None
+        return ranks
 
     @staticmethod
-    def update_ranks(category):
-        """Update ranks for all users in a category"""
-        entries = list(leaderboard_collection.find({'category': category}).sort('points', -1))
-        for i, entry in enumerate(entries):
-            leaderboard_collection.update_one(
-                {'_id': entry['_id']},
-                {'$set': {'rank': i + 1}}
+    def add_daily_points(user_id, points_by_day):
+        """Add points to the user's daily buckets and to the windows those days fall in"""
+        points_by_day = {day: points for day, points in points_by_day.items() if points}
+        if not points_by_day:
+            return
+        today = _day_key(datetime.utcnow())
+        starts = Leaderboard.roll_windows()
+        keep_days = max(LEADERBOARD_WINDOWS.values()) + LEADERBOARD_BUCKET_GRACE_DAYS
+        leaderboard_daily_collection.bulk_write([
+            UpdateOne(
+                {'user_id': user_id, 'day': day},
+                {'$inc': {'points': points}, '$setOnInsert': {
+                    'expires_at': datetime.strptime(day, '%Y-%m-%d') + timedelta(days=keep_days)
+                }},
+                upsert=True
             )
+            for day, points in points_by_day.items()
+        ], ordered=False)
 
+        now = datetime.utcnow()
+        for window, start in starts.items():
+            points = sum(points for day, points in points_by_day.items() if start <= day <= today)
+            if not points:
+                continue
+            entry = leaderboard_collection.find_one_and_update(
+                {'user_id': user_id, 'category': window},
+                {'$inc': {'points': points}, '$set': {'partition': GLOBAL_PARTITION, 'updated_at': now}},
+                upsert=True,
+                projection={'user_name': 1}
+            )
+            if entry is None:
+                profile = _public_profiles([user_id]).get(user_id)
+                if profile:
+                    leaderboard_collection.update_one({'user_id': user_id, 'category': window}, {'$set': profile})
+
+    @staticmethod
+    def roll_windows(today=None):
+        """Advance each window to today, expiring the days that fell out of it"""
+        if today is None:
+            today = datetime.utcnow()
+            if _window_starts['day'] == _day_key(today):
+                return _window_starts['starts']
 
+        starts = {}
+        for window, days in LEADERBOARD_WINDOWS.items():
+            start = _day_key(today - timedelta(days=days - 1))
+            # Only the worker that moves start_day forward expires the old days
+            previous = leaderboard_windows_collection.find_one_and_update(
+                {'_id': window, 'start_day': {'$lt': start}},
+                {'$set': {'start_day': start}}
+            )
+            if previous:
+                Leaderboard.expire_days(window, previous['start_day'], start)
+            else:
+                leaderboard_windows_collection.update_one(
+                    {'_id': window}, {'$setOnInsert': {'start_day': start}}, upsert=True
+                )
+            starts[window] = start
+
+        _window_starts.update(day=_day_key(today), starts=starts)
+        return starts
+
+    @staticmethod
+    def expire_days(window, from_day, to_day):
+        """Subtract the daily buckets in [from_day, to_day) from a window's totals"""
+        expired = leaderboard_daily_collection.aggregate([
+            {'$match': {'day': {'$gte': from_day, '$lt': to_day}}},
+            {'$group': {'_id': '$user_id', 'points': {'$sum': '$points'}}}
+        ])
+        operations = [
+            UpdateOne({'user_id': bucket['_id'], 'category': window}, {'$inc': {'points': -bucket['points']}})
+            for bucket in expired if bucket['points']
+        ]
+        if operations:
+            leaderboard_collection.bulk_write(operations, ordered=False)
+        leaderboard_collection.delete_many({'category': window, 'points': {'$lte': 0}})
+        return len(operations)
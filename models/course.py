@@ -1,6 +1,7 @@
 from datetime import datetime
 from bson import ObjectId
 from pymongo import MongoClient
+from services.grading import quiz_grader
 import os
 
 # MongoDB connection with fallback to mock for development
@@ -86,6 +87,16 @@ class Course:
             return Course(**course_data)
         return None
 
+    @staticmethod
+    def find_by_ids(course_ids):
+        """Find several courses in one query, returning {course_id: course}"""
+        object_ids = [ObjectId(course_id) for course_id in set(course_ids) if ObjectId.is_valid(course_id)]
+        courses = {}
+        for course_data in courses_collection.find({'_id': {'$in': object_ids}}):
+            course_data['_id'] = str(course_data['_id'])
+            courses[course_data['_id']] = Course(**course_data)
+        return courses
+
     @staticmethod
     def find_by_category(category, skip=0, limit=100):
         """Find courses by category"""
@@ -219,6 +230,7 @@ class Quiz:
                 {'_id': ObjectId(self.id)},
                 {'$set': {k: v for k, v in quiz_data.items() if k != 'id'}}
             )
+            quiz_grader.invalidate(self.id)
         else:
             # Create new quiz
             quiz_data['created_at'] = datetime.utcnow()
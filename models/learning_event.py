@@ -0,0 +1,372 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient, ASCENDING, UpdateOne, ReturnDocument
+from models.progress import (
+    user_progress_collection, course_progress_collection, lesson_progress_collection, _as_datetime
+)
+from models.course import lessons_collection
+from models.user import users_collection
+from models.community import CommunityStats, Leaderboard
+from services.achievements import achievement_engine
+from services.identity import user_cache
+import os
+
+# MongoDB connection with fallback to mock for development
+try:
+    # Try to connect to real MongoDB
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ecofarm-quest'), serverSelectionTimeoutMS=2000)
+    # Test the connection
+    client.admin.command('ping')
+except Exception as e:
+    # Use mongomock for development
+    from mongomock import MongoClient as MockMongoClient
+    client = MockMongoClient()
+
+db = client['ecofarm-quest']
+learning_events_collection = db['learning_events']
+
+# Events per bucket document before a new bucket is started for the same day
+LEARNING_EVENTS_BUCKET_SIZE = int(os.getenv('LEARNING_EVENTS_BUCKET_SIZE', 200))
+
+# Counter changes caused by each event type (knowledge points travel on the event)
+EVENT_EFFECTS = {
+    'course_enrolled': {'total_courses': 1},
+    'lesson_completed': {'completed_lessons': 1},
+    'course_completed': {'completed_courses': 1, 'certificates': 1},
+    'quiz_submitted': {},
+    # Synthetic: carries the points a user earned before the log existed
+    'progress_imported': {}
+}
+
+# Events that are not learning activity, so they neither extend the streak nor mark the user active
+INACTIVE_EVENTS = {'course_enrolled', 'progress_imported'}
+
+# Achievement counters derived from when and how events happened (times are UTC)
+ACTIVITY_COUNTERS = ['perfect_quizzes', 'night_study', 'weekend_lessons', 'fast_completion']
+NIGHT_STUDY_START_HOUR = 22
+NIGHT_STUDY_END_HOUR = 6
+FAST_COMPLETION_WINDOW = timedelta(hours=24)
+
+COUNTER_FIELDS = ['total_courses', 'completed_courses', 'completed_lessons', 'certificates',
+                  'knowledge_points'] + ACTIVITY_COUNTERS
+
+def level_for(knowledge_points, current_level=1, next_level_points=100):
+    """Apply the level-up rule (each level requires 100 more points)"""
+    while knowledge_points >= next_level_points:
+        current_level += 1
+        next_level_points = current_level * 100
+    return current_level, next_level_points
+
+def next_streak(streak, last_activity, occurred_at):
+    """Apply the daily learning streak rule, returning (streak, last_activity)"""
+    if isinstance(last_activity, str):
+        last_activity = datetime.fromisoformat(last_activity)
+    if not last_activity:
+        return 1, occurred_at
+    if occurred_at < last_activity:
+        return streak, last_activity
+    # Compare calendar days so a lesson late one evening and early the next morning still counts
+    days_diff = (occurred_at.date() - last_activity.date()).days
+    if days_diff == 1:
+        streak += 1
+    elif days_diff > 1:
+        streak = 1
+    return streak, occurred_at
+
+def activity_counters(event, enrolled_at=None):
+    """Achievement counters an event adds to: perfect quizzes, night and weekend study, fast completions"""
+    counters = {}
+    if event.type == 'quiz_submitted' and event.score is not None and event.score >= 100:
+        counters['perfect_quizzes'] = 1
+    if event.type in ('lesson_completed', 'quiz_submitted'):
+        hour = event.occurred_at.hour
+        if hour >= NIGHT_STUDY_START_HOUR or hour < NIGHT_STUDY_END_HOUR:
+            counters['night_study'] = 1
+    if event.type == 'lesson_completed' and event.occurred_at.weekday() >= 5:
+        counters['weekend_lessons'] = 1
+    if event.type == 'course_completed' and enrolled_at and event.occurred_at - enrolled_at <= FAST_COMPLETION_WINDOW:
+        counters['fast_completion'] = 1
+    return counters
+
+class LearningEvent:
+    def __init__(self, **kwargs):
+        self.user_id = kwargs.get('user_id')
+        self.type = kwargs.get('type')
+        self.course_id = kwargs.get('course_id')
+        self.lesson_id = kwargs.get('lesson_id')
+        self.quiz_id = kwargs.get('quiz_id')
+        self.points = kwargs.get('points', 0)
+        self.score = kwargs.get('score')
+        self.occurred_at = kwargs.get('occurred_at') or datetime.utcnow()
+
+    def to_dict(self):
+        """Convert learning event object to dictionary"""
+        return {
+            'user_id': self.user_id,
+            'type': self.type,
+            'course_id': self.course_id,
+            'lesson_id': self.lesson_id,
+            'quiz_id': self.quiz_id,
+            'points': self.points,
+            'score': self.score,
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None
+        }
+
+    def to_document(self):
+        """Convert learning event to its embedded bucket form"""
+        document = {'type': self.type, 'points': self.points, 'occurred_at': self.occurred_at}
+        for field in ('course_id', 'lesson_id', 'quiz_id', 'score'):
+            value = getattr(self, field)
+            if value is not None:
+                document[field] = value
+        return document
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the bucket lookup index"""
+        learning_events_collection.create_index([('user_id', ASCENDING), ('day', ASCENDING), ('count', ASCENDING)])
+
+    @staticmethod
+    def record(user_id, event_type, **fields):
+        """Append one event to the user's log and update the projections"""
+        return LearningEvent.record_many(user_id, [LearningEvent(user_id=user_id, type=event_type, **fields)])
+
+    @staticmethod
+    def record_many(user_id, events):
+        """Append events to the user's daily buckets and update the projections"""
+        events = sorted(events, key=lambda e: e.occurred_at)
+        if not events:
+            return events
+        LearningEvent._append(user_id, events)
+        LearningEvent.apply_to_projections(user_id, events)
+        return events
+
+    @staticmethod
+    def _append(user_id, events):
+        # Bucket pattern: one document per user per day, capped at LEARNING_EVENTS_BUCKET_SIZE
+        by_day = {}
+        for event in events:
+            by_day.setdefault(event.occurred_at.strftime('%Y-%m-%d'), []).append(event.to_document())
+        operations = []
+        for day, documents in by_day.items():
+            for start in range(0, len(documents), LEARNING_EVENTS_BUCKET_SIZE):
+                chunk = documents[start:start + LEARNING_EVENTS_BUCKET_SIZE]
+                operations.append(UpdateOne(
+                    {'user_id': user_id, 'day': day, 'count': {'$lte': LEARNING_EVENTS_BUCKET_SIZE - len(chunk)}},
+                    {
+                        '$push': {'events': {'$each': chunk}},
+                        '$inc': {'count': len(chunk)},
+                        '$min': {'first_at': chunk[0]['occurred_at']},
+                        '$max': {'last_at': chunk[-1]['occurred_at']}
+                    },
+                    upsert=True
+                ))
+        learning_events_collection.bulk_write(operations, ordered=True)
+
+    @staticmethod
+    def seed_from_progress(user_id):
+        """One-time migration: log synthetic events for progress made before the event log existed
+
+        Completions come from CourseProgress and LessonProgress records the log does not already
+        cover; points the log cannot account for are carried by one progress_imported event.
+        Projections are left alone since they already include this progress. Returns the
+        number of events seeded (0 once the user has been seeded).
+        """
+        user_progress = user_progress_collection.find_one({'user_id': user_id}) or {}
+        if user_progress.get('events_seeded_at'):
+            return 0
+
+        logged = list(LearningEvent.find_by_user_id(user_id))
+        logged_keys = {(event.type, event.course_id, event.lesson_id) for event in logged}
+        events = []
+
+        def seed(event_type, occurred_at, course_id=None, lesson_id=None):
+            occurred_at = _as_datetime(occurred_at)
+            if occurred_at and (event_type, course_id, lesson_id) not in logged_keys:
+                events.append(LearningEvent(user_id=user_id, type=event_type, course_id=course_id,
+                                            lesson_id=lesson_id, occurred_at=occurred_at))
+
+        for course in course_progress_collection.find({'user_id': user_id}):
+            seed('course_enrolled', course.get('started_at'), course['course_id'])
+            if course.get('is_completed'):
+                seed('course_completed', course.get('completed_at') or course.get('last_accessed'), course['course_id'])
+        for lesson in lesson_progress_collection.find({'user_id': user_id, 'is_completed': True}):
+            seed('lesson_completed', lesson.get('completed_at') or lesson.get('last_accessed'),
+                 lesson.get('course_id'), lesson['lesson_id'])
+
+        legacy_points = user_progress.get('knowledge_points', 0) - sum(event.points for event in logged)
+        if legacy_points > 0:
+            first_at = min([event.occurred_at for event in logged + events] or [datetime.utcnow()])
+            events.append(LearningEvent(user_id=user_id, type='progress_imported', points=legacy_points,
+                                        occurred_at=first_at))
+
+        if events:
+            LearningEvent._append(user_id, sorted(events, key=lambda e: e.occurred_at))
+        user_progress_collection.update_one(
+            {'user_id': user_id},
+            {'$set': {'events_seeded_at': datetime.utcnow()}},
+            upsert=True
+        )
+        return len(events)
+
+    @staticmethod
+    def apply_to_projections(user_id, events):
+        """Incrementally fold new events into UserProgress and User.learning_stats"""
+        enrolled_at = LearningEvent._enrollment_times(user_id, events)
+        deltas = {field: 0 for field in COUNTER_FIELDS}
+        for event in events:
+            effects = dict(EVENT_EFFECTS.get(event.type, {}))
+            effects.update(activity_counters(event, enrolled_at.get(event.course_id)))
+            for field, amount in effects.items():
+                deltas[field] += amount
+            deltas['knowledge_points'] += event.points
+        deltas = {field: amount for field, amount in deltas.items() if amount}
+
+        now = datetime.utcnow()
+        update = {'$set': {'updated_at': now}, '$setOnInsert': {'created_at': now}}
+        if deltas:
+            update['$inc'] = deltas
+        previous = user_progress_collection.find_one_and_update(
+            {'user_id': user_id},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        ) or {}
+
+        knowledge_points = previous.get('knowledge_points', 0) + deltas.get('knowledge_points', 0)
+        current_level, next_level_points = level_for(
+            knowledge_points, previous.get('current_level', 1), previous.get('next_level_points', 100)
+        )
+        streak, last_activity = previous.get('learning_streak', 0), previous.get('last_activity')
+        active = [event for event in events if event.type not in INACTIVE_EVENTS]
+        for event in active:
+            streak, last_activity = next_streak(streak, last_activity, event.occurred_at)
+
+        derived = {
+            'current_level': current_level,
+            'next_level_points': next_level_points,
+            'learning_streak': streak,
+            'last_activity': last_activity
+        }
+        user_progress_collection.update_one({'user_id': user_id}, {'$set': derived})
+        LearningEvent.update_learning_stats(user_id, {'$inc': {f'learning_stats.{k}': v for k, v in deltas.items()}}, derived)
+        CommunityStats.increment(knowledge_points=deltas.get('knowledge_points', 0))
+        if active:
+            CommunityStats.record_activity(user_id, active[-1].occurred_at)
+
+        points_by_day = {}
+        for event in events:
+            day = event.occurred_at.strftime('%Y-%m-%d')
+            points_by_day[day] = points_by_day.get(day, 0) + event.points
+        Leaderboard.add_daily_points(user_id, points_by_day)
+
+        # Only the achievement rules on stats that moved are evaluated
+        tracked = COUNTER_FIELDS + ['current_level', 'learning_streak']
+        previous_stats = {field: previous.get(field, 0) for field in tracked}
+        stats = {field: previous_stats[field] + deltas.get(field, 0) for field in COUNTER_FIELDS}
+        stats.update(current_level=current_level, learning_streak=streak)
+        achievement_engine.on_stats_changed(user_id, stats, previous_stats)
+
+    @staticmethod
+    def _enrollment_times(user_id, events):
+        """When the user enrolled in each course completed by events (for fast completions)"""
+        enrolled_at = {event.course_id: event.occurred_at for event in events if event.type == 'course_enrolled'}
+        missing = [event.course_id for event in events
+                   if event.type == 'course_completed' and event.course_id not in enrolled_at]
+        if missing:
+            for course in course_progress_collection.find({'user_id': user_id, 'course_id': {'$in': missing}},
+                                                          {'course_id': 1, 'started_at': 1}):
+                enrolled_at[course['course_id']] = _as_datetime(course.get('started_at'))
+        return enrolled_at
+
+    @staticmethod
+    def update_learning_stats(user_id, update, derived):
+        """Mirror the projection onto User.learning_stats"""
+        if not ObjectId.is_valid(user_id):
+            return
+        update = {operator: dict(fields) for operator, fields in update.items() if fields}
+        update.setdefault('$set', {}).update({
+            'learning_stats.current_level': derived['current_level'],
+            'learning_stats.next_level_points': derived['next_level_points'],
+            'learning_stats.learning_streak': derived['learning_streak']
+        })
+        users_collection.update_one({'_id': ObjectId(user_id)}, update)
+        user_cache.invalidate(user_id)
+
+    @staticmethod
+    def find_by_user_id(user_id, since=None):
+        """Stream a user's events in order from their daily buckets"""
+        query = {'user_id': user_id}
+        if since:
+            query['day'] = {'$gte': since.strftime('%Y-%m-%d')}
+        for bucket in learning_events_collection.find(query).sort([('day', 1), ('first_at', 1)]):
+            for event_data in bucket.get('events', []):
+                yield LearningEvent(user_id=user_id, **event_data)
+
+    @staticmethod
+    def rebuild_projections(user_id):
+        """Recompute UserProgress, CourseProgress and User.learning_stats from the log
+
+        Progress made before the log existed is seeded into it first, so a rebuild never resets it.
+        """
+        LearningEvent.seed_from_progress(user_id)
+        stats = {field: 0 for field in COUNTER_FIELDS}
+        streak, last_activity = 0, None
+        courses = {}
+        enrolled_at = {}
+        for event in sorted(LearningEvent.find_by_user_id(user_id), key=lambda e: e.occurred_at):
+            if event.type == 'course_enrolled':
+                enrolled_at.setdefault(event.course_id, event.occurred_at)
+            effects = dict(EVENT_EFFECTS.get(event.type, {}))
+            effects.update(activity_counters(event, enrolled_at.get(event.course_id)))
+            for field, amount in effects.items():
+                stats[field] += amount
+            stats['knowledge_points'] += event.points
+            if event.type not in INACTIVE_EVENTS:
+                streak, last_activity = next_streak(streak, last_activity, event.occurred_at)
+
+            if event.course_id:
+                course = courses.setdefault(event.course_id, {'completed_lessons': [], 'completed_at': None})
+                if event.type == 'lesson_completed' and event.lesson_id not in course['completed_lessons']:
+                    course['completed_lessons'].append(event.lesson_id)
+                elif event.type == 'course_completed':
+                    course['completed_at'] = course['completed_at'] or event.occurred_at
+
+        current_level, next_level_points = level_for(stats['knowledge_points'])
+        derived = {
+            'current_level': current_level,
+            'next_level_points': next_level_points,
+            'learning_streak': streak,
+            'last_activity': last_activity
+        }
+        now = datetime.utcnow()
+        user_progress_collection.update_one(
+            {'user_id': user_id},
+            {'$set': dict(stats, updated_at=now, **derived), '$setOnInsert': {'created_at': now}},
+            upsert=True
+        )
+        LearningEvent.update_learning_stats(
+            user_id, {'$set': {f'learning_stats.{k}': v for k, v in stats.items()}}, derived
+        )
+
+        lesson_counts = {
+            count['_id']: count['count'] for count in lessons_collection.aggregate([
+                {'$match': {'course_id': {'$in': list(courses)}, 'is_active': True}},
+                {'$group': {'_id': '$course_id', 'count': {'$sum': 1}}}
+            ])
+        }
+        operations = []
+        for course_id, course in courses.items():
+            total_lessons = lesson_counts.get(course_id, 0)
+            progress = (len(course['completed_lessons']) / total_lessons) * 100 if total_lessons else 0
+            is_completed = course['completed_at'] is not None
+            operations.append(UpdateOne({'user_id': user_id, 'course_id': course_id}, {'$set': {
+                'completed_lessons': course['completed_lessons'],
+                'progress_percentage': 100 if is_completed else progress,
+                'is_completed': is_completed,
+                'certificate_earned': is_completed,
+                'completed_at': course['completed_at'].isoformat() if is_completed else None
+            }}))
+        if operations:
+            course_progress_collection.bulk_write(operations, ordered=False)
+        return dict(stats, **derived)
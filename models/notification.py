@@ -1,6 +1,8 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+from services.events import event_broker
 import os
 
 # MongoDB connection with fallback to mock for development
@@ -16,6 +18,22 @@ except Exception as e:
 
 db = client['ecofarm-quest']
 notifications_collection = db['notifications']
+notifications_archive_collection = db['notifications_archive']
+
+# Retention settings (in days)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 30))
+NOTIFICATION_ARCHIVE_AFTER_DAYS = int(os.getenv('NOTIFICATION_ARCHIVE_AFTER_DAYS', 7))
+NOTIFICATION_ARCHIVE_RETENTION_DAYS = int(os.getenv('NOTIFICATION_ARCHIVE_RETENTION_DAYS', 365))
+NOTIFICATION_ARCHIVE_BATCH_SIZE = int(os.getenv('NOTIFICATION_ARCHIVE_BATCH_SIZE', 1000))
+
+def _as_datetime(value):
+    """Accept legacy ISO-string dates written by older versions of save()"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
 
 class Notification:
     def __init__(self, **kwargs):
@@ -28,8 +46,8 @@ class Notification:
         self.is_read = kwargs.get('is_read', False)
         self.action_url = kwargs.get('action_url', '')
         self.metadata = kwargs.get('metadata', {})
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        self.read_at = kwargs.get('read_at')
+        self.created_at = _as_datetime(kwargs.get('created_at', datetime.utcnow()))
+        self.read_at = _as_datetime(kwargs.get('read_at'))
 
     def to_dict(self):
         """Convert notification object to dictionary"""
@@ -47,20 +65,37 @@ class Notification:
             'read_at': self.read_at.isoformat() if self.read_at else None
         }
 
+    def to_document(self):
+        """Convert notification object to a database document (dates stay BSON dates)"""
+        return {
+            'user_id': self.user_id,
+            'title': self.title,
+            'message': self.message,
+            'type': self.type,
+            'category': self.category,
+            'is_read': self.is_read,
+            'action_url': self.action_url,
+            'metadata': self.metadata,
+            'created_at': self.created_at,
+            'read_at': self.read_at
+        }
+
     def save(self):
         """Save notification to database"""
-        notification_data = self.to_dict()
+        notification_data = self.to_document()
         if self.id:
             # Update existing notification
             notifications_collection.update_one(
                 {'_id': ObjectId(self.id)},
-                {'$set': {k: v for k, v in notification_data.items() if k != 'id'}}
+                {'$set': notification_data}
             )
         else:
             # Create new notification
-            notification_data['created_at'] = datetime.utcnow()
+            self.created_at = datetime.utcnow()
+            notification_data['created_at'] = self.created_at
             result = notifications_collection.insert_one(notification_data)
             self.id = str(result.inserted_id)
+            event_broker.publish('notification', self.to_dict(), [self.user_id])
         return self
 
     @staticmethod
@@ -113,7 +148,7 @@ class Notification:
 
     @staticmethod
     def delete_old_notifications(days=30):
-        """Delete notifications older than specified days"""
+        """Delete read notifications older than specified days"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         result = notifications_collection.delete_many({
             'created_at': {'$lt': cutoff_date},
@@ -121,4 +156,67 @@ class Notification:
         })
         return result.deleted_count
 
+    @staticmethod
+    def ensure_indexes():
+        """Create the query and TTL indexes used by the notifications collections"""
+        notifications_collection.create_index([('user_id', ASCENDING), ('created_at', -1)])
+        notifications_collection.create_index([('user_id', ASCENDING), ('is_read', ASCENDING)])
+        # Read notifications expire NOTIFICATION_RETENTION_DAYS after being read.
+        # Unread ones have no read_at and are never touched by the TTL monitor.
+        notifications_collection.create_index(
+            'read_at',
+            name='read_at_ttl',
+            expireAfterSeconds=NOTIFICATION_RETENTION_DAYS * 24 * 60 * 60,
+            partialFilterExpression={'is_read': True}
+        )
+
+        # The archive is write-mostly, so store it with a stronger block compressor
+        try:
+            db.create_collection(
+                notifications_archive_collection.name,
+                storageEngine={'wiredTiger': {'configString': 'block_compressor=zstd'}}
+            )
+        except (CollectionInvalid, OperationFailure, NotImplementedError):
+            # Already exists, or the server/mock does not support storage options
+            pass
+        notifications_archive_collection.create_index([('user_id', ASCENDING), ('created_at', -1)])
+        notifications_archive_collection.create_index(
+            'archived_at',
+            name='archived_at_ttl',
+            expireAfterSeconds=NOTIFICATION_ARCHIVE_RETENTION_DAYS * 24 * 60 * 60
+        )
+
+    @staticmethod
+    def archive_old_notifications(days=None, batch_size=None):
+        """Move read notifications older than `days` into the archive collection in batches"""
+        days = NOTIFICATION_ARCHIVE_AFTER_DAYS if days is None else days
+        batch_size = batch_size or NOTIFICATION_ARCHIVE_BATCH_SIZE
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        query = {'is_read': True, 'read_at': {'$lt': cutoff_date}}
+
+        archived = 0
+        while True:
+            batch = list(notifications_collection.find(query).sort('_id', ASCENDING).limit(batch_size))
+            if not batch:
+                break
+
+            archived_at = datetime.utcnow()
+            for notification_data in batch:
+                notification_data['archived_at'] = archived_at
+
+            # Keep the original _id so a batch interrupted before the delete
+            # can be re-run without duplicating archive entries
+            try:
+                notifications_archive_collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+
+            result = notifications_collection.delete_many({
+                '_id': {'$in': [notification_data['_id'] for notification_data in batch]}
+            })
+            archived += result.deleted_count
 
+            if len(batch) < batch_size:
+                break
+        return archived
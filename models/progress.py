@@ -1,6 +1,7 @@
 from datetime import datetime
 from bson import ObjectId
 from pymongo import MongoClient
+from services.identity import identity_map
 import os
 
 # MongoDB connection with fallback to mock for development
@@ -18,6 +19,16 @@ db = client['ecofarm-quest']
 user_progress_collection = db['user_progress']
 course_progress_collection = db['course_progress']
 lesson_progress_collection = db['lesson_progress']
+sync_receipts_collection = db['sync_receipts']
+
+def _as_datetime(value):
+    """Accept ISO-string dates written by save() (which stores to_dict() output)"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
 
 class UserProgress:
     def __init__(self, **kwargs):
@@ -32,9 +43,9 @@ class UserProgress:
         self.current_level = kwargs.get('current_level', 1)
         self.next_level_points = kwargs.get('next_level_points', 100)
         self.certificates = kwargs.get('certificates', 0)
-        self.last_activity = kwargs.get('last_activity', datetime.utcnow())
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        self.updated_at = kwargs.get('updated_at', datetime.utcnow())
+        self.last_activity = _as_datetime(kwargs.get('last_activity', datetime.utcnow()))
+        self.created_at = _as_datetime(kwargs.get('created_at', datetime.utcnow()))
+        self.updated_at = _as_datetime(kwargs.get('updated_at', datetime.utcnow()))
 
     def to_dict(self):
         """Convert user progress object to dictionary"""
@@ -55,15 +66,27 @@ class UserProgress:
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def identity_key(self):
+        return (self.user_id,)
+
     def save(self):
-        """Save user progress to database"""
+        """Save user progress to database (once before the response when loaded in a request)"""
+        if identity_map.defer_save(self):
+            return self
+        return self._write()
+
+    def snapshot(self):
+        """Stored fields compared by the identity map to find what changed"""
+        return {k: v for k, v in self.to_dict().items() if k not in ('id', 'updated_at')}
+
+    def _write(self, changes=None):
         progress_data = self.to_dict()
         if self.id:
-            # Update existing progress
-            progress_data['updated_at'] = datetime.utcnow()
+            # Update existing progress (only the changed fields when the identity map knows them)
+            fields = changes if changes is not None else {k: v for k, v in progress_data.items() if k != 'id'}
             user_progress_collection.update_one(
                 {'_id': ObjectId(self.id)},
-                {'$set': {k: v for k, v in progress_data.items() if k != 'id'}}
+                {'$set': {**fields, 'updated_at': datetime.utcnow()}}
             )
         else:
             # Create new progress
@@ -71,12 +94,17 @@ class UserProgress:
             progress_data['updated_at'] = datetime.utcnow()
             result = user_progress_collection.insert_one(progress_data)
             self.id = str(result.inserted_id)
+            identity_map.merge(self)
         return self
 
     @staticmethod
     def find_by_user_id(user_id):
         """Find user progress by user ID"""
-        progress_data = user_progress_collection.find_one({'user_id': user_id})
+        return identity_map.load(UserProgress, (user_id,), lambda: UserProgress._find_one({'user_id': user_id}))
+
+    @staticmethod
+    def _find_one(query):
+        progress_data = user_progress_collection.find_one(query)
         if progress_data:
             progress_data['_id'] = str(progress_data['_id'])
             return UserProgress(**progress_data)
@@ -120,9 +148,9 @@ class CourseProgress:
         self.progress_percentage = kwargs.get('progress_percentage', 0)
         self.completed_lessons = kwargs.get('completed_lessons', [])
         self.current_lesson = kwargs.get('current_lesson')
-        self.started_at = kwargs.get('started_at', datetime.utcnow())
-        self.completed_at = kwargs.get('completed_at')
-        self.last_accessed = kwargs.get('last_accessed', datetime.utcnow())
+        self.started_at = _as_datetime(kwargs.get('started_at', datetime.utcnow()))
+        self.completed_at = _as_datetime(kwargs.get('completed_at'))
+        self.last_accessed = _as_datetime(kwargs.get('last_accessed', datetime.utcnow()))
         self.is_completed = kwargs.get('is_completed', False)
         self.certificate_earned = kwargs.get('certificate_earned', False)
 
@@ -142,15 +170,27 @@ class CourseProgress:
             'certificate_earned': self.certificate_earned
         }
 
+    def identity_key(self):
+        return (self.user_id, self.course_id)
+
     def save(self):
-        """Save course progress to database"""
+        """Save course progress to database (once before the response when loaded in a request)"""
+        if identity_map.defer_save(self):
+            return self
+        return self._write()
+
+    def snapshot(self):
+        """Stored fields compared by the identity map to find what changed"""
+        return {k: v for k, v in self.to_dict().items() if k not in ('id', 'last_accessed')}
+
+    def _write(self, changes=None):
         progress_data = self.to_dict()
         if self.id:
-            # Update existing progress
-            progress_data['last_accessed'] = datetime.utcnow()
+            # Update existing progress (only the changed fields when the identity map knows them)
+            fields = changes if changes is not None else {k: v for k, v in progress_data.items() if k != 'id'}
             course_progress_collection.update_one(
                 {'_id': ObjectId(self.id)},
-                {'$set': {k: v for k, v in progress_data.items() if k != 'id'}}
+                {'$set': {**fields, 'last_accessed': datetime.utcnow()}}
             )
         else:
             # Create new progress
@@ -158,15 +198,20 @@ class CourseProgress:
             progress_data['last_accessed'] = datetime.utcnow()
             result = course_progress_collection.insert_one(progress_data)
             self.id = str(result.inserted_id)
+            identity_map.merge(self)
         return self
 
     @staticmethod
     def find_by_user_and_course(user_id, course_id):
         """Find course progress by user and course"""
-        progress_data = course_progress_collection.find_one({
+        return identity_map.load(CourseProgress, (user_id, course_id), lambda: CourseProgress._find_one({
             'user_id': user_id,
             'course_id': course_id
-        })
+        }))
+
+    @staticmethod
+    def _find_one(query):
+        progress_data = course_progress_collection.find_one(query)
         if progress_data:
             progress_data['_id'] = str(progress_data['_id'])
             return CourseProgress(**progress_data)
@@ -178,7 +223,8 @@ class CourseProgress:
         progress_list = []
         for progress_data in course_progress_collection.find({'user_id': user_id}):
             progress_data['_id'] = str(progress_data['_id'])
-            progress_list.append(CourseProgress(**progress_data))
+            # Instances already loaded in this request (possibly with unsaved changes) win
+            progress_list.append(identity_map.merge(CourseProgress(**progress_data)))
         return progress_list
 
     def complete_lesson(self, lesson_id):
@@ -205,11 +251,11 @@ class LessonProgress:
         self.lesson_id = kwargs.get('lesson_id')
         self.course_id = kwargs.get('course_id')
         self.is_completed = kwargs.get('is_completed', False)
-        self.completed_at = kwargs.get('completed_at')
+        self.completed_at = _as_datetime(kwargs.get('completed_at'))
         self.time_spent = kwargs.get('time_spent', 0)  # in minutes
         self.quiz_score = kwargs.get('quiz_score', 0)
         self.quiz_attempts = kwargs.get('quiz_attempts', 0)
-        self.last_accessed = kwargs.get('last_accessed', datetime.utcnow())
+        self.last_accessed = _as_datetime(kwargs.get('last_accessed', datetime.utcnow()))
 
     def to_dict(self):
         """Convert lesson progress object to dictionary"""
@@ -226,30 +272,47 @@ class LessonProgress:
             'last_accessed': self.last_accessed.isoformat() if self.last_accessed else None
         }
 
+    def identity_key(self):
+        return (self.user_id, self.lesson_id)
+
     def save(self):
-        """Save lesson progress to database"""
+        """Save lesson progress to database (once before the response when loaded in a request)"""
+        if identity_map.defer_save(self):
+            return self
+        return self._write()
+
+    def snapshot(self):
+        """Stored fields compared by the identity map to find what changed"""
+        return {k: v for k, v in self.to_dict().items() if k not in ('id', 'last_accessed')}
+
+    def _write(self, changes=None):
         progress_data = self.to_dict()
         if self.id:
-            # Update existing progress
-            progress_data['last_accessed'] = datetime.utcnow()
+            # Update existing progress (only the changed fields when the identity map knows them)
+            fields = changes if changes is not None else {k: v for k, v in progress_data.items() if k != 'id'}
             lesson_progress_collection.update_one(
                 {'_id': ObjectId(self.id)},
-                {'$set': {k: v for k, v in progress_data.items() if k != 'id'}}
+                {'$set': {**fields, 'last_accessed': datetime.utcnow()}}
             )
         else:
             # Create new progress
             progress_data['last_accessed'] = datetime.utcnow()
             result = lesson_progress_collection.insert_one(progress_data)
             self.id = str(result.inserted_id)
+            identity_map.merge(self)
         return self
 
     @staticmethod
     def find_by_user_and_lesson(user_id, lesson_id):
         """Find lesson progress by user and lesson"""
-        progress_data = lesson_progress_collection.find_one({
+        return identity_map.load(LessonProgress, (user_id, lesson_id), lambda: LessonProgress._find_one({
             'user_id': user_id,
             'lesson_id': lesson_id
-        })
+        }))
+
+    @staticmethod
+    def _find_one(query):
+        progress_data = lesson_progress_collection.find_one(query)
         if progress_data:
             progress_data['_id'] = str(progress_data['_id'])
             return LessonProgress(**progress_data)
@@ -0,0 +1,117 @@
+from datetime import datetime
+from pymongo import MongoClient, ReturnDocument, ASCENDING
+import os
+
+# MongoDB connection with fallback to mock for development
+try:
+    # Try to connect to real MongoDB
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ecofarm-quest'), serverSelectionTimeoutMS=2000)
+    # Test the connection
+    client.admin.command('ping')
+except Exception as e:
+    # Use mongomock for development
+    from mongomock import MongoClient as MockMongoClient
+    client = MockMongoClient()
+
+db = client['ecofarm-quest']
+upload_blobs_collection = db['upload_blobs']
+upload_blob_refs_collection = db['upload_blob_refs']
+upload_sessions_collection = db['upload_sessions']
+upload_images_collection = db['upload_images']
+
+class UploadBlob:
+    """Index of stored upload content keyed by SHA-256, with one reference per user upload"""
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the lookup indexes used when deleting by public id"""
+        upload_blobs_collection.create_index('public_id', unique=True)
+        upload_blob_refs_collection.create_index([('public_id', ASCENDING), ('user_id', ASCENDING)])
+
+    @staticmethod
+    def _add_reference(blob, user_id):
+        upload_blob_refs_collection.insert_one({
+            'blob_id': blob['_id'],
+            'public_id': blob['public_id'],
+            'user_id': user_id,
+            'created_at': datetime.utcnow()
+        })
+        return blob
+
+    @staticmethod
+    def acquire(content_hash, user_id):
+        """Add a user's reference to already stored content, returning its blob or None"""
+        blob = upload_blobs_collection.find_one_and_update(
+            {'_id': content_hash},
+            {'$inc': {'refs': 1}, '$set': {'last_referenced_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        return UploadBlob._add_reference(blob, user_id) if blob else None
+
+    @staticmethod
+    def register(content_hash, public_id, url, size, user_id):
+        """Record newly stored content with the user's reference (or add one if a concurrent upload won)"""
+        now = datetime.utcnow()
+        blob = upload_blobs_collection.find_one_and_update(
+            {'_id': content_hash},
+            {
+                '$setOnInsert': {
+                    'public_id': public_id,
+                    'url': url,
+                    'size': size,
+                    'created_at': now
+                },
+                '$inc': {'refs': 1},
+                '$set': {'last_referenced_at': now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return UploadBlob._add_reference(blob, user_id)
+
+    @staticmethod
+    def find_by_public_id(public_id):
+        return upload_blobs_collection.find_one({'public_id': public_id})
+
+    @staticmethod
+    def release(public_id, user_id):
+        """Drop one of the user's references; None if they hold none, True once the blob is removed"""
+        if upload_blob_refs_collection.find_one_and_delete({'public_id': public_id, 'user_id': user_id}) is None:
+            return None
+        blob = upload_blobs_collection.find_one_and_update(
+            {'public_id': public_id, 'refs': {'$gt': 0}},
+            {'$inc': {'refs': -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None or blob['refs'] > 0:
+            return False
+        # Only remove it if no upload re-acquired it in the meantime
+        result = upload_blobs_collection.delete_one({'_id': blob['_id'], 'refs': {'$lte': 0}})
+        return result.deleted_count == 1
+
+class UploadImage:
+    """Owner and stored variants of a processed image, keyed by the id returned to the client"""
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the variant lookup index used when deleting by any variant id"""
+        upload_images_collection.create_index('public_ids')
+
+    @staticmethod
+    def register(public_id, user_id, public_ids):
+        """Record an image whose variants will be stored under public_ids"""
+        upload_images_collection.insert_one({
+            '_id': public_id,
+            'user_id': user_id,
+            'public_ids': public_ids,
+            'created_at': datetime.utcnow()
+        })
+
+    @staticmethod
+    def find_by_public_id(public_id):
+        """The image that public_id (the primary or any variant) belongs to, or None"""
+        return upload_images_collection.find_one({'public_ids': public_id})
+
+    @staticmethod
+    def remove(public_id):
+        upload_images_collection.delete_one({'_id': public_id})
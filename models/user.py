@@ -1,6 +1,8 @@
 from datetime import datetime
 from bson import ObjectId
 from pymongo import MongoClient
+from services.profiles import profile_store, profile_propagator
+from services.identity import user_cache, identity_map
 import bcrypt
 import os
 
@@ -21,6 +23,7 @@ except Exception as e:
 
 db = client['ecofarm-quest']
 users_collection = db['users']
+revoked_tokens_collection = db['revoked_tokens']
 
 class User:
     def __init__(self, **kwargs):
@@ -126,10 +129,18 @@ class User:
             print(f"Password check error: {e}")
             return False
 
+    def identity_key(self):
+        return (str(self.id),)
+
     def save(self):
-        """Save user to database"""
-        # Build the DB document explicitly so we include the hashed password
-        db_doc = {
+        """Save user to database (once before the response when loaded in a request)"""
+        if identity_map.defer_save(self):
+            return self
+        return self._write()
+
+    def to_document(self):
+        """Convert user object to a database document (includes the hashed password, dates stay BSON dates)"""
+        return {
             'name': self.name,
             'email': self.email,
             'password': self.password,
@@ -149,27 +160,45 @@ class User:
             'last_login': self.last_login
         }
 
+    def snapshot(self):
+        """Stored fields compared by the identity map to find what changed"""
+        return {k: v for k, v in self.to_document().items() if k != 'updated_at'}
+
+    def _write(self, changes=None):
+        db_doc = self.to_document()
         if self.id:
-            # Update existing user - don't alter _id
+            # Update existing user - don't alter _id; only the changed fields when the identity map knows them
+            fields = {**changes, 'updated_at': db_doc['updated_at']} if changes is not None else db_doc
             users_collection.update_one(
                 {'_id': ObjectId(self.id)},
-                {'$set': db_doc}
+                {'$set': fields}
             )
         else:
             # Insert new user document
             result = users_collection.insert_one(db_doc)
             self.id = str(result.inserted_id)
+            identity_map.merge(self)
+        user_cache.invalidate(self.id)
+        profile_store.invalidate(self.id)
         return self
 
     @staticmethod
     def find_by_id(user_id):
-        """Find user by ID"""
-        user_data = users_collection.find_one({'_id': ObjectId(user_id)})
+        """Find user by ID (served from the per-worker user cache when fresh)"""
+        return identity_map.load(User, (str(user_id),), lambda: User._from_cache(user_id))
+
+    @staticmethod
+    def _from_cache(user_id):
+        user_data = user_cache.get_or_load(user_id, User._load_document)
         if user_data:
             user_data['_id'] = str(user_data['_id'])
             return User(**user_data)
         return None
 
+    @staticmethod
+    def _load_document(user_id):
+        return users_collection.find_one({'_id': ObjectId(user_id)})
+
     @staticmethod
     def find_by_email(email):
         """Find user by email"""
@@ -192,6 +221,9 @@ class User:
         """Delete user from database"""
         if self.id:
             users_collection.delete_one({'_id': ObjectId(self.id)})
+            identity_map.discard(self)
+            user_cache.invalidate(self.id)
+            profile_store.invalidate(self.id)
             return True
         return False
 
@@ -213,12 +245,18 @@ class User:
             'name', 'phone', 'location', 'farm_size', 
             'primary_crops', 'farming_experience', 'water_source', 'avatar'
         ]
+        previous = {'name': self.name, 'avatar': self.avatar}
         for field in allowed_fields:
             if field in profile_data:
                 setattr(self, field, profile_data[field])
         self.updated_at = datetime.utcnow()
         self.save()
 
+        # Copies of the name/avatar on discussions, replies and boards are fixed in the background
+        changed = {field: getattr(self, field) for field, value in previous.items() if getattr(self, field) != value}
+        if changed:
+            profile_propagator.enqueue(self.id, changed)
+
     def update_last_login(self):
         """Update user's last login timestamp"""
         self.last_login = datetime.utcnow()
@@ -1,9 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.community import Achievement
+from models.community import Achievement, UserAchievement, AchievementLeaderboard
 from models.user import User
-from models.notification import Notification
-from datetime import datetime
+from services.achievements import achievement_engine, CHECK_TYPES, STAT_ALIASES
 
 achievements_bp = Blueprint('achievements', __name__)
 
@@ -83,9 +82,6 @@ def get_my_achievements():
     """Get user's achievements"""
     try:
         current_user_id = get_jwt_identity()
-        
-        # In a real implementation, you would have a user_achievements collection
-        # For now, we'll return mock data based on user progress
         user = User.find_by_id(current_user_id)
         if not user:
             return jsonify({
@@ -93,94 +89,33 @@ def get_my_achievements():
                 'message': 'User not found'
             }), 404
 
-        # Mock user achievements based on their progress
-        user_achievements = []
-        
-        # Learning achievements
-        if user.learning_stats.get('completed_courses', 0) >= 1:
-            user_achievements.append({
-                'id': 'first_course',
-                'name': 'Knowledge Seeker',
-                'description': 'Complete your first course',
-                'icon': '📚',
-                'category': 'Learning Achievements',
-                'unlocked': True,
-                'unlocked_date': '2025-01-15',
-                'progress': 100
-            })
-        
-        if user.learning_stats.get('completed_courses', 0) >= 3:
-            user_achievements.append({
-                'id': 'course_master',
-                'name': 'Course Master',
-                'description': 'Complete 3 courses',
-                'icon': '🎓',
-                'category': 'Learning Achievements',
-                'unlocked': True,
-                'unlocked_date': '2025-01-20',
-                'progress': 100
-            })
-        else:
-            user_achievements.append({
-                'id': 'course_master',
-                'name': 'Course Master',
-                'description': 'Complete 3 courses',
-                'icon': '🎓',
-                'category': 'Learning Achievements',
-                'unlocked': False,
-                'progress': (user.learning_stats.get('completed_courses', 0) / 3) * 100,
-                'requirement': f"{3 - user.learning_stats.get('completed_courses', 0)} more courses needed"
-            })
-
-        # Streak achievements
-        streak = user.learning_stats.get('learning_streak', 0)
-        if streak >= 7:
-            user_achievements.append({
-                'id': 'consistent_learner',
-                'name': 'Consistent Learner',
-                'description': 'Maintain 7-day learning streak',
-                'icon': '🔥',
-                'category': 'Progress Achievements',
-                'unlocked': True,
-                'unlocked_date': '2025-01-18',
-                'progress': 100
-            })
-        else:
-            user_achievements.append({
-                'id': 'consistent_learner',
-                'name': 'Consistent Learner',
-                'description': 'Maintain 7-day learning streak',
-                'icon': '🔥',
-                'category': 'Progress Achievements',
-                'unlocked': False,
-                'progress': (streak / 7) * 100,
-                'requirement': f"{7 - streak} more days needed"
-            })
+        # Unlocks are recorded by the rule engine as progress events happen
+        unlocks = {unlock.achievement_id: unlock for unlock in UserAchievement.find_by_user_id(current_user_id)}
+        stats = user.learning_stats
 
-        # Points achievements
-        points = user.learning_stats.get('knowledge_points', 0)
-        if points >= 1000:
-            user_achievements.append({
-                'id': 'knowledge_collector',
-                'name': 'Knowledge Collector',
-                'description': 'Earn 1000 knowledge points',
-                'icon': '⭐',
-                'category': 'Progress Achievements',
-                'unlocked': True,
-                'unlocked_date': '2025-01-16',
-                'progress': 100
-            })
-        else:
-            user_achievements.append({
-                'id': 'knowledge_collector',
-                'name': 'Knowledge Collector',
-                'description': 'Earn 1000 knowledge points',
-                'icon': '⭐',
-                'category': 'Progress Achievements',
-                'unlocked': False,
-                'progress': (points / 1000) * 100,
-                'requirement': f"{1000 - points} more points needed"
-            })
+        user_achievements = []
+        for rule in achievement_engine.all_rules():
+            achievement = rule.achievement
+            unlock = unlocks.get(achievement.id)
+            achievement_data = {
+                'id': achievement.id,
+                'name': achievement.name,
+                'description': achievement.description,
+                'icon': achievement.icon,
+                'category': achievement.category,
+                'points': achievement.points,
+                'unlocked': unlock is not None
+            }
+            if unlock:
+                achievement_data['unlocked_date'] = unlock.unlocked_at.strftime('%Y-%m-%d')
+                achievement_data['progress'] = 100
+            else:
+                achievement_data['progress'] = rule.progress(stats)
+                achievement_data['requirement'] = ', '.join(
+                    f"{int(threshold - stats.get(stat, 0))} more {stat.replace('_', ' ')} needed"
+                    for stat, threshold in rule.thresholds.items() if stats.get(stat, 0) < threshold
+                )
+            user_achievements.append(achievement_data)
 
         return jsonify({
             'status': 'success',
@@ -210,62 +145,27 @@ def check_achievements():
                 'message': 'User not found'
             }), 404
 
-        data = request.get_json()
+        data = request.get_json() or {}
         achievement_type = data.get('type')
-        value = data.get('value', 0)
-        
-        new_achievements = []
-        
-        # Check for specific achievement types
-        if achievement_type == 'course_completed':
-            if value == 1:  # First course
-                new_achievements.append({
-                    'id': 'first_course',
-                    'name': 'Knowledge Seeker',
-                    'description': 'Complete your first course',
-                    'icon': '📚'
-                })
-            elif value == 3:  # Third course
-                new_achievements.append({
-                    'id': 'course_master',
-                    'name': 'Course Master',
-                    'description': 'Complete 3 courses',
-                    'icon': '🎓'
-                })
-        
-        elif achievement_type == 'streak_updated':
-            if value >= 7:
-                new_achievements.append({
-                    'id': 'consistent_learner',
-                    'name': 'Consistent Learner',
-                    'description': 'Maintain 7-day learning streak',
-                    'icon': '🔥'
-                })
-        
-        elif achievement_type == 'points_earned':
-            if value >= 1000:
-                new_achievements.append({
-                    'id': 'knowledge_collector',
-                    'name': 'Knowledge Collector',
-                    'description': 'Earn 1000 knowledge points',
-                    'icon': '⭐'
-                })
+        stat = CHECK_TYPES.get(achievement_type, STAT_ALIASES.get(achievement_type, achievement_type))
 
-        # Create notifications for new achievements
-        for achievement in new_achievements:
-            Notification.create_notification(
-                user_id=current_user_id,
-                title="Achievement Unlocked! 🎉",
-                message=f"Congratulations! You've unlocked the '{achievement['name']}' achievement!",
-                notification_type='success',
-                category='achievement',
-                action_url='/achievements'
-            )
+        # Evaluate only the rules that depend on the reported stat, against the stored stats
+        stats = user.learning_stats
+        rules = [rule for rule in achievement_engine.rules_reached(stat, stats.get(stat, 0)) if rule.is_met(stats)]
+        new_achievements = achievement_engine.unlock(current_user_id, rules)
 
         return jsonify({
             'status': 'success',
             'data': {
-                'new_achievements': new_achievements
+                'new_achievements': [
+                    {
+                        'id': achievement.id,
+                        'name': achievement.name,
+                        'description': achievement.description,
+                        'icon': achievement.icon
+                    }
+                    for achievement in new_achievements
+                ]
             }
         }), 200
 
@@ -277,49 +177,21 @@ def check_achievements():
         }), 500
 
 @achievements_bp.route('/leaderboard', methods=['GET'])
+@jwt_required(optional=True)
 def get_achievement_leaderboard():
-    """Get achievement leaderboard"""
+    """Get achievement leaderboard (top users and, when signed in, the user's own rank)"""
     try:
-        # Mock achievement leaderboard data
-        leaderboard = [
-            {
-                'rank': 1,
-                'user_name': 'Rajesh Kumar',
-                'user_avatar': '🐄',
-                'achievements_unlocked': 15,
-                'total_points': 2450,
-                'location': 'Green Valley Village'
-            },
-            {
-                'rank': 2,
-                'user_name': 'Priya Devi',
-                'user_avatar': '🐔',
-                'achievements_unlocked': 12,
-                'total_points': 2380,
-                'location': 'Sunrise Farm'
-            },
-            {
-                'rank': 3,
-                'user_name': 'Anil Singh',
-                'user_avatar': '🐐',
-                'achievements_unlocked': 10,
-                'total_points': 2320,
-                'location': 'Eco Fields'
-            },
-            {
-                'rank': 4,
-                'user_name': 'Farmer John',
-                'user_avatar': '🐄',
-                'achievements_unlocked': 8,
-                'total_points': 1250,
-                'location': 'Green Valley Village'
-            }
-        ]
-        
+        limit = min(int(request.args.get('limit', 10)), 100)
+        current_user_id = get_jwt_identity()
+
+        leaderboard = AchievementLeaderboard.find_top(limit=limit)
+        my_entry = AchievementLeaderboard.find_by_user_id(current_user_id) if current_user_id else None
+
         return jsonify({
             'status': 'success',
             'data': {
-                'leaderboard': leaderboard
+                'leaderboard': [entry.to_dict() for entry in leaderboard],
+                'my_rank': my_entry.to_dict() if my_entry else None
             }
         }), 200
 
@@ -329,5 +201,3 @@ def get_achievement_leaderboard():
             'message': 'Failed to get achievement leaderboard',
             'error': str(e)
         }), 500
-
-
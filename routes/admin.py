@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.user import User
+from bson import ObjectId
+from services.slow_queries import slow_query_log
+from datetime import datetime
+from functools import wraps
+import os
+
+admin_bp = Blueprint('admin', __name__)
+
+# Users allowed to call the admin endpoints, by email
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+def is_admin(user_id):
+    """Whether the user's email is one of ADMIN_EMAILS"""
+    if not ADMIN_EMAILS or not ObjectId.is_valid(str(user_id)):
+        return False
+    user = User.find_by_id(user_id)
+    return bool(user) and user.email.lower() in ADMIN_EMAILS
+
+def admin_required(view):
+    """Require a JWT belonging to one of ADMIN_EMAILS"""
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not is_admin(get_jwt_identity()):
+            return jsonify({
+                'status': 'error',
+                'message': 'Admin access required'
+            }), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    """Get recent slow MongoDB commands, newest first"""
+    try:
+        collection = request.args.get('collection')
+        endpoint = request.args.get('endpoint')
+        min_duration_ms = request.args.get('min_duration_ms', type=float)
+        since = request.args.get('since')
+        limit = min(int(request.args.get('limit', 50)), 500)
+
+        if since:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'since must be an ISO 8601 timestamp'
+                }), 400
+
+        entries = slow_query_log.find(
+            collection=collection, endpoint=endpoint, min_duration_ms=min_duration_ms, since=since, limit=limit
+        )
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'slow_queries': entries,
+                'threshold_ms': slow_query_log.threshold_ms
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to get slow queries',
+            'error': str(e)
+        }), 500
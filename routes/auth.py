@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 import logging
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt, decode_token
+from services.revocation import token_denylist
 from models.user import User
 from models.notification import Notification
 import re
@@ -232,8 +233,24 @@ def refresh():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    """Logout user (client-side token removal)"""
+    """Logout user (revokes the access token and, if given, the refresh token)"""
     try:
+        claims = get_jwt()
+        current_user_id = get_jwt_identity()
+        token_denylist.revoke(claims['jti'], current_user_id, datetime.utcfromtimestamp(claims['exp']))
+
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        if refresh_token:
+            try:
+                refresh_claims = decode_token(refresh_token)
+            except Exception:
+                # Expired, malformed or already revoked: it cannot be used anyway
+                refresh_claims = {}
+            if refresh_claims.get('sub') == current_user_id:
+                token_denylist.revoke(
+                    refresh_claims['jti'], current_user_id, datetime.utcfromtimestamp(refresh_claims['exp'])
+                )
+
         return jsonify({
             'status': 'success',
             'message': 'Logout successful'
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.community import Discussion, DiscussionReply, Leaderboard
+from models.community import Discussion, DiscussionReply, Leaderboard, CommunityStats, GLOBAL_PARTITION
 from models.user import User
 from models.notification import Notification
 from datetime import datetime
@@ -113,11 +113,14 @@ def get_discussion(discussion_id):
                 'message': 'Discussion not found'
             }), 404
 
-        # Get replies
-        replies = DiscussionReply.find_by_discussion_id(discussion_id)
+        # First page of replies; later pages come from /replies?cursor=
+        limit = max(1, min(int(request.args.get('limit', 50)), 100))
+        replies, next_cursor = DiscussionReply.find_page(discussion_id, limit=limit)
+        DiscussionReply.hydrate_authors([discussion] + replies)
         
         discussion_data = discussion.to_dict()
         discussion_data['replies'] = [reply.to_dict() for reply in replies]
+        discussion_data['next_cursor'] = next_cursor
 
         return jsonify({
             'status': 'success',
@@ -133,6 +136,37 @@ def get_discussion(discussion_id):
             'error': str(e)
         }), 500
 
+@community_bp.route('/discussions/<discussion_id>/replies', methods=['GET'])
+def get_discussion_replies(discussion_id):
+    """Get a page of replies after the given cursor"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 100))
+        try:
+            replies, next_cursor = DiscussionReply.find_page(
+                discussion_id, cursor=request.args.get('cursor'), limit=limit
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        DiscussionReply.hydrate_authors(replies)
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'replies': [reply.to_dict() for reply in replies],
+                'next_cursor': next_cursor
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to get replies',
+            'error': str(e)
+        }), 500
+
 @community_bp.route('/discussions/<discussion_id>/reply', methods=['POST'])
 @jwt_required()
 def reply_to_discussion(discussion_id):
@@ -223,19 +257,35 @@ def like_discussion(discussion_id):
         }), 500
 
 @community_bp.route('/leaderboard', methods=['GET'])
+@jwt_required(optional=True)
 def get_leaderboard():
-    """Get leaderboard by category"""
+    """Get leaderboard by category (village/district boards default to the user's own)"""
     try:
         category = request.args.get('category', 'global')
         limit = int(request.args.get('limit', 50))
-        
-        leaderboard_entries = Leaderboard.find_by_category(category, limit=limit)
+        partition = request.args.get('partition')
+        current_user_id = get_jwt_identity()
+
+        my_entry = Leaderboard.find_rank(current_user_id, category) if current_user_id else None
+        if category not in ('village', 'district'):
+            partition = GLOBAL_PARTITION
+        elif not partition and my_entry:
+            partition = my_entry.partition
+        if not partition:
+            return jsonify({
+                'status': 'error',
+                'message': 'A partition is required for village and district leaderboards'
+            }), 400
+
+        leaderboard_entries = Leaderboard.find_by_category(category, limit=limit, partition=partition)
         
         return jsonify({
             'status': 'success',
             'data': {
                 'leaderboard': [entry.to_dict() for entry in leaderboard_entries],
-                'category': category
+                'category': category,
+                'partition': partition,
+                'my_rank': my_entry.to_dict() if my_entry and my_entry.partition == partition else None
             }
         }), 200
 
@@ -264,22 +314,16 @@ def update_leaderboard():
         points = data.get('points', 0)
         category = data.get('category', 'global')
         
-        # Update leaderboard
-        Leaderboard.update_user_rank(current_user_id, points, category)
-        
-        # Get updated rank
-        leaderboard_entries = Leaderboard.find_by_category(category, limit=1000)
-        user_rank = None
-        for entry in leaderboard_entries:
-            if entry.user_id == current_user_id:
-                user_rank = entry.rank
-                break
+        # Update the user's global, district and village boards
+        ranks = Leaderboard.update_user_rank(current_user_id, points, category)
+        user_rank = ranks.get(category)
 
         return jsonify({
             'status': 'success',
             'message': 'Leaderboard updated successfully',
             'data': {
                 'rank': user_rank,
+                'ranks': ranks,
                 'points': points,
                 'category': category
             }
@@ -296,21 +340,9 @@ def update_leaderboard():
 def get_community_stats():
     """Get community statistics"""
     try:
-        # In a real implementation, you would calculate these from the database
-        stats = {
-            'total_discussions': 156,
-            'total_replies': 1247,
-            'active_users': 89,
-            'total_knowledge_points': 45678,
-            'top_categories': [
-                {'name': 'Water Management', 'count': 45},
-                {'name': 'Soil Health', 'count': 38},
-                {'name': 'Pest Control', 'count': 32},
-                {'name': 'Sustainable Practices', 'count': 28},
-                {'name': 'General Discussion', 'count': 13}
-            ]
-        }
-        
+        # Counters are maintained on write and reconciled periodically
+        stats = CommunityStats.get()
+
         return jsonify({
             'status': 'success',
             'data': {
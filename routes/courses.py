@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.course import Course, Lesson, Quiz
-from models.progress import CourseProgress, LessonProgress, UserProgress
+from models.progress import CourseProgress, LessonProgress
+from models.learning_event import LearningEvent
 from models.notification import Notification
+from services.grading import quiz_grader, GradingError
+from services.query_counter import query_budget
 from datetime import datetime
 
 courses_bp = Blueprint('courses', __name__)
@@ -105,13 +108,8 @@ def enroll_course(course_id):
         )
         course_progress.save()
 
-        # Update user progress
-        user_progress = UserProgress.find_by_user_id(current_user_id)
-        if not user_progress:
-            user_progress = UserProgress(user_id=current_user_id)
-        
-        user_progress.total_courses += 1
-        user_progress.save()
+        # Record enrollment (UserProgress is a projection of the learning event log)
+        LearningEvent.record(current_user_id, 'course_enrolled', course_id=course_id)
 
         # Create notification
         Notification.create_notification(
@@ -195,25 +193,27 @@ def complete_lesson(course_id, lesson_id):
         lesson_progress.complete_lesson(time_spent)
 
         # Update course progress
+        newly_completed = lesson_id not in course_progress.completed_lessons
+        was_completed = course_progress.is_completed
         course_progress.complete_lesson(lesson_id)
         
         # Get total lessons in course to calculate progress
         lessons = Lesson.find_by_course_id(course_id)
         course_progress.calculate_progress(len(lessons))
 
-        # Update user progress
-        user_progress = UserProgress.find_by_user_id(current_user_id)
-        if user_progress:
-            user_progress.completed_lessons += 1
-            user_progress.add_knowledge_points(10)  # 10 points per lesson
-            user_progress.update_learning_streak()
+        # Record the completion (10 points per lesson, counted once per lesson)
+        learning_events = []
+        if newly_completed:
+            learning_events.append(LearningEvent(type='lesson_completed', course_id=course_id, lesson_id=lesson_id, points=10))
 
         # Check if course is completed
-        if course_progress.is_completed:
-            user_progress.completed_courses += 1
-            user_progress.certificates += 1
-            user_progress.add_knowledge_points(50)  # 50 bonus points for course completion
-            
+        course_completed = course_progress.is_completed and not was_completed
+        if course_completed:
+            # 50 bonus points for course completion
+            learning_events.append(LearningEvent(type='course_completed', course_id=course_id, points=50))
+        LearningEvent.record_many(current_user_id, learning_events)
+
+        if course_completed:
             # Create completion notification
             Notification.create_notification(
                 user_id=current_user_id,
@@ -246,47 +246,52 @@ def submit_quiz(course_id, quiz_id):
     """Submit quiz answers"""
     try:
         current_user_id = get_jwt_identity()
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({
+                'status': 'error',
+                'message': 'Request body must be a JSON object'
+            }), 400
         
-        # Get quiz
-        quiz = Quiz.find_by_id(quiz_id)
+        # Get the compiled answer key for the quiz
+        quiz = quiz_grader.get(quiz_id)
         if not quiz:
             return jsonify({
                 'status': 'error',
                 'message': 'Quiz not found'
             }), 404
 
-        # Calculate score
-        answers = data.get('answers', [])
-        correct_answers = 0
-        total_questions = len(quiz.questions)
-        
-        for i, question in enumerate(quiz.questions):
-            if i < len(answers) and answers[i] == question['correct_answer']:
-                correct_answers += 1
-
-        score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-        passed = score_percentage >= quiz.passing_score
+        # Calculate score (weighted by question points)
+        try:
+            result = quiz.grade(data.get('answers', []))
+        except GradingError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        score_percentage = result['score']
 
         # Update lesson progress
         lesson_progress = LessonProgress.find_by_user_and_lesson(current_user_id, quiz.lesson_id)
         if lesson_progress:
             lesson_progress.update_quiz_score(score_percentage, quiz.max_attempts)
 
-        # Add knowledge points based on score
-        user_progress = UserProgress.find_by_user_id(current_user_id)
-        if user_progress:
-            points_earned = int(score_percentage / 10)  # 1 point per 10% score
-            user_progress.add_knowledge_points(points_earned)
+        # Add knowledge points based on score (1 point per 10% score)
+        LearningEvent.record(
+            current_user_id, 'quiz_submitted', course_id=course_id, lesson_id=quiz.lesson_id,
+            quiz_id=quiz_id, score=score_percentage, points=int(score_percentage / 10)
+        )
 
         return jsonify({
             'status': 'success',
             'message': 'Quiz submitted successfully',
             'data': {
                 'score': score_percentage,
-                'correct_answers': correct_answers,
-                'total_questions': total_questions,
-                'passed': passed,
+                'correct_answers': result['correct_answers'],
+                'total_questions': result['total_questions'],
+                'earned_points': result['earned_points'],
+                'total_points': result['total_points'],
+                'passed': result['passed'],
                 'points_earned': int(score_percentage / 10)
             }
         }), 200
@@ -300,6 +305,7 @@ def submit_quiz(course_id, quiz_id):
 
 @courses_bp.route('/my-courses', methods=['GET'])
 @jwt_required()
+@query_budget(3)  # progress, courses, and the occasional revoked-token sync
 def get_my_courses():
     """Get user's enrolled courses"""
     try:
@@ -308,10 +314,11 @@ def get_my_courses():
         # Get user's course progress
         course_progress_list = CourseProgress.find_by_user_id(current_user_id)
         
-        # Get course details for each progress
+        # Get course details for all progress records in one query
+        courses = Course.find_by_ids([progress.course_id for progress in course_progress_list])
         courses_data = []
         for progress in course_progress_list:
-            course = Course.find_by_id(progress.course_id)
+            course = courses.get(progress.course_id)
             if course:
                 course_data = course.to_dict()
                 course_data['progress'] = progress.to_dict()
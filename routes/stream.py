@@ -0,0 +1,43 @@
+from flask import Blueprint, Response, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.events import event_broker
+import json
+
+stream_bp = Blueprint('stream', __name__)
+
+def format_event(event):
+    """Format an event as a Server-Sent Events message"""
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+@stream_bp.route('', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream():
+    """Push notifications and discussion replies to the user (Server-Sent Events)"""
+    current_user_id = get_jwt_identity()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    heartbeat_seconds = current_app.config.get('STREAM_HEARTBEAT_SECONDS', 15)
+
+    # Subscribe before replaying so nothing published in between is lost
+    subscription = event_broker.subscribe(current_user_id)
+    missed_events = event_broker.replay(current_user_id, last_event_id)
+
+    def generate():
+        try:
+            yield f"retry: {heartbeat_seconds * 1000}\n\n"
+            sent = set()
+            for event in missed_events:
+                sent.add(event.id)
+                yield format_event(event)
+            while True:
+                event = subscription.get(timeout=heartbeat_seconds)
+                if event is None:
+                    yield ": heartbeat\n\n"
+                elif event.id not in sent:
+                    yield format_event(event)
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
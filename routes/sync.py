@@ -0,0 +1,40 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.progress_sync import sync_progress, SyncError
+
+sync_bp = Blueprint('sync', __name__)
+
+@sync_bp.route('/progress', methods=['POST'])
+@jwt_required()
+def sync_user_progress():
+    """Apply a batch of offline lesson completions and quiz submissions"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+
+        if 'events' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': 'events is required'
+            }), 400
+
+        result = sync_progress(current_user_id, data['events'])
+
+        return jsonify({
+            'status': 'success',
+            'message': 'Progress synced successfully',
+            'data': result
+        }), 200
+
+    except SyncError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to sync progress',
+            'error': str(e)
+        }), 500
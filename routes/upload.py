@@ -1,21 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, abort, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import os
-import cloudinary
-import cloudinary.uploader
 from werkzeug.utils import secure_filename
-from PIL import Image
 import uuid
+from services.storage import upload_storage
+from services.images import image_pipeline, sniff_image, ImagePipelineBusy, IMAGE_VARIANT_WIDTHS
+from services.resumable import resumable_uploads, UploadSessionError
+from models.upload import UploadImage
+from routes.admin import is_admin
 
 upload_bp = Blueprint('upload', __name__)
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-    api_key=os.getenv('CLOUDINARY_API_KEY'),
-    api_secret=os.getenv('CLOUDINARY_API_SECRET')
-)
-
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
@@ -24,14 +19,20 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def validate_image(file):
-    """Validate image file"""
-    try:
-        with Image.open(file) as img:
-            img.verify()
-        file.seek(0)  # Reset file pointer
-        return True
-    except Exception:
-        return False
+    """Check the image header; full decoding happens in the image pipeline"""
+    return sniff_image(file) is not None
+
+def record_image(job, user_id, primary):
+    """Record who owns a queued image and where each variant is stored; returns the primary's stored id"""
+    public_ids = {label: upload_storage.locate(public_id) for label, public_id in job.public_ids().items()}
+    UploadImage.register(public_ids[primary], user_id, list(public_ids.values()))
+    return public_ids[primary]
+
+def busy_response():
+    return jsonify({
+        'status': 'error',
+        'message': 'Image processing is busy. Please try again shortly.'
+    }), 503
 
 @upload_bp.route('/avatar', methods=['POST'])
 @jwt_required()
@@ -71,40 +72,32 @@ def upload_avatar():
                 'message': 'File too large. Maximum size is 16MB.'
             }), 400
 
-        # Validate image if it's an image file
-        if file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-            if not validate_image(file):
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Invalid image file'
-                }), 400
-
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{current_user_id}_{uuid.uuid4().hex}{ext}"
+        # Avatars must be images; only the header is read here
+        if not validate_image(file):
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid image file'
+            }), 400
 
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            file,
-            public_id=f"avatars/{unique_filename}",
-            folder="ecofarm-quest/avatars",
-            transformation=[
-                {'width': 300, 'height': 300, 'crop': 'fill', 'gravity': 'face'},
-                {'quality': 'auto', 'fetch_format': 'auto'}
-            ]
-        )
+        # Crops, WebP/JPEG variants and the thumbnail are produced in the background
+        base_name = f"{current_user_id}_{uuid.uuid4().hex}"
+        try:
+            job, variants = image_pipeline.submit(file, 'avatar', 'avatars', base_name)
+        except ImagePipelineBusy:
+            return busy_response()
 
         return jsonify({
             'status': 'success',
             'message': 'Avatar uploaded successfully',
             'data': {
-                'url': upload_result['secure_url'],
-                'public_id': upload_result['public_id'],
-                'width': upload_result['width'],
-                'height': upload_result['height']
+                'url': variants['300.jpg'],
+                'public_id': record_image(job, current_user_id, '300.jpg'),
+                'width': 300,
+                'height': 300,
+                'variants': variants,
+                'processing': True
             }
-        }), 200
+        }), 202
 
     except Exception as e:
         return jsonify({
@@ -119,7 +112,7 @@ def upload_certificate():
     """Upload course certificate"""
     try:
         current_user_id = get_jwt_identity()
-        data = request.get_json()
+        data = request.form
         course_id = data.get('course_id')
         
         if not course_id:
@@ -159,15 +152,15 @@ def upload_certificate():
                 'message': 'File too large. Maximum size is 16MB.'
             }), 400
 
-        # Generate unique filename
         filename = secure_filename(file.filename)
         name, ext = os.path.splitext(filename)
-        unique_filename = f"{current_user_id}_{course_id}_{uuid.uuid4().hex}{ext}"
 
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
+        # Stored once per distinct content; re-uploads reuse the existing object
+        upload_result = upload_storage.save_content(
             file,
-            public_id=f"certificates/{unique_filename}",
+            'certificates',
+            current_user_id,
+            ext,
             folder="ecofarm-quest/certificates",
             transformation=[
                 {'width': 800, 'height': 600, 'crop': 'fit'},
@@ -181,7 +174,8 @@ def upload_certificate():
             'data': {
                 'url': upload_result['secure_url'],
                 'public_id': upload_result['public_id'],
-                'course_id': course_id
+                'course_id': course_id,
+                'deduplicated': upload_result['deduplicated']
             }
         }), 200
 
@@ -198,7 +192,7 @@ def upload_course_material():
     """Upload course material (for instructors)"""
     try:
         current_user_id = get_jwt_identity()
-        data = request.get_json()
+        data = request.form
         course_id = data.get('course_id')
         material_type = data.get('type', 'document')  # document, image, video
         
@@ -239,16 +233,37 @@ def upload_course_material():
                 'message': 'File too large. Maximum size is 16MB.'
             }), 400
 
-        # Generate unique filename
         filename = secure_filename(file.filename)
         name, ext = os.path.splitext(filename)
-        unique_filename = f"{course_id}_{material_type}_{uuid.uuid4().hex}{ext}"
 
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
+        # Course images are stored as EXIF-free responsive variants instead of the original
+        if ext.lower() != '.pdf' and validate_image(file):
+            base_name = f"{current_user_id}_{course_id}_{material_type}_{uuid.uuid4().hex}"
+            try:
+                job, variants = image_pipeline.submit(file, 'course_image', 'course-materials', base_name)
+            except ImagePipelineBusy:
+                return busy_response()
+            largest = f'w{max(IMAGE_VARIANT_WIDTHS)}.jpg'
+            return jsonify({
+                'status': 'success',
+                'message': 'Course material uploaded successfully',
+                'data': {
+                    'url': variants[largest],
+                    'public_id': record_image(job, current_user_id, largest),
+                    'course_id': course_id,
+                    'type': material_type,
+                    'variants': variants,
+                    'processing': True
+                }
+            }), 202
+
+        # Stored once per distinct content; re-uploads reuse the existing object
+        upload_result = upload_storage.save_content(
             file,
-            public_id=f"course-materials/{unique_filename}",
-            folder=f"ecofarm-quest/course-materials/{course_id}",
+            'course-materials',
+            current_user_id,
+            ext,
+            folder="ecofarm-quest/course-materials",
             resource_type="auto"
         )
 
@@ -259,7 +274,8 @@ def upload_course_material():
                 'url': upload_result['secure_url'],
                 'public_id': upload_result['public_id'],
                 'course_id': course_id,
-                'type': material_type
+                'type': material_type,
+                'deduplicated': upload_result['deduplicated']
             }
         }), 200
 
@@ -270,10 +286,175 @@ def upload_course_material():
             'error': str(e)
         }), 500
 
+def session_response(session, status=200):
+    """JSON body plus Upload-Offset/Upload-Length headers for an upload session"""
+    data = {
+        'upload_id': session['_id'],
+        'offset': session['offset'],
+        'size': session['size'],
+        'status': session['status']
+    }
+    if session.get('result'):
+        data.update(session['result'])
+    response = jsonify({'status': 'success', 'data': data})
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(session['offset'])
+    response.headers['Upload-Length'] = str(session['size'])
+    response.headers['Location'] = url_for('upload.get_upload_session', upload_id=session['_id'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def session_error_response(error):
+    response = jsonify({
+        'status': 'error',
+        'message': str(error),
+        'offset': error.offset
+    })
+    response.status_code = error.status
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response
+
+def finalize_session(session):
+    """Store a fully received upload session as course material"""
+    name, ext = os.path.splitext(session['filename'])
+
+    def store(staged):
+        # Same content-addressed storage as single-request course material uploads
+        result = upload_storage.save_content(
+            staged,
+            'course-materials',
+            session['user_id'],
+            ext,
+            folder="ecofarm-quest/course-materials",
+            resource_type="auto"
+        )
+        return {
+            'url': result['secure_url'],
+            'public_id': result['public_id'],
+            'deduplicated': result['deduplicated'],
+            **session['metadata']
+        }
+
+    return resumable_uploads.complete(session, store)
+
+@upload_bp.route('/sessions', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    """Start a resumable course material upload"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        course_id = data.get('course_id')
+        filename = secure_filename(data.get('filename', ''))
+
+        if not course_id:
+            return jsonify({
+                'status': 'error',
+                'message': 'Course ID is required'
+            }), 400
+
+        if not filename or not allowed_file(filename):
+            return jsonify({
+                'status': 'error',
+                'message': 'File type not allowed'
+            }), 400
+
+        session = resumable_uploads.create(current_user_id, filename, data.get('size'), {
+            'course_id': course_id,
+            'type': data.get('type', 'document')
+        })
+        return session_response(session, 201)
+
+    except UploadSessionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), e.status
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to create upload session',
+            'error': str(e)
+        }), 500
+
+@upload_bp.route('/sessions/<upload_id>', methods=['GET', 'HEAD'])
+@jwt_required()
+def get_upload_session(upload_id):
+    """Report how many bytes of a resumable upload the server has"""
+    session = resumable_uploads.get(upload_id, get_jwt_identity())
+    if session is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Upload session not found'
+        }), 404
+    return session_response(session)
+
+@upload_bp.route('/sessions/<upload_id>', methods=['PATCH'])
+@jwt_required()
+def upload_session_chunk(upload_id):
+    """Append a chunk at Upload-Offset; the upload is stored once the last byte arrives"""
+    try:
+        session = resumable_uploads.get(upload_id, get_jwt_identity())
+        if session is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Upload session not found'
+            }), 404
+
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return jsonify({
+                'status': 'error',
+                'message': 'Upload-Offset header is required'
+            }), 400
+
+        # request.stream is read in small blocks, so memory stays constant per upload
+        session = resumable_uploads.write_chunk(session, offset, request.stream, request.content_length)
+        if session['offset'] < session['size']:
+            return session_response(session)
+
+        return session_response(finalize_session(session))
+
+    except UploadSessionError as e:
+        return session_error_response(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to upload chunk',
+            'error': str(e)
+        }), 500
+
+@upload_bp.route('/sessions/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload_session(upload_id):
+    """Retry storing a fully received upload whose finalize failed"""
+    try:
+        session = resumable_uploads.get(upload_id, get_jwt_identity())
+        if session is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Upload session not found'
+            }), 404
+        if session['status'] == 'complete':
+            return session_response(session)
+
+        return session_response(finalize_session(session))
+
+    except UploadSessionError as e:
+        return session_error_response(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to complete upload',
+            'error': str(e)
+        }), 500
+
 @upload_bp.route('/delete', methods=['DELETE'])
 @jwt_required()
 def delete_file():
-    """Delete uploaded file from Cloudinary"""
+    """Delete uploaded file from storage"""
     try:
         current_user_id = get_jwt_identity()
         data = request.get_json()
@@ -285,10 +466,16 @@ def delete_file():
                 'message': 'Public ID is required'
             }), 400
 
-        # Delete from Cloudinary
-        result = cloudinary.uploader.destroy(public_id)
-        
-        if result.get('result') == 'ok':
+        # Only the caller's reference is dropped; shared content goes once the last one is deleted
+        try:
+            deleted = upload_storage.release(public_id, current_user_id, admin=is_admin(current_user_id))
+        except PermissionError:
+            return jsonify({
+                'status': 'error',
+                'message': 'You do not own this file'
+            }), 403
+
+        if deleted:
             return jsonify({
                 'status': 'success',
                 'message': 'File deleted successfully'
@@ -296,8 +483,8 @@ def delete_file():
         else:
             return jsonify({
                 'status': 'error',
-                'message': 'Failed to delete file'
-            }), 500
+                'message': 'File not found'
+            }), 404
 
     except Exception as e:
         return jsonify({
@@ -306,6 +493,14 @@ def delete_file():
             'error': str(e)
         }), 500
 
+@upload_bp.route('/files/<path:public_id>', methods=['GET'])
+def get_file(public_id):
+    """Serve a file stored by the local storage backend"""
+    path = upload_storage.local_path(public_id)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_file(path, conditional=True, max_age=31536000)
+
 @upload_bp.route('/config', methods=['GET'])
 def get_upload_config():
     """Get upload configuration for frontend"""
@@ -314,12 +509,15 @@ def get_upload_config():
             'max_file_size': MAX_FILE_SIZE,
             'allowed_extensions': list(ALLOWED_EXTENSIONS),
             'max_file_size_mb': MAX_FILE_SIZE // (1024 * 1024),
+            'storage_backend': upload_storage.name,
             'avatar_transformations': {
                 'width': 300,
                 'height': 300,
                 'crop': 'fill',
                 'gravity': 'face'
             },
+            'image_variant_widths': IMAGE_VARIANT_WIDTHS,
+            'image_variant_formats': ['webp', 'jpg'],
             'certificate_transformations': {
                 'width': 800,
                 'height': 600,
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Notification archival script for EcoFarm Quest
+Moves cold (read and older than NOTIFICATION_ARCHIVE_AFTER_DAYS) notifications
+into the compressed notifications_archive collection. Meant to be run from cron.
+"""
+
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from models.notification import Notification, NOTIFICATION_ARCHIVE_AFTER_DAYS, NOTIFICATION_ARCHIVE_BATCH_SIZE
+
+def main():
+    """Main archival function"""
+    parser = argparse.ArgumentParser(description='Archive read notifications')
+    parser.add_argument('--days', type=int, default=NOTIFICATION_ARCHIVE_AFTER_DAYS,
+                        help='Archive notifications read more than this many days ago')
+    parser.add_argument('--batch-size', type=int, default=NOTIFICATION_ARCHIVE_BATCH_SIZE,
+                        help='Number of notifications moved per batch')
+    args = parser.parse_args()
+
+    print("📦 Archiving old notifications...")
+    try:
+        Notification.ensure_indexes()
+        archived = Notification.archive_old_notifications(days=args.days, batch_size=args.batch_size)
+        print(f"✅ Archived {archived} notifications")
+    except Exception as e:
+        print(f"❌ Error during archival: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Shared fixture data for EcoFarm Quest
+Sample records used by the database seeder, the test fixtures and the load generator,
+kept free of model imports so any of them can load it without a database connection.
+"""
+
+# Sample farmers created by seed_database.py
+SAMPLE_USERS = [
+    {
+        'name': 'Rajesh Kumar',
+        'email': 'rajesh@example.com',
+        'password': 'password123',
+        'phone': '+91 98765 43210',
+        'location': 'Green Valley Village',
+        'farm_size': '8 acres',
+        'primary_crops': ['Rice', 'Wheat', 'Vegetables'],
+        'farming_experience': '20 years',
+        'water_source': 'canal',
+        'avatar': {'emoji': '🐄', 'name': 'Gau Mata', 'type': 'Dairy Specialist'}
+    },
+    {
+        'name': 'Priya Devi',
+        'email': 'priya@example.com',
+        'password': 'password123',
+        'phone': '+91 98765 43211',
+        'location': 'Sunrise Farm',
+        'farm_size': '5 acres',
+        'primary_crops': ['Tomatoes', 'Chilies', 'Onions'],
+        'farming_experience': '15 years',
+        'water_source': 'borewell',
+        'avatar': {'emoji': '🐔', 'name': 'Murgi', 'type': 'Poultry Expert'}
+    },
+    {
+        'name': 'Anil Singh',
+        'email': 'anil@example.com',
+        'password': 'password123',
+        'phone': '+91 98765 43212',
+        'location': 'Eco Fields',
+        'farm_size': '12 acres',
+        'primary_crops': ['Sugarcane', 'Cotton', 'Pulses'],
+        'farming_experience': '25 years',
+        'water_source': 'river',
+        'avatar': {'emoji': '🐐', 'name': 'Bakri', 'type': 'Livestock Guardian'}
+    }
+]
+
+# Records returned by the tests/conftest.py fixtures
+
+# Test user data
+TEST_USER_DATA = {
+    'name': 'Test Farmer',
+    'email': 'test@example.com',
+    'password': 'TestPassword123',
+    'phone': '+91 98765 43210',
+    'location': 'Test Village',
+    'farm_size': '5 acres',
+    'primary_crops': ['Rice', 'Wheat'],
+    'farming_experience': '10 years',
+    'water_source': 'borewell'
+}
+
+# Test course data
+TEST_COURSE_DATA = {
+    'title': 'Test Course',
+    'description': 'A test course for unit testing',
+    'category': 'water',
+    'duration': '2 hours',
+    'difficulty': 2,
+    'thumbnail': '🌊',
+    'color': '#2196F3',
+    'certificate': 'Test Certificate'
+}
+
+# Test achievement data
+TEST_ACHIEVEMENT_DATA = {
+    'name': 'Test Achievement',
+    'description': 'This is a test achievement for unit testing',
+    'icon': '🏆',
+    'points': 100,
+    'category': 'learning',
+    'requirements': {
+        'courses_completed': 1,
+        'lessons_completed': 5
+    },
+    'rarity': 'common'
+}
+
+# Test discussion data
+TEST_DISCUSSION_DATA = {
+    'title': 'Test Discussion',
+    'content': 'This is a test discussion for unit testing',
+    'category': 'general',
+    'author_id': 'test-user-id',
+    'author_name': 'Test Farmer',
+    'author_avatar': '🐄'
+}
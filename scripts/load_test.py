@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Synthetic load generator for EcoFarm Quest
+Replays a weighted mix of farmer session scripts (browsing, learning, community) against
+a running instance with a number of concurrent virtual farmers, then reports throughput
+and p50/p95/p99 latency per endpoint. Start the server with RATELIMIT_ENABLED=false.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from urllib import request as urllib_request
+from urllib.error import HTTPError, URLError
+
+# Add the parent directory to the path so we can import the fixture data
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.fixture_data import SAMPLE_USERS, TEST_USER_DATA, TEST_DISCUSSION_DATA
+
+DEFAULT_MIX = 'learner=50,browser=30,community=20'
+SEARCH_TERMS = ['irrigation', 'soil', 'compost', 'pest', 'water', 'organic']
+REPLIES = [
+    'Thanks, this worked on my farm too.',
+    'We tried drip lines last season and saved a lot of water.',
+    'Which variety did you use?',
+    'Our village cooperative can help with this.'
+]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+class LoadStats:
+    """Latencies and outcomes per endpoint, shared by every virtual farmer"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def session_done(self, name):
+        with self.lock:
+            self.sessions[name] = self.sessions.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(endpoint, 0),
+                'throughput': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000
+            }
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'elapsed_seconds': elapsed,
+            'requests': total,
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            'throughput': total / elapsed if elapsed else 0,
+            'sessions': dict(self.sessions),
+            'endpoints': endpoints
+        }
+
+class Farmer:
+    """One virtual farmer: an account shaped like the seeded sample users, and an HTTP client"""
+
+    def __init__(self, index, base_url, stats, rng, think_time, timeout):
+        sample = SAMPLE_USERS[index % len(SAMPLE_USERS)]
+        self.profile = dict(
+            TEST_USER_DATA,
+            name=f"{sample['name']} {index}",
+            email=f'loadtest-farmer-{index}@example.com',
+            location=sample['location'],
+            farm_size=sample['farm_size'],
+            primary_crops=sample['primary_crops'],
+            farming_experience=sample['farming_experience'],
+            water_source=sample['water_source']
+        )
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time
+        self.timeout = timeout
+        self.token = None
+
+    def call(self, method, path, endpoint, body=None, expected=(200,)):
+        """Send one request, recording its latency under the endpoint's route pattern"""
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib_request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with urllib_request.urlopen(req, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except HTTPError as e:
+            status, payload = e.code, e.read()
+        except (URLError, OSError):
+            status, payload = None, b''
+        self.stats.record(f'{method} {endpoint}', time.perf_counter() - started, status in expected)
+        try:
+            payload = json.loads(payload) if payload else {}
+        except ValueError:
+            payload = {}
+        return status, payload.get('data') or {}
+
+    def think(self):
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+
+    def sign_in(self):
+        """Log in, registering the account on its first session"""
+        credentials = {'email': self.profile['email'], 'password': self.profile['password']}
+        status, data = self.call('POST', '/auth/login', '/auth/login', credentials, expected=(200, 401))
+        if status == 401:
+            status, data = self.call('POST', '/auth/register', '/auth/register', self.profile, expected=(201, 200))
+        self.token = data.get('access_token')
+        self.think()
+        return self.token is not None
+
+    def browse_courses(self):
+        """List courses and open one, returning its details"""
+        _, data = self.call('GET', '/courses/', '/courses/')
+        courses = data.get('courses', [])
+        self.think()
+        if not courses:
+            return None
+        course_id = self.rng.choice(courses)['id']
+        _, data = self.call('GET', f'/courses/{course_id}', '/courses/<course_id>')
+        self.think()
+        return data.get('course')
+
+    def read_discussions(self):
+        """List (or search) discussions and open one, returning its id"""
+        if self.rng.random() < 0.3:
+            term = self.rng.choice(SEARCH_TERMS)
+            _, data = self.call('GET', f'/community/discussions?search={term}', '/community/discussions?search')
+        else:
+            _, data = self.call('GET', '/community/discussions', '/community/discussions')
+        discussions = data.get('discussions', [])
+        self.think()
+        if not discussions:
+            return None
+        discussion_id = self.rng.choice(discussions)['id']
+        self.call('GET', f'/community/discussions/{discussion_id}', '/community/discussions/<discussion_id>')
+        self.think()
+        return discussion_id
+
+    def check_leaderboard(self):
+        self.call('GET', '/community/leaderboard', '/community/leaderboard')
+        self.think()
+
+def browser_session(farmer):
+    """Anonymous visitor: looks at courses, the forum and the leaderboard"""
+    farmer.token = None
+    farmer.browse_courses()
+    farmer.read_discussions()
+    farmer.check_leaderboard()
+
+def learner_session(farmer):
+    """Farmer working through a course: enroll, complete lessons, take the quiz"""
+    if not farmer.sign_in():
+        return
+    course = farmer.browse_courses()
+    if course:
+        course_id = course['id']
+        farmer.call('POST', f'/courses/{course_id}/enroll', '/courses/<course_id>/enroll', {},
+                    expected=(200, 201, 409))
+        farmer.think()
+        lessons = sorted(course.get('lessons', []), key=lambda lesson: lesson.get('order', 0))
+        start = farmer.rng.randrange(len(lessons)) if lessons else 0
+        for lesson in lessons[start:start + farmer.rng.randint(1, 3)]:
+            farmer.call('POST', f"/courses/{course_id}/lessons/{lesson['id']}/complete",
+                        '/courses/<course_id>/lessons/<lesson_id>/complete',
+                        {'time_spent': farmer.rng.randint(5, 25)})
+            farmer.think()
+        for quiz in course.get('quizzes', [])[:1]:
+            answers = [farmer.rng.randint(0, 3) for _ in quiz.get('questions', [])]
+            farmer.call('POST', f"/courses/{course_id}/quiz/{quiz['id']}/submit",
+                        '/courses/<course_id>/quiz/<quiz_id>/submit', {'answers': answers})
+            farmer.think()
+    farmer.call('GET', '/courses/my-courses', '/courses/my-courses')
+    farmer.think()
+    farmer.check_leaderboard()
+
+def community_session(farmer):
+    """Farmer on the forum: reads, replies and sometimes starts a discussion"""
+    if not farmer.sign_in():
+        return
+    discussion_id = farmer.read_discussions()
+    if discussion_id:
+        farmer.call('POST', f'/community/discussions/{discussion_id}/reply',
+                    '/community/discussions/<discussion_id>/reply',
+                    {'content': farmer.rng.choice(REPLIES)}, expected=(200, 201))
+        farmer.think()
+    if farmer.rng.random() < 0.1:
+        topic = farmer.rng.choice(SEARCH_TERMS)
+        farmer.call('POST', '/community/discussions', '/community/discussions', {
+            'title': f'{TEST_DISCUSSION_DATA["title"]} about {topic}',
+            'content': TEST_DISCUSSION_DATA['content'],
+            'category': TEST_DISCUSSION_DATA['category']
+        }, expected=(200, 201))
+        farmer.think()
+    farmer.check_leaderboard()
+
+SESSIONS = {
+    'browser': browser_session,
+    'learner': learner_session,
+    'community': community_session
+}
+
+def parse_mix(mix):
+    """Parse 'learner=50,browser=30' into ([session names], [weights])"""
+    names, weights = [], []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SESSIONS:
+            raise argparse.ArgumentTypeError(f"unknown session '{name}' (choose from {', '.join(SESSIONS)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+def run(args):
+    """Run the virtual farmers until the duration or session budget is used up"""
+    names, weights = args.mix
+    stats = LoadStats()
+    deadline = time.monotonic() + args.duration
+    budget = {'remaining': args.sessions}
+    budget_lock = threading.Lock()
+
+    def next_session():
+        with budget_lock:
+            if time.monotonic() >= deadline or budget['remaining'] == 0:
+                return False
+            budget['remaining'] -= 1
+            return True
+
+    def virtual_farmer(index):
+        rng = random.Random(args.seed * 100003 + index)
+        farmer = Farmer(index + args.user_offset, args.base_url, stats, rng, args.think_time, args.timeout)
+        while next_session():
+            name = rng.choices(names, weights)[0]
+            SESSIONS[name](farmer)
+            stats.session_done(name)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=virtual_farmer, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(time.monotonic() - started)
+
+def print_report(summary):
+    print(f"\n{'Endpoint':<58} {'Reqs':>6} {'Errs':>5} {'Req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print('-' * 106)
+    for endpoint, result in summary['endpoints'].items():
+        print(f"{endpoint:<58} {result['requests']:>6} {result['errors']:>5} {result['throughput']:>7.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+    print('-' * 106)
+    print(f"📊 {summary['requests']} requests in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['throughput']:.1f} req/s), {summary['errors']} errors, sessions: {summary['sessions']}")
+
+def main():
+    """Main load generation function"""
+    parser = argparse.ArgumentParser(description='Replay synthetic farmer sessions against a running instance')
+    parser.add_argument('--base-url', default=os.getenv('LOAD_TEST_BASE_URL', 'http://localhost:5000/api'),
+                        help='API root of the instance under test')
+    parser.add_argument('--concurrency', type=int, default=10, help='Concurrent virtual farmers')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run for')
+    parser.add_argument('--sessions', type=int, default=-1, help='Stop after this many sessions (-1: no limit)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help=f"Weighted session mix, e.g. '{DEFAULT_MIX}' (sessions: {', '.join(SESSIONS)})")
+    parser.add_argument('--think-time', type=float, default=0.2, help='Mean pause between steps in seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='Request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (same seed, same session scripts)')
+    parser.add_argument('--user-offset', type=int, default=0,
+                        help='First virtual farmer number (use distinct ranges for parallel generators)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the summary as JSON')
+    args = parser.parse_args()
+
+    print(f"🚜 Replaying farmer sessions against {args.base_url} "
+          f"with {args.concurrency} virtual farmers for up to {args.duration:g}s...")
+    try:
+        summary = run(args)
+    except KeyboardInterrupt:
+        print("❌ Interrupted")
+        sys.exit(1)
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"✅ Summary written to {args.json}")
+
+if __name__ == '__main__':
+    main()
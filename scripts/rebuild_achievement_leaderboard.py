@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Achievement leaderboard rebuild script for EcoFarm Quest
+Recomputes the achievement_leaderboard view from user_achievements. The view is
+kept current on every unlock, so this is only needed after repairs or imports.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from models.community import AchievementLeaderboard
+
+def main():
+    """Main rebuild function"""
+    print("🏆 Rebuilding achievement leaderboard...")
+    try:
+        AchievementLeaderboard.ensure_indexes()
+        rows = AchievementLeaderboard.rebuild()
+        print(f"✅ Rebuilt {rows} leaderboard rows")
+    except Exception as e:
+        print(f"❌ Error during rebuild: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
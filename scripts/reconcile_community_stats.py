@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Community statistics reconciliation script for EcoFarm Quest
+Recomputes the community_stats counters from the source collections. Counters are
+updated on every write; run this from cron to correct drift and expire inactive users.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from models.community import CommunityStats
+
+def main():
+    """Main reconciliation function"""
+    print("📊 Reconciling community statistics...")
+    try:
+        CommunityStats.ensure_indexes()
+        stats = CommunityStats.reconcile()
+        print(f"✅ {stats['total_discussions']} discussions, {stats['total_replies']} replies, {stats['active_users']} active users")
+    except Exception as e:
+        print(f"❌ Error during reconciliation: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
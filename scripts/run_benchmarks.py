@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark runner for EcoFarm Quest
+Runs the pytest-benchmark suite in benchmarks/ against a seeded dataset, saves the
+results as a JSON baseline and/or compares them with a saved baseline, failing when
+an endpoint got slower than the allowed threshold.
+"""
+
+import os
+import sys
+import argparse
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description='Benchmark the API hot paths')
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock',
+                        help='Run against mongomock or the MongoDB at MONGODB_URI')
+    parser.add_argument('--users', type=int, default=500, help='Seeded users')
+    parser.add_argument('--courses', type=int, default=10, help='Seeded courses (5 lessons and a quiz each)')
+    parser.add_argument('--discussions', type=int, default=2000, help='Seeded discussions')
+    parser.add_argument('--rounds', type=int, default=50, help='Requests timed per endpoint')
+    parser.add_argument('--save', metavar='NAME', help='Save the results as baseline NAME')
+    parser.add_argument('--compare', metavar='NAME', nargs='?', const='',
+                        help='Compare with baseline NAME (the latest one of this dataset when no name is given)')
+    parser.add_argument('--threshold', type=int, default=10, choices=range(1, 100), metavar='1-99',
+                        help='Percent slowdown of the median that counts as a regression')
+    parser.add_argument('-k', dest='keyword', help='Only run benchmarks matching this expression')
+    args = parser.parse_args()
+
+    os.environ.update({
+        'BENCHMARK_BACKEND': args.backend,
+        'BENCHMARK_USERS': str(args.users),
+        'BENCHMARK_COURSES': str(args.courses),
+        'BENCHMARK_DISCUSSIONS': str(args.discussions),
+        'BENCHMARK_ROUNDS': str(args.rounds)
+    })
+
+    pytest_args = [
+        os.path.join(ROOT, 'benchmarks'), '-q', '-p', 'no:cacheprovider',
+        f'--benchmark-storage=file://{BASELINES}',
+        '--benchmark-sort=name',
+        '--benchmark-columns=min,median,mean,max,stddev,rounds'
+    ]
+    if args.keyword:
+        pytest_args += ['-k', args.keyword]
+    # Baselines are only comparable on the same backend and dataset size, so both are part of the name
+    dataset = f'{args.backend}-{args.users}u-{args.courses}c-{args.discussions}d'
+    if args.save:
+        pytest_args.append(f'--benchmark-save={dataset}-{args.save}')
+    if args.compare is not None:
+        pytest_args.append(f'--benchmark-compare=*_{dataset}-{args.compare or "*"}')
+        pytest_args.append(f'--benchmark-compare-fail=median:{args.threshold}%')
+
+    print(f"⏱️  Benchmarking against {args.backend} "
+          f"({args.users} users, {args.courses} courses, {args.discussions} discussions)...")
+    sys.exit(pytest.main(pytest_args))
+
+if __name__ == '__main__':
+    main()
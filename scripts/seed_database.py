@@ -2,19 +2,41 @@
 """
 Database seeding script for EcoFarm Quest
 This script populates the database with initial data for courses, achievements, and sample users.
+With --bulk it also generates a synthetic dataset of a given size (users, enrollments, lesson
+progress, discussions with replies, notifications and leaderboard entries) for load and scale testing.
 """
 
 import os
 import sys
-from datetime import datetime
+import time
+import random
+import struct
+import argparse
+from datetime import datetime, timedelta
+from collections import Counter, deque
+from multiprocessing import Pool
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
 
 # Add the parent directory to the path so we can import our models
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.course import Course, Lesson, Quiz
-from models.community import Achievement
-from models.user import User
+from models.course import Course, Lesson, Quiz, courses_collection, lessons_collection
+from models.community import (
+    Achievement, Discussion, DiscussionReply, Leaderboard, CommunityStats, location_partitions,
+    discussions_collection, replies_collection, leaderboard_collection
+)
+from models.progress import (
+    UserProgress, CourseProgress, LessonProgress,
+    user_progress_collection, course_progress_collection, lesson_progress_collection
+)
+from models.notification import (
+    Notification, NOTIFICATION_ARCHIVE_AFTER_DAYS, notifications_collection, notifications_archive_collection
+)
+from services.profiles import avatar_emoji
+from models.user import User, users_collection
+from scripts.fixture_data import SAMPLE_USERS
 
 # Load environment variables
 load_dotenv()
@@ -338,46 +360,7 @@ def seed_sample_users():
     """Seed the database with sample users"""
     print("👥 Seeding sample users...")
     
-    sample_users = [
-        {
-            'name': 'Rajesh Kumar',
-            'email': 'rajesh@example.com',
-            'password': 'password123',
-            'phone': '+91 98765 43210',
-            'location': 'Green Valley Village',
-            'farm_size': '8 acres',
-            'primary_crops': ['Rice', 'Wheat', 'Vegetables'],
-            'farming_experience': '20 years',
-            'water_source': 'canal',
-            'avatar': {'emoji': '🐄', 'name': 'Gau Mata', 'type': 'Dairy Specialist'}
-        },
-        {
-            'name': 'Priya Devi',
-            'email': 'priya@example.com',
-            'password': 'password123',
-            'phone': '+91 98765 43211',
-            'location': 'Sunrise Farm',
-            'farm_size': '5 acres',
-            'primary_crops': ['Tomatoes', 'Chilies', 'Onions'],
-            'farming_experience': '15 years',
-            'water_source': 'borewell',
-            'avatar': {'emoji': '🐔', 'name': 'Murgi', 'type': 'Poultry Expert'}
-        },
-        {
-            'name': 'Anil Singh',
-            'email': 'anil@example.com',
-            'password': 'password123',
-            'phone': '+91 98765 43212',
-            'location': 'Eco Fields',
-            'farm_size': '12 acres',
-            'primary_crops': ['Sugarcane', 'Cotton', 'Pulses'],
-            'farming_experience': '25 years',
-            'water_source': 'river',
-            'avatar': {'emoji': '🐐', 'name': 'Bakri', 'type': 'Livestock Guardian'}
-        }
-    ]
-    
-    for user_data in sample_users:
+    for user_data in SAMPLE_USERS:
         # Check if user already exists
         if not User.find_by_email(user_data['email']):
             user = User(
@@ -398,8 +381,351 @@ def seed_sample_users():
         else:
             print(f"  ⚠️  User already exists: {user_data['name']}")
 
+# Bulk dataset (--bulk). Counts per user and per discussion are averages; each chunk of users or
+# discussions is generated from its own random stream, so the output does not depend on --workers.
+BULK_PASSWORD = 'bulk-password'
+BULK_CHUNK_SIZE = 500
+BULK_VILLAGES = ['Green Valley', 'Sunrise Farm', 'Eco Fields', 'River Bend', 'Hill Top', 'Mango Grove',
+                 'Lake View', 'Palm Ridge']
+BULK_DISTRICTS = ['Nashik', 'Pune', 'Satara', 'Kolhapur', 'Nagpur']
+BULK_TOPICS = ['irrigation', 'composting', 'pest control', 'crop rotation', 'drip lines', 'organic manure',
+               'soil testing', 'seed storage']
+BULK_CATEGORIES = ['water', 'soil', 'crops', 'pest', 'general']
+BULK_NOTIFICATIONS = [
+    ('Lesson reminder', 'Your next lesson is waiting for you.', 'info', 'learning'),
+    ('New reply', 'Someone replied to a discussion you follow.', 'info', 'community'),
+    ('Achievement unlocked! 🏆', 'You unlocked a new achievement.', 'success', 'achievement'),
+    ('Weather alert', 'Heavy rain expected in your district this week.', 'warning', 'system')
+]
+
+# Generated documents get ObjectIds built from (seed, kind, index, child) rather than random ones:
+# references need no lookups, re-running a seed skips what already exists, and --clean can find them
+BULK_ID_TIME = 0x60000000
+BULK_KINDS = {
+    'users': 1, 'user_progress': 2, 'course_progress': 3, 'lesson_progress': 4,
+    'notifications': 5, 'leaderboard': 6, 'discussions': 7, 'discussion_replies': 8
+}
+BULK_COLLECTIONS = {
+    'users': users_collection,
+    'user_progress': user_progress_collection,
+    'course_progress': course_progress_collection,
+    'lesson_progress': lesson_progress_collection,
+    'notifications': notifications_collection,
+    'leaderboard': leaderboard_collection,
+    'discussions': discussions_collection,
+    'discussion_replies': replies_collection
+}
+
+def bulk_id(seed, kind, index, child=0):
+    """ObjectId of the child-th document of `kind` belonging to user or discussion `index`"""
+    return ObjectId(struct.pack('>IB', BULK_ID_TIME + seed, BULK_KINDS[kind])
+                    + index.to_bytes(5, 'big') + child.to_bytes(2, 'big'))
+
+def bulk_id_range(seed, kind):
+    """Filter matching every document of `kind` generated with `seed`"""
+    low = struct.pack('>IB', BULK_ID_TIME + seed, BULK_KINDS[kind])
+    return {'_id': {'$gte': ObjectId(low + bytes(7)), '$lte': ObjectId(low + b'\xff' * 7)}}
+
+def _document(model, _id, **fields):
+    """Database document of a model object: to_dict() with the given _id and BSON dates"""
+    document = model.to_dict()
+    document.pop('id')
+    document['_id'] = _id
+    document.update(fields)
+    return document
+
+def _bulk_profile(i):
+    """Sample profile of generated user i (a function of i so discussions can name their authors)"""
+    profile = SAMPLE_USERS[i % len(SAMPLE_USERS)]
+    return dict(profile, name=f"{profile['name']} {i}")
+
+def _average(rng, mean):
+    """Count with the given mean (uniform between 0 and twice the mean)"""
+    return rng.randint(0, 2 * mean) if mean > 0 else 0
+
+def generate_users(task):
+    """Users [start, stop) with their progress, notifications and leaderboard entries"""
+    options, catalog, password, now, start, stop = task
+    seed = options['seed']
+    rng = random.Random(f'{seed}:users:{start}')
+    documents = {kind: [] for kind in BULK_KINDS if not kind.startswith('discussion')}
+
+    for i in range(start, stop):
+        user_id = str(bulk_id(seed, 'users', i))
+        profile = _bulk_profile(i)
+        location = f'{rng.choice(BULK_VILLAGES)}, {rng.choice(BULK_DISTRICTS)}'
+        joined = now - timedelta(days=rng.randint(1, 365), minutes=rng.randint(0, 1439))
+        last_activity = now - timedelta(days=rng.randint(0, 30), minutes=rng.randint(0, 1439))
+
+        # Enrollments, each with a prefix of the course's lessons completed
+        points = completed_lessons = completed_courses = 0
+        enrolled = rng.sample(catalog, min(_average(rng, options['enrollments']), len(catalog)))
+        for course_index, (course_id, lesson_ids) in enumerate(enrolled):
+            done = rng.randint(0, len(lesson_ids))
+            started = joined + timedelta(days=rng.randint(0, max((last_activity - joined).days, 0)))
+            for lesson_index, lesson_id in enumerate(lesson_ids[:done]):
+                completed_at = min(started + timedelta(hours=12 * (lesson_index + 1)), now)
+                documents['lesson_progress'].append(_document(
+                    LessonProgress(user_id=user_id, lesson_id=lesson_id, course_id=course_id, is_completed=True,
+                                   time_spent=rng.randint(5, 45), quiz_score=rng.randint(50, 100), quiz_attempts=1),
+                    bulk_id(seed, 'lesson_progress', i, course_index * 256 + lesson_index),
+                    completed_at=completed_at, last_accessed=completed_at
+                ))
+            is_completed = bool(lesson_ids) and done == len(lesson_ids)
+            completed_lessons += done
+            completed_courses += is_completed
+            points += 10 * done + (50 if is_completed else 0)
+            documents['course_progress'].append(_document(
+                CourseProgress(user_id=user_id, course_id=course_id, completed_lessons=lesson_ids[:done],
+                               current_lesson=lesson_ids[done] if done < len(lesson_ids) else None,
+                               progress_percentage=(done / len(lesson_ids)) * 100 if lesson_ids else 0,
+                               is_completed=is_completed, certificate_earned=is_completed),
+                bulk_id(seed, 'course_progress', i, course_index),
+                started_at=started, last_accessed=last_activity,
+                completed_at=last_activity if is_completed else None
+            ))
+
+        level = 1 + points // 100
+        stats = {
+            'total_courses': len(enrolled), 'completed_courses': completed_courses,
+            'total_lessons': sum(len(lesson_ids) for _, lesson_ids in enrolled),
+            'completed_lessons': completed_lessons, 'learning_streak': rng.randint(0, 30),
+            'knowledge_points': points, 'current_level': level, 'next_level_points': level * 100,
+            'certificates': completed_courses
+        }
+        user = User(
+            name=profile['name'],
+            email=f'farmer{i}.seed{seed}@example.com',
+            password=password,
+            phone=f'+91 9{i % 10 ** 9:09d}',
+            location=location,
+            farm_size=profile['farm_size'],
+            primary_crops=profile['primary_crops'],
+            farming_experience=profile['farming_experience'],
+            water_source=profile['water_source'],
+            avatar=profile['avatar'],
+            learning_stats=stats,
+            is_verified=True,
+            last_login=last_activity
+        )
+        user.created_at = joined
+        documents['users'].append(dict(user.to_document(), _id=ObjectId(user_id), updated_at=last_activity))
+        documents['user_progress'].append(_document(
+            UserProgress(user_id=user_id, **stats),
+            bulk_id(seed, 'user_progress', i),
+            last_activity=last_activity, created_at=joined, updated_at=last_activity
+        ))
+
+        for n in range(_average(rng, options['notifications'])):
+            title, message, notification_type, category = rng.choice(BULK_NOTIFICATIONS)
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+            # Notifications read before the archive window would already have been archived
+            read = rng.random() < 0.6
+            is_read = read and created_at > now - timedelta(days=NOTIFICATION_ARCHIVE_AFTER_DAYS)
+            documents['notifications'].append(dict(
+                Notification(user_id=user_id, title=title, message=message, type=notification_type,
+                             category=category, is_read=is_read, created_at=created_at,
+                             read_at=created_at + timedelta(hours=1) if is_read else None).to_document(),
+                _id=bulk_id(seed, 'notifications', i, n)
+            ))
+
+        # One row per board the user's location puts them on (see Leaderboard.update_user_rank)
+        for n, (board, (partition, name)) in enumerate(location_partitions(location).items()):
+            entry = _document(
+                Leaderboard(user_id=user_id, user_name=user.name, user_avatar=avatar_emoji(user.avatar),
+                            location=location, points=points, category=board, partition=partition,
+                            partition_name=name),
+                bulk_id(seed, 'leaderboard', i, n),
+                updated_at=last_activity
+            )
+            entry.pop('rank')
+            documents['leaderboard'].append(entry)
+    return documents
+
+def generate_discussions(task):
+    """Discussions [start, stop) and their replies, written by generated users"""
+    options, now, start, stop = task
+    seed = options['seed']
+    rng = random.Random(f'{seed}:discussions:{start}')
+    documents = {'discussions': [], 'discussion_replies': []}
+
+    def author():
+        i = rng.randrange(options['users'])
+        return str(bulk_id(seed, 'users', i)), _bulk_profile(i)['name']
+
+    for i in range(start, stop):
+        discussion_id = bulk_id(seed, 'discussions', i)
+        author_id, author_name = author()
+        topic = rng.choice(BULK_TOPICS)
+        created_at = now - timedelta(minutes=rng.randint(60, 60 * 24 * 180))
+        participants = [author_id]
+        reply_at = created_at
+        reply_count = min(_average(rng, options['replies']), 65535)
+        replier_name = None
+        for n in range(reply_count):
+            replier_id, replier_name = author()
+            reply_at = min(reply_at + timedelta(minutes=rng.randint(1, 60 * 24)), now)
+            if replier_id not in participants:
+                participants.append(replier_id)
+            documents['discussion_replies'].append(_document(
+                DiscussionReply(discussion_id=str(discussion_id), author_id=replier_id, author_name=replier_name,
+                                content=f'Here is what worked for {topic} on our farm (reply {n + 1}).',
+                                like_count=rng.randint(0, 20)),
+                bulk_id(seed, 'discussion_replies', i, n),
+                created_at=reply_at, updated_at=reply_at
+            ))
+        documents['discussions'].append(_document(
+            Discussion(title=f'Question about {topic} #{i}',
+                       content=f'How do you handle {topic} on a small farm?',
+                       category=rng.choice(BULK_CATEGORIES), author_id=author_id, author_name=author_name,
+                       participants=participants, reply_count=reply_count, like_count=rng.randint(0, 50),
+                       tags=[topic], last_reply_by=replier_name),
+            discussion_id,
+            created_at=created_at, updated_at=reply_at,
+            last_reply_at=reply_at if reply_count else None
+        ))
+    return documents
+
+def load_catalog():
+    """(course id, lesson ids in order) for every course, seeding the catalog first when it is empty"""
+    if not courses_collection.count_documents({}):
+        seed_courses()
+    lessons = {}
+    for lesson in lessons_collection.find({}, {'course_id': 1}).sort([('order', 1), ('_id', 1)]):
+        lessons.setdefault(lesson['course_id'], []).append(str(lesson['_id']))
+    return [
+        (str(course['_id']), lessons.get(str(course['_id']), []))
+        for course in courses_collection.find({}, {'_id': 1}).sort('_id', 1)
+    ]
+
+class BulkWriter:
+    """Buffers generated documents per collection and inserts them batch_size at a time"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.inserted = Counter()
+        self.skipped = Counter()
+
+    def add(self, documents):
+        for kind, batch in documents.items():
+            pending = self.pending.setdefault(kind, [])
+            pending.extend(batch)
+            while len(pending) >= self.batch_size:
+                self._insert(kind, pending[:self.batch_size])
+                del pending[:self.batch_size]
+
+    def flush(self):
+        for kind, pending in self.pending.items():
+            if pending:
+                self._insert(kind, pending)
+                pending.clear()
+
+    def _insert(self, kind, batch):
+        try:
+            inserted = len(BULK_COLLECTIONS[kind].insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Documents left by an earlier run with the same seed are duplicates; anything else is an error
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+            inserted = e.details['nInserted']
+        self.inserted[kind] += inserted
+        self.skipped[kind] += len(batch) - inserted
+
+def _generate(jobs, workers):
+    """Run (function, task) jobs on a process pool, yielding results in order with a bounded backlog"""
+    if workers <= 1:
+        for function, task in jobs:
+            yield function(task)
+        return
+    with Pool(workers) as pool:
+        running = deque()
+        for function, task in jobs:
+            running.append(pool.apply_async(function, (task,)))
+            # Two tasks per worker keep every worker busy without piling results up in memory
+            if len(running) >= 2 * workers:
+                yield running.popleft().get()
+        while running:
+            yield running.popleft().get()
+
+def seed_bulk(options, batch_size=5000, workers=1):
+    """Generate and insert the synthetic dataset described by options"""
+    users, discussions = options['users'], options['discussions']
+    print(f"🏭 Generating {users} users and {discussions} discussions "
+          f"(seed {options['seed']}, {workers} workers, batches of {batch_size})...")
+
+    catalog = load_catalog()
+    # One hash for every generated user: bcrypt would otherwise dominate the run
+    password = User.hash_password(BULK_PASSWORD)
+    # Dates are relative to the start of the day, so a seed gives the same documents all day
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    jobs = [
+        (generate_users, (options, catalog, password, now, start, min(start + BULK_CHUNK_SIZE, users)))
+        for start in range(0, users, BULK_CHUNK_SIZE)
+    ] + [
+        (generate_discussions, (options, now, start, min(start + BULK_CHUNK_SIZE, discussions)))
+        for start in range(0, discussions, BULK_CHUNK_SIZE)
+    ]
+
+    writer = BulkWriter(batch_size)
+    started = time.time()
+    for done, documents in enumerate(_generate(jobs, workers), 1):
+        writer.add(documents)
+        if done % 20 == 0 or done == len(jobs):
+            print(f"  ⏳ {done}/{len(jobs)} chunks, {sum(writer.inserted.values())} documents inserted")
+    writer.flush()
+    elapsed = time.time() - started
+
+    for kind in BULK_KINDS:
+        skipped = f" ({writer.skipped[kind]} already present)" if writer.skipped[kind] else ''
+        print(f"  ✅ {kind}: {writer.inserted[kind]}{skipped}")
+    total = sum(writer.inserted.values())
+    print(f"  ⏱️  {total} documents in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} documents/s)")
+    CommunityStats.reconcile()
+    print(f"  🔑 Generated users sign in as farmer<N>.seed{options['seed']}@example.com / {BULK_PASSWORD}")
+
+def clean_bulk(seed):
+    """Remove every document generated with seed"""
+    print(f"🧹 Removing the bulk dataset of seed {seed}...")
+    for kind, collection in BULK_COLLECTIONS.items():
+        deleted = collection.delete_many(bulk_id_range(seed, kind)).deleted_count
+        print(f"  ✅ {kind}: {deleted} removed")
+    # Archived notifications keep their _id
+    notifications_archive_collection.delete_many(bulk_id_range(seed, 'notifications'))
+    CommunityStats.reconcile()
+
 def main():
     """Main seeding function"""
+    parser = argparse.ArgumentParser(description='Seed the EcoFarm Quest database')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Generate a synthetic dataset instead of the sample data (seeds the catalog if empty)')
+    parser.add_argument('--clean', action='store_true', help='Remove the synthetic dataset of --seed and exit')
+    parser.add_argument('--users', type=int, default=10000, help='Generated users')
+    parser.add_argument('--enrollments', type=int, default=3, help='Average courses each user is enrolled in')
+    parser.add_argument('--notifications', type=int, default=5, help='Average notifications per user')
+    parser.add_argument('--discussions', type=int, help='Generated discussions (default: one per 5 users)')
+    parser.add_argument('--replies', type=int, default=4, help='Average replies per discussion')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Documents per insert_many call')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Generation processes')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (0 to 16777215)')
+    args = parser.parse_args()
+    if not 0 <= args.seed < 2 ** 24:
+        parser.error('--seed must be between 0 and 16777215')
+
+    if args.clean:
+        clean_bulk(args.seed)
+        return
+    if args.bulk:
+        seed_bulk({
+            'seed': args.seed,
+            'users': args.users,
+            'enrollments': args.enrollments,
+            'notifications': args.notifications,
+            'discussions': args.users // 5 if args.discussions is None else args.discussions,
+            'replies': args.replies
+        }, batch_size=args.batch_size, workers=args.workers)
+        return
+
     print("🌱 Starting EcoFarm Quest database seeding...")
     print("=" * 50)
     
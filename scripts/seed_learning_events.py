@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Learning event backfill script for EcoFarm Quest
+One-time migration that seeds the learning event log with synthetic events for progress
+recorded before the log existed, so rebuilding projections from the log keeps it.
+Users already seeded are skipped, so the script is safe to re-run.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+from models.learning_event import LearningEvent
+from models.progress import user_progress_collection, course_progress_collection
+
+def main():
+    """Main backfill function"""
+    print("📜 Seeding learning events from existing progress...")
+    try:
+        user_ids = set(user_progress_collection.distinct('user_id', {'events_seeded_at': None}))
+        user_ids.update(course_progress_collection.distinct('user_id'))
+        seeded_users = seeded_events = 0
+        for user_id in user_ids:
+            count = LearningEvent.seed_from_progress(user_id)
+            if count:
+                seeded_users += 1
+                seeded_events += count
+        print(f"✅ {seeded_events} events seeded for {seeded_users} users")
+    except Exception as e:
+        print(f"❌ Error during backfill: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
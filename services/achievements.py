@@ -0,0 +1,168 @@
+from bisect import bisect_right
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+ACHIEVEMENT_RULES_TTL_SECONDS = int(os.getenv('ACHIEVEMENT_RULES_TTL_SECONDS', 300))
+
+# Requirement types that are stored under a different name in learning_stats
+STAT_ALIASES = {
+    'courses_completed': 'completed_courses',
+    'lessons_completed': 'completed_lessons',
+    'level': 'current_level'
+}
+
+# Stats requirements can be written against (after aliasing): the learning counters and levels
+# projected from the event log, and the community counters kept on User.learning_stats
+ACHIEVEMENT_STATS = {
+    'total_courses', 'completed_courses', 'completed_lessons', 'certificates', 'knowledge_points',
+    'current_level', 'learning_streak',
+    'perfect_quizzes', 'night_study', 'weekend_lessons', 'fast_completion',
+    'discussions_started', 'total_likes', 'helpful_actions'
+}
+
+# Legacy /achievements/check event types and the stat each one reports
+CHECK_TYPES = {
+    'course_completed': 'completed_courses',
+    'streak_updated': 'learning_streak',
+    'points_earned': 'knowledge_points'
+}
+
+class UnknownRequirementError(ValueError):
+    """Raised for an achievement requirement no stat is kept for, so it could never unlock"""
+
+def parse_requirement(requirement):
+    """Normalize an Achievement.requirement into {stat: threshold}"""
+    if not requirement:
+        return {}
+    if 'type' in requirement:
+        requirement = {requirement['type']: requirement.get('value', 1)}
+    thresholds = {}
+    for stat, value in requirement.items():
+        stat = STAT_ALIASES.get(stat, stat)
+        if stat not in ACHIEVEMENT_STATS:
+            raise UnknownRequirementError(f'Unknown achievement requirement type: {stat}')
+        try:
+            thresholds[stat] = float(value)
+        except (TypeError, ValueError):
+            raise UnknownRequirementError(f'Invalid threshold for {stat}: {value!r}')
+    return thresholds
+
+class AchievementRule:
+    def __init__(self, achievement):
+        self.achievement = achievement
+        self.thresholds = parse_requirement(achievement.requirement)
+
+    def is_met(self, stats):
+        """Check every threshold of the rule against the user's stats"""
+        return bool(self.thresholds) and all(
+            stats.get(stat, 0) >= threshold for stat, threshold in self.thresholds.items()
+        )
+
+    def progress(self, stats):
+        """Percentage towards the least-advanced threshold"""
+        if not self.thresholds:
+            return 0
+        return min(
+            min(stats.get(stat, 0) / threshold, 1) if threshold > 0 else 1
+            for stat, threshold in self.thresholds.items()
+        ) * 100
+
+class AchievementRuleEngine:
+    """Achievement rules indexed by the stat they depend on, sorted by threshold"""
+
+    def __init__(self, ttl_seconds=ACHIEVEMENT_RULES_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.rules = []
+        self.index = {}
+
+    def load(self):
+        """Load active achievements and build the per-stat threshold index
+
+        Requirements are validated when achievements are saved; a stored one no stat is kept for
+        is logged and skipped so it cannot break the learner requests that evaluate rules.
+        """
+        from models.community import Achievement
+
+        rules = []
+        for achievement in Achievement.find_all():
+            try:
+                rules.append(AchievementRule(achievement))
+            except UnknownRequirementError as e:
+                logger.error('Skipping achievement %s (%s): %s', achievement.id, achievement.name, e)
+        index = {}
+        for rule in rules:
+            for stat, threshold in rule.thresholds.items():
+                index.setdefault(stat, []).append((threshold, rule))
+        for stat in index:
+            index[stat].sort(key=lambda entry: entry[0])
+        index = {stat: ([t for t, _ in entries], [r for _, r in entries]) for stat, entries in index.items()}
+
+        with self.lock:
+            self.rules = rules
+            self.index = index
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl_seconds:
+            self.load()
+
+    def invalidate(self):
+        """Force a reload after achievements change"""
+        with self.lock:
+            self.loaded_at = None
+
+    def all_rules(self):
+        self.ensure_loaded()
+        return self.rules
+
+    def rules_crossed(self, stat, old_value, new_value):
+        """Rules on `stat` whose threshold lies in (old_value, new_value]"""
+        self.ensure_loaded()
+        thresholds, rules = self.index.get(stat, ([], []))
+        if old_value is None:
+            return rules[:bisect_right(thresholds, new_value)]
+        return rules[bisect_right(thresholds, old_value):bisect_right(thresholds, new_value)]
+
+    def rules_reached(self, stat, value):
+        """Rules on `stat` whose threshold is at most value"""
+        return self.rules_crossed(stat, None, value)
+
+    def on_stats_changed(self, user_id, stats, previous_stats=None):
+        """Evaluate only the rules triggered by the stats that changed"""
+        previous_stats = previous_stats or {}
+        candidates = {}
+        for stat, value in stats.items():
+            old_value = previous_stats.get(stat)
+            if old_value is not None and value <= old_value:
+                continue
+            for rule in self.rules_crossed(stat, old_value, value):
+                candidates[rule.achievement.id] = rule
+        return self.unlock(user_id, [rule for rule in candidates.values() if rule.is_met(stats)])
+
+    def unlock(self, user_id, rules):
+        """Record unlocks and notify the user, returning newly unlocked achievements"""
+        from models.community import UserAchievement
+        from models.notification import Notification
+
+        unlocked = []
+        for rule in rules:
+            if UserAchievement.unlock(user_id, rule.achievement):
+                unlocked.append(rule.achievement)
+                Notification.create_notification(
+                    user_id=user_id,
+                    title="Achievement Unlocked! 🎉",
+                    message=f"Congratulations! You've unlocked the '{rule.achievement.name}' achievement!",
+                    notification_type='success',
+                    category='achievement',
+                    action_url='/achievements'
+                )
+        return unlocked
+
+# Shared engine used by the learning event projections and achievement routes
+achievement_engine = AchievementRuleEngine()
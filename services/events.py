@@ -0,0 +1,167 @@
+from collections import deque
+from bson import ObjectId
+from datetime import datetime
+import threading
+import queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Event:
+    def __init__(self, event_type, data, recipients, event_id=None):
+        self.id = event_id or str(ObjectId())
+        self.type = event_type
+        self.data = data
+        self.recipients = set(recipients or [])
+
+    def is_for(self, user_id):
+        """Check whether the event should be delivered to a user"""
+        return user_id in self.recipients
+
+    def to_document(self):
+        """Convert event to a document for cross-worker transports"""
+        return {
+            '_id': ObjectId(self.id),
+            'type': self.type,
+            'data': self.data,
+            'recipients': list(self.recipients),
+            'created_at': datetime.utcnow()
+        }
+
+    @staticmethod
+    def from_document(document):
+        """Build an event from a transport document"""
+        return Event(
+            document['type'],
+            document.get('data', {}),
+            document.get('recipients', []),
+            event_id=str(document['_id'])
+        )
+
+class Subscription:
+    def __init__(self, user_id, max_queue_size=100):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_queue_size)
+
+    def deliver(self, event):
+        """Queue an event for this subscriber, dropping it if the client is too slow"""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            logger.warning('Dropping event %s for slow subscriber %s', event.id, self.user_id)
+
+    def get(self, timeout):
+        """Wait for the next event, returning None on timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class InProcessTransport:
+    """Delivers events to subscribers of this worker only"""
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, event):
+        self.dispatch(event)
+
+class MongoTransport:
+    """Fans events out to every worker through a capped collection and tailable cursors"""
+
+    def __init__(self, db, collection_name='stream_events', size_bytes=16 * 1024 * 1024):
+        if collection_name not in db.list_collection_names():
+            db.create_collection(collection_name, capped=True, size=size_bytes)
+        self.collection = db[collection_name]
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+        thread = threading.Thread(target=self._tail, daemon=True)
+        thread.start()
+
+    def publish(self, event):
+        self.collection.insert_one(event.to_document())
+
+    def _tail(self):
+        from pymongo import CursorType
+        last_id = ObjectId()
+        while True:
+            try:
+                cursor = self.collection.find(
+                    {'_id': {'$gt': last_id}},
+                    cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                for document in cursor:
+                    last_id = document['_id']
+                    self.dispatch(Event.from_document(document))
+            except Exception as e:
+                logger.warning('Stream transport tail failed: %s', e)
+            threading.Event().wait(1)
+
+class EventBroker:
+    """In-process pub/sub with a bounded replay history for Last-Event-ID reconnects"""
+
+    def __init__(self, history_size=1000, transport=None):
+        self.history = deque(maxlen=history_size)
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.set_transport(transport or InProcessTransport())
+
+    def set_transport(self, transport):
+        """Replace the transport used to fan events out across workers"""
+        self.transport = transport
+        transport.start(self._dispatch)
+
+    def publish(self, event_type, data, recipients):
+        """Publish an event to the given recipient user ids"""
+        recipients = [str(user_id) for user_id in recipients if user_id]
+        if not recipients:
+            return None
+        event = Event(event_type, data, recipients)
+        try:
+            self.transport.publish(event)
+        except Exception as e:
+            # Publishing is best-effort; never fail the write that produced it
+            logger.warning('Failed to publish %s event: %s', event_type, e)
+        return event
+
+    def subscribe(self, user_id):
+        """Register a subscriber for a user"""
+        subscription = Subscription(str(user_id))
+        with self.lock:
+            self.subscribers.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber"""
+        with self.lock:
+            user_subscriptions = self.subscribers.get(subscription.user_id, set())
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                self.subscribers.pop(subscription.user_id, None)
+
+    def replay(self, user_id, last_event_id):
+        """Return buffered events for a user published after last_event_id"""
+        if not last_event_id or not ObjectId.is_valid(last_event_id):
+            return []
+        last_event_id = ObjectId(last_event_id)
+        with self.lock:
+            history = list(self.history)
+        return [
+            event for event in history
+            if ObjectId(event.id) > last_event_id and event.is_for(str(user_id))
+        ]
+
+    def _dispatch(self, event):
+        with self.lock:
+            self.history.append(event)
+            targets = [
+                subscription
+                for user_id in event.recipients
+                for subscription in self.subscribers.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.deliver(event)
+
+# Shared broker used by the model save paths and the stream endpoint
+event_broker = EventBroker()
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from bson import ObjectId
+import threading
+import unicodedata
+import time
+import re
+import os
+
+QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 1024))
+QUIZ_CACHE_TTL_SECONDS = int(os.getenv('QUIZ_CACHE_TTL_SECONDS', 300))
+
+INTEGER_PATTERN = re.compile(r'[+-]?\d+')
+TRUE_VALUES = {'true', 't', 'yes', 'y', '1'}
+FALSE_VALUES = {'false', 'f', 'no', 'n', '0'}
+
+class GradingError(ValueError):
+    """Raised for a malformed submission (as opposed to wrong answers)"""
+
+def normalize_text(value):
+    """Normalize a free-text answer (unicode form, case, punctuation, whitespace)"""
+    if value is None:
+        return None
+    value = unicodedata.normalize('NFKC', str(value)).casefold()
+    value = re.sub(r'[^\w\s]', '', value)
+    return ' '.join(value.split())
+
+def normalize_choice(value):
+    """Normalize a multiple-choice answer to an option index (or option text)
+
+    Only integral values are indexes: a bool or a fractional number such as 1.7 matches nothing.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str):
+        if INTEGER_PATTERN.fullmatch(value.strip()):
+            return int(value)
+        return normalize_text(value)
+    return None
+
+def normalize_boolean(value):
+    """Normalize a true/false answer to a bool"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+    return None
+
+NORMALIZERS = {
+    'multiple_choice': normalize_choice,
+    'true_false': normalize_boolean,
+    'text': normalize_text
+}
+
+class CompiledQuiz:
+    """Answer key for a quiz: per-question normalizers, accepted answers and point weights"""
+
+    def __init__(self, quiz):
+        self.quiz_id = str(quiz.id)
+        self.lesson_id = quiz.lesson_id
+        self.passing_score = quiz.passing_score
+        self.max_attempts = quiz.max_attempts
+        self.compiled_at = time.monotonic()
+
+        self.normalizers = []
+        self.answer_key = []
+        self.weights = []
+        # Answers are positional, so keep the stored question order
+        for question in quiz.questions:
+            normalizer = NORMALIZERS.get(question.get('question_type', 'multiple_choice'), normalize_choice)
+            correct_answer = question.get('correct_answer')
+            accepted = correct_answer if isinstance(correct_answer, (list, tuple, set)) else [correct_answer]
+            self.normalizers.append(normalizer)
+            self.answer_key.append(frozenset(normalizer(answer) for answer in accepted) - {None})
+            self.weights.append(question.get('points', 1))
+        self.total_questions = len(self.answer_key)
+        self.total_points = sum(self.weights)
+
+    def grade(self, answers):
+        """Grade a single submission"""
+        return self.grade_batch([answers])[0]
+
+    def grade_batch(self, submissions):
+        """Grade many submissions in one column-wise pass over the answer key
+
+        Raises GradingError if a submission is not a list of answers.
+        """
+        for answers in submissions:
+            if not isinstance(answers, list):
+                raise GradingError('answers must be a list')
+        count = len(submissions)
+        earned_points = [0] * count
+        correct_answers = [0] * count
+        for index, (normalizer, accepted, weight) in enumerate(zip(self.normalizers, self.answer_key, self.weights)):
+            column = [answers[index] if index < len(answers) else None for answers in submissions]
+            for row, answer in enumerate(column):
+                if answer is not None and normalizer(answer) in accepted:
+                    earned_points[row] += weight
+                    correct_answers[row] += 1
+
+        results = []
+        for points, correct in zip(earned_points, correct_answers):
+            score = (points / self.total_points) * 100 if self.total_points > 0 else 0
+            results.append({
+                'score': score,
+                'correct_answers': correct,
+                'total_questions': self.total_questions,
+                'earned_points': points,
+                'total_points': self.total_points,
+                'passed': score >= self.passing_score
+            })
+        return results
+
+class QuizGrader:
+    """Per-worker LRU cache of compiled quizzes, invalidated by Quiz.save"""
+
+    def __init__(self, max_size=QUIZ_CACHE_SIZE, ttl_seconds=QUIZ_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, quiz_id):
+        """Return the compiled quiz, loading and compiling it on a miss"""
+        quiz_id = str(quiz_id)
+        with self.lock:
+            compiled = self.cache.get(quiz_id)
+            if compiled and time.monotonic() - compiled.compiled_at < self.ttl_seconds:
+                self.cache.move_to_end(quiz_id)
+                return compiled
+
+        from models.course import Quiz
+        if not ObjectId.is_valid(quiz_id):
+            return None
+        quiz = Quiz.find_by_id(quiz_id)
+        if not quiz or not quiz.is_active:
+            return None
+
+        compiled = CompiledQuiz(quiz)
+        with self.lock:
+            self.cache[quiz_id] = compiled
+            self.cache.move_to_end(quiz_id)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return compiled
+
+    def invalidate(self, quiz_id):
+        """Drop a quiz from the cache after it changes"""
+        with self.lock:
+            self.cache.pop(str(quiz_id), None)
+
+    def grade(self, quiz_id, answers):
+        """Grade one submission, returning None if the quiz does not exist"""
+        compiled = self.get(quiz_id)
+        return compiled.grade(answers) if compiled else None
+
+    def grade_batch(self, quiz_id, submissions):
+        """Grade several submissions for the same quiz"""
+        compiled = self.get(quiz_id)
+        return compiled.grade_batch(submissions) if compiled else None
+
+# Shared grader used by the course routes
+quiz_grader = QuizGrader()
@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from flask import g, has_request_context, jsonify
+import threading
+import logging
+import copy
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 2048))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 5))
+
+class UserCache:
+    """Per-worker LRU cache of user documents keyed by id, with a short TTL"""
+
+    def __init__(self, max_size=USER_CACHE_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is not cached
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, user_id, loader):
+        """Return a copy of the cached document, calling loader(user_id) on a miss"""
+        user_id = str(user_id)
+        with self.lock:
+            cached = self.cache.get(user_id)
+            if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+                self.cache.move_to_end(user_id)
+                self.hits += 1
+                return copy.deepcopy(cached[1])
+            self.misses += 1
+            generation = self.generation
+
+        document = loader(user_id)
+        if document is None:
+            return None
+        with self.lock:
+            if generation == self.generation:
+                self.cache[user_id] = (time.monotonic(), copy.deepcopy(document))
+                self.cache.move_to_end(user_id)
+                while len(self.cache) > self.max_size:
+                    self.cache.popitem(last=False)
+                    self.evictions += 1
+        return document
+
+    def invalidate(self, user_id):
+        """Drop a user after it is written or deleted"""
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            self.cache.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+
+    def stats(self):
+        """Hit-rate metrics for this worker"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.cache),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Shared cache behind User.find_by_id
+user_cache = UserCache()
+
+def changed_fields(before, after, prefix=''):
+    """$set paths (dotted into nested dicts) whose values differ between two documents"""
+    changes = {}
+    for key, value in after.items():
+        path = f'{prefix}{key}'
+        old = before.get(key)
+        if isinstance(value, dict) and isinstance(old, dict) and value and set(old) <= set(value):
+            changes.update(changed_fields(old, value, f'{path}.'))
+        elif key not in before or old != value:
+            changes[path] = value
+    return changes
+
+class IdentityMap:
+    """Request-scoped map of loaded models: repeated loads share one instance, saves are written before the response"""
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown)
+
+    def _state(self):
+        if not has_request_context():
+            return None
+        if '_identity_map' not in g:
+            g._identity_map = {'instances': {}, 'dirty': {}, 'snapshots': {}}
+        return g._identity_map
+
+    @staticmethod
+    def _key(instance):
+        return (type(instance).__name__,) + instance.identity_key()
+
+    def load(self, model, key, loader):
+        """Return the mapped instance for key, calling loader() on a miss"""
+        state = self._state()
+        if state is None:
+            return loader()
+        instance = state['instances'].get((model.__name__,) + key)
+        if instance is None:
+            instance = loader()
+            if instance is not None:
+                instance = self.merge(instance)
+        return instance
+
+    def merge(self, instance, loaded=True):
+        """Register an instance, returning the already-mapped one if there is one
+
+        Instances registered as loaded (just read or written) are snapshotted so a later flush
+        only writes the fields that changed.
+        """
+        state = self._state()
+        if state is None:
+            return instance
+        mapped = state['instances'].setdefault(self._key(instance), instance)
+        if mapped is instance and loaded and id(instance) not in state['snapshots']:
+            state['snapshots'][id(instance)] = copy.deepcopy(instance.snapshot())
+        return mapped
+
+    def defer_save(self, instance):
+        """Queue a save of a stored instance until the response, returning False if it must be written now"""
+        state = self._state()
+        if state is None or not instance.id:
+            return False
+        # An instance never seen loaded has no snapshot and is written in full
+        self.merge(instance, loaded=False)
+        state['dirty'][id(instance)] = instance
+        return True
+
+    def discard(self, instance):
+        """Forget a deleted instance and any pending save of it"""
+        state = self._state()
+        if state is not None:
+            state['dirty'].pop(id(instance), None)
+            state['snapshots'].pop(id(instance), None)
+            state['instances'].pop(self._key(instance), None)
+
+    def flush(self):
+        """Write the changed fields of every instance saved during the request (one write each)"""
+        state = self._state()
+        if state is None:
+            return 0
+        dirty, state['dirty'] = state['dirty'], {}
+        written = 0
+        for instance in dirty.values():
+            snapshot = state['snapshots'].get(id(instance))
+            if snapshot is None:
+                instance._write()
+            else:
+                # Only changed paths, so $inc updates made elsewhere in the request are not overwritten
+                changes = changed_fields(snapshot, instance.snapshot())
+                if not changes:
+                    continue
+                instance._write(changes)
+            state['snapshots'][id(instance)] = copy.deepcopy(instance.snapshot())
+            written += 1
+        return written
+
+    def after_request(self, response):
+        """Flush before the response is sent; a failed write turns the response into a 500"""
+        if response.status_code >= 500:
+            self.teardown()
+            return response
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error('Failed to flush identity map: %s', e)
+            response = jsonify({
+                'status': 'error',
+                'message': 'Failed to save changes'
+            })
+            response.status_code = 500
+        return response
+
+    def teardown(self, exception=None):
+        """Drop saves that were not flushed (failed requests)"""
+        state = self._state()
+        if state is not None:
+            state['dirty'] = {}
+
+# Shared map; models look up and save through it
+identity_map = IdentityMap()
@@ -0,0 +1,189 @@
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import tempfile
+import logging
+import shutil
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', 32))
+IMAGE_STAGING_FOLDER = os.getenv('IMAGE_STAGING_FOLDER', os.path.join(tempfile.gettempdir(), 'ecofarm-image-staging'))
+IMAGE_VARIANT_WIDTHS = [int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',')]
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40 * 1000 * 1000))
+
+IMAGE_FORMATS = {'PNG', 'JPEG', 'GIF'}
+AVATAR_SIZE = 300
+THUMBNAIL_WIDTH = 160
+AVATAR_THUMBNAIL_SIZE = 64
+FORMAT_OPTIONS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})
+}
+THUMBNAIL_OPTIONS = ('JPEG', {'quality': 45, 'optimize': True})
+
+class ImagePipelineBusy(Exception):
+    """Raised when the image queue is full"""
+
+def sniff_image(stream):
+    """Cheap request-time check: read only the header and return the image format, or None"""
+    from PIL import Image
+    try:
+        with Image.open(stream) as img:
+            image_format = img.format
+        return image_format if image_format in IMAGE_FORMATS else None
+    except Exception:
+        return None
+    finally:
+        stream.seek(0)
+
+def variant_names(kind, base_name):
+    """Variant labels and file names produced for an image, known before processing"""
+    if kind == 'avatar':
+        sizes = [str(AVATAR_SIZE)]
+    else:
+        sizes = [f'w{width}' for width in IMAGE_VARIANT_WIDTHS]
+    names = {f'{size}.{ext}': f'{base_name}_{size}.{ext}' for size in sizes for ext in FORMAT_OPTIONS}
+    names['thumbnail.jpg'] = f'{base_name}_thumb.jpg'
+    return names
+
+def _write(image, path, image_format, options):
+    # The image is rebuilt from pixel data only, so EXIF, GPS and ICC metadata are dropped
+    clean = image.convert('RGB')
+    clean.save(path, image_format, **options)
+
+def process_image(source_path, output_dir, kind, base_name):
+    """Validate one staged image and write its variants to output_dir (runs in a pool process)"""
+    from PIL import Image, ImageOps
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+    with Image.open(source_path) as img:
+        img.verify()
+    with Image.open(source_path) as img:
+        if img.format not in IMAGE_FORMATS:
+            raise ValueError(f'Unsupported image format: {img.format}')
+        img = ImageOps.exif_transpose(img)
+        img.load()
+
+    names = variant_names(kind, base_name)
+    if kind == 'avatar':
+        square = ImageOps.fit(img, (AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS, centering=(0.5, 0.4))
+        for ext, (image_format, options) in FORMAT_OPTIONS.items():
+            _write(square, os.path.join(output_dir, names[f'{AVATAR_SIZE}.{ext}']), image_format, options)
+        thumbnail = square.resize((AVATAR_THUMBNAIL_SIZE, AVATAR_THUMBNAIL_SIZE), Image.LANCZOS)
+    else:
+        for width in IMAGE_VARIANT_WIDTHS:
+            # Never upscale; small originals are re-encoded at their own size
+            scaled = img.copy()
+            scaled.thumbnail((width, width * 10), Image.LANCZOS)
+            for ext, (image_format, options) in FORMAT_OPTIONS.items():
+                _write(scaled, os.path.join(output_dir, names[f'w{width}.{ext}']), image_format, options)
+        thumbnail = img.copy()
+        thumbnail.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 10), Image.LANCZOS)
+    _write(thumbnail, os.path.join(output_dir, names['thumbnail.jpg']), *THUMBNAIL_OPTIONS)
+
+    return {'width': img.width, 'height': img.height, 'files': names}
+
+class ImageJob:
+    def __init__(self, kind, folder, base_name):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.folder = folder
+        self.base_name = base_name
+        self.staging_dir = tempfile.mkdtemp(dir=IMAGE_STAGING_FOLDER)
+        self.source_path = os.path.join(self.staging_dir, 'source')
+        self.output_dir = os.path.join(self.staging_dir, 'variants')
+        os.makedirs(self.output_dir)
+        self.future = None
+
+    def public_ids(self):
+        return {label: f'{self.folder}/{name}' for label, name in variant_names(self.kind, self.base_name).items()}
+
+class ImagePipeline:
+    """Processes uploaded images on a bounded per-worker process pool and stores the variants"""
+
+    def __init__(self, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE):
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = {}
+
+    def _executor(self):
+        # Created lazily so each forked server worker gets its own pool
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def submit(self, stream, kind, folder, base_name):
+        """Stage an upload and queue it; return the variant URLs it will be stored under"""
+        from services.storage import upload_storage
+        if not self.slots.acquire(blocking=False):
+            raise ImagePipelineBusy('Image processing queue is full')
+        try:
+            os.makedirs(IMAGE_STAGING_FOLDER, exist_ok=True)
+            job = ImageJob(kind, folder, base_name)
+            with open(job.source_path, 'wb') as staged:
+                shutil.copyfileobj(stream, staged)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        variants = {label: upload_storage.url_for(public_id) for label, public_id in job.public_ids().items()}
+        if self.workers <= 0:
+            # Inline mode (IMAGE_WORKERS=0) for environments without multiprocessing
+            try:
+                result = process_image(job.source_path, job.output_dir, kind, base_name)
+                self._store(job, result)
+            finally:
+                self._finish(job)
+            return job, variants
+
+        job.future = self._executor().submit(process_image, job.source_path, job.output_dir, kind, base_name)
+        with self.lock:
+            self.pending[job.id] = job
+        job.future.add_done_callback(lambda future: self._complete(job, future))
+        return job, variants
+
+    def _complete(self, job, future):
+        try:
+            self._store(job, future.result())
+        except Exception as e:
+            logger.warning('Image job %s (%s) failed: %s', job.id, job.kind, e)
+        finally:
+            self._finish(job)
+
+    def _store(self, job, result):
+        from services.storage import upload_storage
+        public_ids = job.public_ids()
+        for label, name in result['files'].items():
+            with open(os.path.join(job.output_dir, name), 'rb') as variant:
+                upload_storage.save(variant, public_ids[label])
+
+    def _finish(self, job):
+        shutil.rmtree(job.staging_dir, ignore_errors=True)
+        with self.lock:
+            self.pending.pop(job.id, None)
+        self.slots.release()
+
+    def wait(self, timeout=None):
+        """Block until every queued job has been stored (tests and shutdown)"""
+        with self.lock:
+            futures = [job.future for job in self.pending.values() if job.future]
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        # Done callbacks may still be storing the last variants
+        while True:
+            with self.lock:
+                if not self.pending:
+                    return
+            threading.Event().wait(0.01)
+
+# Shared pipeline used by the upload routes
+image_pipeline = ImagePipeline()
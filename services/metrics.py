@@ -0,0 +1,230 @@
+from flask import Response, g, request
+from pymongo import monitoring
+import threading
+import time
+import os
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Latency buckets in seconds (Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """A labelled metric family kept in process memory"""
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}']
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def _samples(self, key, value):
+        counts, total = value
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+            samples.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.label_names, key)
+        samples.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        samples.append(f'{self.name}_count{labels} {cumulative}')
+        return samples
+
+class MetricsRegistry:
+    """Metrics of this worker process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self._add(Histogram(*args, **kwargs))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register a callable run before each scrape (to refresh gauges from other components)"""
+        self.collectors.append(collector)
+
+    def expose(self):
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests by route and status', ('blueprint', 'endpoint', 'method', 'status')
+)
+http_request_duration_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency in seconds', ('blueprint', 'endpoint', 'method')
+)
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served', ('blueprint', 'endpoint')
+)
+mongodb_commands_total = registry.counter(
+    'mongodb_commands_total', 'MongoDB commands by collection and outcome', ('collection', 'command', 'status')
+)
+mongodb_command_duration_seconds = registry.histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency in seconds', ('collection', 'command')
+)
+
+def command_collection(command_name, command):
+    """Collection a command targets (getMore carries it in 'collection')"""
+    if command_name == 'getMore':
+        return command.get('collection', '')
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ''
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Counts and times MongoDB commands per collection"""
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        collection = command_collection(event.command_name, event.command)
+        with self.lock:
+            self.pending[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event, status):
+        with self.lock:
+            collection = self.pending.pop((event.request_id, event.connection_id), '')
+        mongodb_commands_total.inc(collection=collection, command=event.command_name, status=status)
+        mongodb_command_duration_seconds.observe(
+            event.duration_micros / 1e6, collection=collection, command=event.command_name
+        )
+
+    def succeeded(self, event):
+        self._finish(event, 'succeeded')
+
+    def failed(self, event):
+        self._finish(event, 'failed')
+
+# Registered with pymongo before any MongoClient is created (see app.py)
+mongo_command_metrics = MongoCommandMetrics()
+
+def _route_labels():
+    endpoint = request.endpoint or 'unmatched'
+    return request.blueprint or '', endpoint
+
+class Metrics:
+    """Request instrumentation and the /api/metrics endpoint"""
+
+    def init_app(self, app, path='/api/metrics'):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(path, 'metrics', self.metrics_view, methods=['GET'])
+
+    def _before_request(self):
+        blueprint, endpoint = _route_labels()
+        g._metrics_started = time.perf_counter()
+        http_requests_in_flight.inc(blueprint=blueprint, endpoint=endpoint)
+
+    def _after_request(self, response):
+        started = g.get('_metrics_started')
+        if started is not None:
+            blueprint, endpoint = _route_labels()
+            http_request_duration_seconds.observe(
+                time.perf_counter() - started, blueprint=blueprint, endpoint=endpoint, method=request.method
+            )
+            http_requests_total.inc(
+                blueprint=blueprint, endpoint=endpoint, method=request.method, status=response.status_code
+            )
+        return response
+
+    def _teardown_request(self, exception=None):
+        # Runs even when the view raised, so the gauge never leaks
+        if g.pop('_metrics_started', None) is not None:
+            blueprint, endpoint = _route_labels()
+            http_requests_in_flight.dec(blueprint=blueprint, endpoint=endpoint)
+
+    def metrics_view(self):
+        if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+metrics = Metrics()
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from bson import ObjectId
+import threading
+import logging
+import queue
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+PROFILE_CACHE_TTL_SECONDS = int(os.getenv('PROFILE_CACHE_TTL_SECONDS', 60))
+PROFILE_PROPAGATION_CHUNK_SIZE = int(os.getenv('PROFILE_PROPAGATION_CHUNK_SIZE', 500))
+PROFILE_PROPAGATION_THROTTLE_SECONDS = float(os.getenv('PROFILE_PROPAGATION_THROTTLE_SECONDS', 0.05))
+
+# Fields of a user that anyone may see next to their posts
+PUBLIC_PROFILE_FIELDS = {'name': 1, 'avatar': 1, 'location': 1}
+DEFAULT_AVATAR_EMOJI = '👤'
+
+def avatar_emoji(avatar):
+    """The emoji copied next to posts and board rows for a user's avatar dict"""
+    if isinstance(avatar, dict):
+        return avatar.get('emoji', DEFAULT_AVATAR_EMOJI)
+    # Older users may still have a bare emoji string
+    return avatar or DEFAULT_AVATAR_EMOJI
+
+class ProfileStore:
+    """Per-worker LRU cache of public user profiles, filled by batched $in lookups"""
+
+    def __init__(self, max_size=PROFILE_CACHE_SIZE, ttl_seconds=PROFILE_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, user_ids):
+        """Return {user_id: profile} for the given users, loading all misses in one query"""
+        from models.user import users_collection
+
+        profiles = {}
+        misses = set()
+        now = time.monotonic()
+        with self.lock:
+            for user_id in set(user_ids):
+                cached = self.cache.get(user_id)
+                if cached and now - cached[0] < self.ttl_seconds:
+                    self.cache.move_to_end(user_id)
+                    profiles[user_id] = cached[1]
+                elif user_id and ObjectId.is_valid(user_id):
+                    misses.add(user_id)
+        if not misses:
+            return profiles
+
+        loaded = {}
+        for user_data in users_collection.find({'_id': {'$in': [ObjectId(user_id) for user_id in misses]}},
+                                               PUBLIC_PROFILE_FIELDS):
+            loaded[str(user_data['_id'])] = {
+                'name': user_data.get('name', ''),
+                'avatar': user_data.get('avatar', ''),
+                'location': user_data.get('location', '')
+            }
+        with self.lock:
+            for user_id, profile in loaded.items():
+                self.cache[user_id] = (now, profile)
+                self.cache.move_to_end(user_id)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        profiles.update(loaded)
+        return profiles
+
+    def get(self, user_id):
+        """Return one public profile, or None if the user does not exist"""
+        return self.get_many([user_id]).get(user_id)
+
+    def invalidate(self, user_id):
+        """Drop a profile from the cache after the user changes"""
+        with self.lock:
+            self.cache.pop(str(user_id), None)
+
+# Shared store used wherever posts and boards show author details
+profile_store = ProfileStore()
+
+def denormalized_copies():
+    """(collection, user id field, {profile field: copied field}) for every copy of a profile"""
+    from models.community import (
+        discussions_collection, replies_collection, leaderboard_collection, achievement_leaderboard_collection
+    )
+    author_fields = {'name': 'author_name', 'avatar': 'author_avatar'}
+    board_fields = {'name': 'user_name', 'avatar': 'user_avatar'}
+    return [
+        (discussions_collection, 'author_id', author_fields),
+        (replies_collection, 'author_id', author_fields),
+        (leaderboard_collection, 'user_id', board_fields),
+        (achievement_leaderboard_collection, 'user_id', board_fields)
+    ]
+
+class ProfilePropagator:
+    """Background worker that rewrites denormalized author name/avatar copies after a profile change"""
+
+    def __init__(self, chunk_size=PROFILE_PROPAGATION_CHUNK_SIZE, throttle_seconds=PROFILE_PROPAGATION_THROTTLE_SECONDS):
+        self.chunk_size = chunk_size
+        self.throttle_seconds = throttle_seconds
+        self.pending = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def enqueue(self, user_id, profile):
+        """Schedule propagation; repeated changes for a user before it runs are coalesced"""
+        with self.lock:
+            queued = user_id in self.pending
+            self.pending.setdefault(user_id, {}).update(profile)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        if not queued:
+            self.queue.put(user_id)
+
+    def wait(self):
+        """Block until every queued propagation has been applied"""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            user_id = self.queue.get()
+            try:
+                with self.lock:
+                    profile = self.pending.pop(user_id, {})
+                self.propagate(user_id, profile)
+            except Exception as e:
+                logger.warning('Failed to propagate profile of %s: %s', user_id, e)
+            finally:
+                self.queue.task_done()
+
+    def propagate(self, user_id, profile):
+        """Stream stale copies in each collection and fix them with chunked update_many calls"""
+        updated = 0
+        for collection, user_field, fields in denormalized_copies():
+            values = {
+                fields[field]: avatar_emoji(value) if field == 'avatar' else value
+                for field, value in profile.items() if field in fields
+            }
+            if not values:
+                continue
+            stale = {user_field: user_id, '$or': [{field: {'$ne': value}} for field, value in values.items()]}
+            chunk = []
+            for document in collection.find(stale, {'_id': 1}).batch_size(self.chunk_size):
+                chunk.append(document['_id'])
+                if len(chunk) >= self.chunk_size:
+                    updated += self._apply(collection, chunk, values)
+                    chunk = []
+            if chunk:
+                updated += self._apply(collection, chunk, values)
+        return updated
+
+    def _apply(self, collection, ids, values):
+        result = collection.update_many({'_id': {'$in': ids}}, {'$set': values})
+        # Throttle between chunks so a prolific author does not saturate the primary
+        time.sleep(self.throttle_seconds)
+        return result.modified_count
+
+# Shared propagator fed by User.update_profile
+profile_propagator = ProfilePropagator()
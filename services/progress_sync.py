@@ -0,0 +1,320 @@
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from models.course import lessons_collection
+from models.progress import (
+    UserProgress, CourseProgress, LessonProgress,
+    course_progress_collection, lesson_progress_collection, sync_receipts_collection
+)
+from models.learning_event import LearningEvent
+from models.notification import Notification
+from services.grading import quiz_grader
+import os
+
+SYNC_MAX_EVENTS = int(os.getenv('SYNC_MAX_EVENTS', 500))
+SYNC_RECEIPT_TTL_DAYS = int(os.getenv('SYNC_RECEIPT_TTL_DAYS', 30))
+
+LESSON_POINTS = 10
+COURSE_COMPLETION_POINTS = 50
+
+EVENT_TYPES = ('lesson_completed', 'quiz_submitted')
+
+class SyncError(Exception):
+    """Raised when a sync batch is malformed"""
+
+class SyncEventError(SyncError):
+    """Raised for one malformed event; only that event is rejected"""
+
+    def __init__(self, message, key):
+        super().__init__(message)
+        self.key = key
+
+def ensure_indexes():
+    """Create the idempotency-key index used to dedupe sync events"""
+    sync_receipts_collection.create_index(
+        [('user_id', ASCENDING), ('idempotency_key', ASCENDING)],
+        unique=True
+    )
+    sync_receipts_collection.create_index(
+        'applied_at',
+        name='applied_at_ttl',
+        expireAfterSeconds=SYNC_RECEIPT_TTL_DAYS * 24 * 60 * 60
+    )
+
+def parse_event(raw):
+    """Validate a raw client event and parse its timestamp"""
+    if not isinstance(raw, dict):
+        raise SyncError('Each event must be an object')
+    key = raw.get('idempotency_key')
+    if not key or not isinstance(key, str):
+        raise SyncError('idempotency_key is required for every event')
+    if raw.get('type') not in EVENT_TYPES:
+        raise SyncEventError(f"Unsupported event type for {key}: {raw.get('type')}", key)
+    if not raw.get('course_id'):
+        raise SyncEventError(f'course_id is required for {key}', key)
+    if raw['type'] == 'lesson_completed' and not raw.get('lesson_id'):
+        raise SyncEventError(f'lesson_id is required for {key}', key)
+    if raw['type'] == 'quiz_submitted' and not raw.get('quiz_id'):
+        raise SyncEventError(f'quiz_id is required for {key}', key)
+    if raw.get('answers') is not None and not isinstance(raw['answers'], list):
+        raise SyncEventError(f'answers must be a list for {key}', key)
+    time_spent = raw.get('time_spent')
+    if time_spent is not None and (isinstance(time_spent, bool) or not isinstance(time_spent, (int, float))
+                                   or time_spent < 0):
+        raise SyncEventError(f'time_spent must be a non-negative number for {key}', key)
+
+    occurred_at = raw.get('occurred_at')
+    try:
+        occurred_at = datetime.fromisoformat(occurred_at.replace('Z', '+00:00')) if occurred_at else None
+    except (AttributeError, ValueError):
+        raise SyncEventError(f'occurred_at must be an ISO timestamp for {key}', key)
+    if occurred_at and occurred_at.tzinfo:
+        # Stored as naive UTC like every other timestamp
+        occurred_at = occurred_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    event = dict(raw)
+    event['occurred_at'] = min(occurred_at or datetime.utcnow(), datetime.utcnow())
+    return event
+
+def claim_keys(user_id, keys):
+    """Record idempotency keys, returning the ones that had not been applied before"""
+    now = datetime.utcnow()
+    try:
+        sync_receipts_collection.insert_many(
+            [{'user_id': user_id, 'idempotency_key': key, 'applied_at': now} for key in keys],
+            ordered=False
+        )
+        return list(keys)
+    except BulkWriteError as e:
+        duplicates = {
+            keys[error['index']] for error in e.details.get('writeErrors', []) if error.get('code') == 11000
+        }
+        if len(duplicates) != len(e.details.get('writeErrors', [])):
+            raise
+        return [key for key in keys if key not in duplicates]
+
+def release_keys(user_id, keys):
+    """Forget claimed keys so a failed batch can be retried"""
+    sync_receipts_collection.delete_many({'user_id': user_id, 'idempotency_key': {'$in': list(keys)}})
+
+class ProgressSync:
+    """Applies a batch of offline progress events for one user in a single pass"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.learning_events = []
+        self.course_progress = {}
+        self.lesson_progress = {}
+        self.lesson_counts = {}
+        self.quizzes = {}
+        self.dirty_courses = set()
+        self.dirty_lessons = set()
+        self.completed_courses = []
+
+    def load(self, events):
+        """Load all progress documents touched by the batch with one query per collection"""
+        course_ids = list({event['course_id'] for event in events})
+
+        for progress_data in course_progress_collection.find({'user_id': self.user_id, 'course_id': {'$in': course_ids}}):
+            progress_data['_id'] = str(progress_data['_id'])
+            self.course_progress[progress_data['course_id']] = CourseProgress(**progress_data)
+
+        for count in lessons_collection.aggregate([
+            {'$match': {'course_id': {'$in': course_ids}, 'is_active': True}},
+            {'$group': {'_id': '$course_id', 'count': {'$sum': 1}}}
+        ]):
+            self.lesson_counts[count['_id']] = count['count']
+
+        # Quiz lessons are only known once the quizzes are compiled
+        for event in events:
+            if event['type'] == 'quiz_submitted' and event['quiz_id'] not in self.quizzes:
+                self.quizzes[event['quiz_id']] = quiz_grader.get(event['quiz_id'])
+        lesson_ids = {event.get('lesson_id') for event in events if event['type'] == 'lesson_completed'}
+        lesson_ids.update(quiz.lesson_id for quiz in self.quizzes.values() if quiz)
+        lesson_ids.discard(None)
+        for progress_data in lesson_progress_collection.find({'user_id': self.user_id, 'lesson_id': {'$in': list(lesson_ids)}}):
+            progress_data['_id'] = str(progress_data['_id'])
+            self.lesson_progress[progress_data['lesson_id']] = LessonProgress(**progress_data)
+
+    def get_lesson_progress(self, lesson_id, course_id):
+        lesson_progress = self.lesson_progress.get(lesson_id)
+        if not lesson_progress:
+            lesson_progress = LessonProgress(user_id=self.user_id, lesson_id=lesson_id, course_id=course_id)
+            self.lesson_progress[lesson_id] = lesson_progress
+        self.dirty_lessons.add(lesson_id)
+        return lesson_progress
+
+    def record(self, event_type, event, **fields):
+        """Queue a learning event for the log (UserProgress is its projection)"""
+        self.learning_events.append(LearningEvent(
+            type=event_type, course_id=event['course_id'], occurred_at=event['occurred_at'], **fields
+        ))
+
+    def apply_lesson_completed(self, event):
+        course_progress = self.course_progress.get(event['course_id'])
+        if not course_progress:
+            return {'status': 'rejected', 'reason': 'User not enrolled in this course'}
+
+        occurred_at = event['occurred_at']
+        lesson_progress = self.get_lesson_progress(event['lesson_id'], event['course_id'])
+        lesson_progress.is_completed = True
+        lesson_progress.completed_at = lesson_progress.completed_at or occurred_at
+        lesson_progress.time_spent += event.get('time_spent', 0) or 0
+
+        if event['lesson_id'] in course_progress.completed_lessons:
+            return {'status': 'applied'}
+
+        course_progress.completed_lessons.append(event['lesson_id'])
+        course_progress.last_accessed = occurred_at
+        total_lessons = self.lesson_counts.get(event['course_id'], 0)
+        if total_lessons > 0:
+            course_progress.progress_percentage = (len(course_progress.completed_lessons) / total_lessons) * 100
+        self.dirty_courses.add(event['course_id'])
+        self.record('lesson_completed', event, lesson_id=event['lesson_id'], points=LESSON_POINTS)
+
+        if course_progress.progress_percentage >= 100 and not course_progress.is_completed:
+            course_progress.is_completed = True
+            course_progress.completed_at = occurred_at
+            course_progress.certificate_earned = True
+            self.record('course_completed', event, points=COURSE_COMPLETION_POINTS)
+            self.completed_courses.append(event['course_id'])
+        return {'status': 'applied'}
+
+    def apply_quiz_submitted(self, event, result):
+        quiz = self.quizzes.get(event['quiz_id'])
+        if not quiz:
+            return {'status': 'rejected', 'reason': 'Quiz not found'}
+
+        lesson_progress = self.lesson_progress.get(quiz.lesson_id)
+        if lesson_progress:
+            self.dirty_lessons.add(quiz.lesson_id)
+            lesson_progress.quiz_score = max(lesson_progress.quiz_score, result['score'])
+            lesson_progress.quiz_attempts += 1
+            if lesson_progress.quiz_attempts >= quiz.max_attempts and not lesson_progress.is_completed:
+                lesson_progress.is_completed = True
+                lesson_progress.completed_at = event['occurred_at']
+
+        self.record(
+            'quiz_submitted', event, lesson_id=quiz.lesson_id, quiz_id=event['quiz_id'],
+            score=result['score'], points=int(result['score'] / 10)
+        )
+        return {'status': 'applied', 'result': result}
+
+    def grade_quizzes(self, events):
+        """Grade all quiz submissions per quiz in one batch"""
+        by_quiz = {}
+        for event in events:
+            if event['type'] == 'quiz_submitted' and self.quizzes.get(event['quiz_id']):
+                by_quiz.setdefault(event['quiz_id'], []).append(event)
+        results = {}
+        for quiz_id, quiz_events in by_quiz.items():
+            graded = self.quizzes[quiz_id].grade_batch([event.get('answers') or [] for event in quiz_events])
+            for event, result in zip(quiz_events, graded):
+                results[event['idempotency_key']] = result
+        return results
+
+    def apply(self, events):
+        """Apply events in timestamp order and return a per-key outcome"""
+        self.load(events)
+        results = self.grade_quizzes(events)
+        outcomes = {}
+        for event in events:
+            if event['type'] == 'lesson_completed':
+                outcomes[event['idempotency_key']] = self.apply_lesson_completed(event)
+            else:
+                outcomes[event['idempotency_key']] = self.apply_quiz_submitted(event, results.get(event['idempotency_key']))
+        return outcomes
+
+    def write(self):
+        """Persist the reconciled state with one bulk_write per collection"""
+        now = datetime.utcnow()
+
+        lesson_ops = []
+        for lesson_id in self.dirty_lessons:
+            lesson_progress = self.lesson_progress[lesson_id]
+            lesson_data = {k: v for k, v in lesson_progress.to_dict().items() if k != 'id'}
+            lesson_data['last_accessed'] = now
+            lesson_ops.append(UpdateOne(
+                {'user_id': self.user_id, 'lesson_id': lesson_id},
+                {'$set': lesson_data},
+                upsert=True
+            ))
+        if lesson_ops:
+            lesson_progress_collection.bulk_write(lesson_ops, ordered=False)
+
+        course_ops = []
+        for course_id in self.dirty_courses:
+            course_progress = self.course_progress[course_id]
+            course_data = {k: v for k, v in course_progress.to_dict().items() if k not in ('id', 'started_at')}
+            course_ops.append(UpdateOne({'_id': ObjectId(course_progress.id)}, {'$set': course_data}))
+        if course_ops:
+            course_progress_collection.bulk_write(course_ops, ordered=False)
+
+        LearningEvent.record_many(self.user_id, self.learning_events)
+
+        for course_id in self.completed_courses:
+            Notification.create_notification(
+                user_id=self.user_id,
+                title="Course Completed! 🎉",
+                message="Congratulations! You have completed the course and earned a certificate.",
+                notification_type='success',
+                category='achievement',
+                action_url='/certificates'
+            )
+
+def sync_progress(user_id, raw_events):
+    """Dedupe, order and apply a batch of offline progress events for a user"""
+    if not isinstance(raw_events, list):
+        raise SyncError('events must be a list')
+    if len(raw_events) > SYNC_MAX_EVENTS:
+        raise SyncError(f'A sync batch may contain at most {SYNC_MAX_EVENTS} events')
+
+    events = []
+    seen = set()
+    duplicates = []
+    invalid = []
+    for raw in raw_events:
+        try:
+            event = parse_event(raw)
+        except SyncEventError as e:
+            # A bad event is reported back; the rest of the batch still applies
+            invalid.append({'idempotency_key': e.key, 'reason': str(e)})
+            continue
+        if event['idempotency_key'] in seen:
+            duplicates.append(event['idempotency_key'])
+            continue
+        seen.add(event['idempotency_key'])
+        events.append(event)
+
+    claimed = claim_keys(user_id, [event['idempotency_key'] for event in events]) if events else []
+    claimed_set = set(claimed)
+    duplicates.extend(event['idempotency_key'] for event in events if event['idempotency_key'] not in claimed_set)
+    events = sorted((event for event in events if event['idempotency_key'] in claimed_set), key=lambda e: e['occurred_at'])
+
+    sync = ProgressSync(user_id)
+    outcomes = {}
+    if events:
+        try:
+            outcomes = sync.apply(events)
+            sync.write()
+        except Exception:
+            release_keys(user_id, claimed)
+            raise
+
+    # Rejected events (e.g. not enrolled yet) may be retried later
+    rejected = [key for key, outcome in outcomes.items() if outcome['status'] == 'rejected']
+    if rejected:
+        release_keys(user_id, rejected)
+
+    user_progress = UserProgress.find_by_user_id(user_id) or UserProgress(user_id=user_id)
+    return {
+        'applied': [key for key, outcome in outcomes.items() if outcome['status'] == 'applied'],
+        'rejected': invalid + [
+            {'idempotency_key': key, 'reason': outcomes[key]['reason']} for key in rejected
+        ],
+        'duplicates': duplicates,
+        'quiz_results': {key: outcome['result'] for key, outcome in outcomes.items() if outcome.get('result')},
+        'user_progress': user_progress.to_dict(),
+        'course_progress': [progress.to_dict() for progress in CourseProgress.find_by_user_id(user_id)]
+    }
@@ -0,0 +1,199 @@
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, request
+from pymongo import monitoring
+from services.metrics import command_collection
+from services.slow_queries import filter_shape
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# off: no per-request counting; warn: log repeated query shapes; raise: fail the request (for tests)
+QUERY_COUNTER_MODE = os.getenv('QUERY_COUNTER_MODE', 'off')
+QUERY_COUNTER_REPEAT_THRESHOLD = int(os.getenv('QUERY_COUNTER_REPEAT_THRESHOLD', 5))
+
+# mongomock collection methods and the server command each one stands for
+MONGOMOCK_COMMANDS = {
+    'find': 'find',
+    'find_one': 'find',
+    'count_documents': 'aggregate',
+    'distinct': 'distinct',
+    'aggregate': 'aggregate',
+    'find_one_and_update': 'findAndModify',
+    'find_one_and_replace': 'findAndModify',
+    'find_one_and_delete': 'findAndModify',
+    'insert_one': 'insert',
+    'insert_many': 'insert',
+    'update_one': 'update',
+    'update_many': 'update',
+    'replace_one': 'update',
+    'delete_one': 'delete',
+    'delete_many': 'delete',
+    'bulk_write': 'bulkWrite'
+}
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or test issued more queries than allowed"""
+
+class QueryScope:
+    """Commands issued while a scope is open, grouped by (collection, command, filter shape)"""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.commands = Counter()
+
+    @property
+    def total(self):
+        return sum(self.commands.values())
+
+    def repeated(self, threshold):
+        """Shapes issued more than threshold times, most repeated first"""
+        return [(shape, count) for shape, count in self.commands.most_common() if count > threshold]
+
+    def problems(self, repeat_threshold=None, max_queries=None):
+        """Human readable budget violations (empty when within budget)"""
+        problems = []
+        if max_queries is not None and self.total > max_queries:
+            problems.append(f'{self.total} queries (budget {max_queries})')
+        if repeat_threshold is not None:
+            for (collection, command, shape), count in self.repeated(repeat_threshold):
+                problems.append(f'{command} on {collection} with filter {shape} repeated {count} times (possible N+1)')
+        return problems
+
+    def check(self, repeat_threshold=None, max_queries=None):
+        problems = self.problems(repeat_threshold, max_queries)
+        if problems:
+            raise QueryBudgetExceeded(f'{self.label or "scope"}: ' + '; '.join(problems))
+
+def query_budget(max_queries):
+    """Declare the most queries a view may issue (enforced when QUERY_COUNTER_MODE is not off)"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+class QueryCounter(monitoring.CommandListener):
+    """Counts MongoDB commands per request (or test scope) to catch N+1 query patterns"""
+
+    def __init__(self, mode=QUERY_COUNTER_MODE, repeat_threshold=QUERY_COUNTER_REPEAT_THRESHOLD):
+        self.mode = mode
+        self.repeat_threshold = repeat_threshold
+        self.local = threading.local()
+
+    def _scopes(self):
+        if not hasattr(self.local, 'scopes'):
+            self.local.scopes = []
+        return self.local.scopes
+
+    def push(self, label=None):
+        scope = QueryScope(label)
+        self._scopes().append(scope)
+        return scope
+
+    def pop(self, scope):
+        self._scopes().remove(scope)
+
+    @contextmanager
+    def scope(self, label=None):
+        """Count every command issued on this thread until the block exits"""
+        scope = self.push(label)
+        try:
+            yield scope
+        finally:
+            self.pop(scope)
+
+    @contextmanager
+    def assert_max_queries(self, max_queries=None, repeat_threshold=None, label=None):
+        """Fail when the block issues more than max_queries commands or repeats a shape too often"""
+        with self.scope(label) as scope:
+            yield scope
+        scope.check(self.repeat_threshold if repeat_threshold is None else repeat_threshold, max_queries)
+
+    def record(self, collection, command, shape):
+        # Nested scopes (a test around a request) all see the command
+        for scope in self._scopes():
+            scope.commands[(collection, command, shape)] += 1
+
+    def started(self, event):
+        if self._scopes():
+            self.record(
+                command_collection(event.command_name, event.command),
+                event.command_name,
+                filter_shape(event.command_name, event.command)
+            )
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def install_mongomock(self):
+        """Count mongomock operations too, since mongomock never emits command events"""
+        import mongomock.collection
+
+        collection_class = mongomock.collection.Collection
+        if getattr(collection_class, '_query_counter_installed', False):
+            return
+        for method_name, command in MONGOMOCK_COMMANDS.items():
+            setattr(collection_class, method_name, self._counted(getattr(collection_class, method_name), command))
+        collection_class._query_counter_installed = True
+
+    def _counted(self, method, command):
+        counter = self
+
+        @wraps(method)
+        def wrapper(collection, *args, **kwargs):
+            # mongomock calls its own public methods (find_one -> find); only the outermost call is a query
+            if not counter._scopes() or getattr(counter.local, 'depth', 0):
+                return method(collection, *args, **kwargs)
+            if command == 'aggregate' and args and isinstance(args[0], list):
+                shape = filter_shape('aggregate', {'pipeline': args[0]})
+            elif command in ('insert', 'bulkWrite'):
+                shape = filter_shape(command, {})
+            else:
+                shape = filter_shape('find', {'filter': kwargs.get('filter', args[0] if args else None) or {}})
+            counter.record(collection.name, command, shape)
+            counter.local.depth = 1
+            try:
+                return method(collection, *args, **kwargs)
+            finally:
+                counter.local.depth = 0
+        return wrapper
+
+    def init_app(self, app):
+        """Open a scope around every request and check it when the response is ready"""
+        if self.mode == 'off':
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        g._query_scope = self.push(request.endpoint)
+
+    def _after_request(self, response):
+        # Checked once: an error raised here re-runs after_request for the 500 response
+        scope = g.pop('_query_scope', None)
+        if scope is None:
+            return response
+        self.pop(scope)
+        view = current_app.view_functions.get(request.endpoint)
+        problems = scope.problems(self.repeat_threshold, getattr(view, 'query_budget', None))
+        if problems:
+            message = f'{request.method} {request.path} ({scope.label}): ' + '; '.join(problems)
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def _teardown_request(self, exception=None):
+        scope = g.pop('_query_scope', None)
+        if scope is not None:
+            self.pop(scope)
+
+# Registered with pymongo before any MongoClient is created (see app.py)
+query_counter = QueryCounter()
@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+import tempfile
+import logging
+import uuid
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_FOLDER = os.getenv('UPLOAD_SESSION_FOLDER', os.path.join(tempfile.gettempdir(), 'ecofarm-upload-sessions'))
+UPLOAD_SESSION_MAX_SIZE = int(os.getenv('UPLOAD_SESSION_MAX_SIZE', 512 * 1024 * 1024))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+UPLOAD_CHUNK_MAX_SIZE = int(os.getenv('UPLOAD_CHUNK_MAX_SIZE', 8 * 1024 * 1024))
+UPLOAD_CHUNK_LEASE_SECONDS = int(os.getenv('UPLOAD_CHUNK_LEASE_SECONDS', 600))
+UPLOAD_SESSION_IO_SIZE = 64 * 1024
+
+class UploadSessionError(Exception):
+    """Raised for a chunk the session cannot accept; carries the HTTP status to return"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+class ResumableUploads:
+    """Upload sessions whose bytes are appended to a staging file chunk by chunk, then stored once complete"""
+
+    def __init__(self, folder=UPLOAD_SESSION_FOLDER, max_size=UPLOAD_SESSION_MAX_SIZE,
+                 ttl_hours=UPLOAD_SESSION_TTL_HOURS, chunk_max_size=UPLOAD_CHUNK_MAX_SIZE,
+                 lease_seconds=UPLOAD_CHUNK_LEASE_SECONDS):
+        self.folder = folder
+        self.max_size = max_size
+        self.ttl = timedelta(hours=ttl_hours)
+        self.chunk_max_size = chunk_max_size
+        self.lease_seconds = lease_seconds
+        self.swept_at = 0
+
+    @property
+    def collection(self):
+        from models.upload import upload_sessions_collection
+        return upload_sessions_collection
+
+    def ensure_indexes(self):
+        """Create the TTL index that drops abandoned sessions"""
+        self.collection.create_index('expires_at', expireAfterSeconds=0, name='expires_at_ttl')
+
+    def _path(self, upload_id):
+        return os.path.join(self.folder, f'{upload_id}.part')
+
+    def create(self, user_id, filename, size, metadata=None):
+        """Start a session for a file of the given total size"""
+        if not isinstance(size, int) or size <= 0:
+            raise UploadSessionError('size must be a positive number of bytes')
+        if size > self.max_size:
+            raise UploadSessionError(
+                f'File too large. Maximum size is {self.max_size // (1024 * 1024)}MB.', status=413
+            )
+        self._sweep()
+        os.makedirs(self.folder, exist_ok=True)
+
+        now = datetime.utcnow()
+        session = {
+            '_id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'metadata': metadata or {},
+            'status': 'uploading',
+            'created_at': now,
+            'updated_at': now,
+            'expires_at': now + self.ttl
+        }
+        open(self._path(session['_id']), 'wb').close()
+        self.collection.insert_one(session)
+        return session
+
+    def get(self, upload_id, user_id):
+        """Return a user's session, or None"""
+        return self.collection.find_one({'_id': upload_id, 'user_id': user_id})
+
+    def _claim(self, upload_id, query):
+        """Take the session's write lease if it matches query and no live lease is held; returns the token"""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimed = self.collection.find_one_and_update(
+            {
+                '_id': upload_id,
+                **query,
+                '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]
+            },
+            {'$set': {'lease': token, 'lease_until': now + timedelta(seconds=self.lease_seconds)}}
+        )
+        return token if claimed else None
+
+    def _release(self, upload_id, token, updates=None):
+        """Give the lease back (applying updates) if it is still ours; returns the session or None"""
+        return self.collection.find_one_and_update(
+            {'_id': upload_id, 'lease': token},
+            {'$set': {**(updates or {}), 'lease': None, 'lease_until': None}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _conflict(self, upload_id, message):
+        current = self.collection.find_one({'_id': upload_id}) or {}
+        return UploadSessionError(message, status=409, offset=current.get('offset'))
+
+    def write_chunk(self, session, offset, stream, length=None):
+        """Append the bytes of stream at offset; return the session with its new offset"""
+        if session['status'] != 'uploading':
+            raise UploadSessionError('Upload has already been received', status=409, offset=session['offset'])
+        if offset != session['offset']:
+            raise UploadSessionError('Upload-Offset does not match the uploaded length', status=409,
+                                     offset=session['offset'])
+        remaining = session['size'] - offset
+        if length is not None and length > min(remaining, self.chunk_max_size):
+            raise UploadSessionError('Chunk is larger than allowed', status=413, offset=offset)
+        limit = min(remaining, self.chunk_max_size)
+
+        # Only the holder of the lease touches the staging file, so concurrent PATCHes cannot clobber it
+        token = self._claim(session['_id'], {'offset': offset, 'status': 'uploading'})
+        if token is None:
+            raise self._conflict(session['_id'], 'Another chunk is being written or Upload-Offset is stale')
+        deadline = time.monotonic() + self.lease_seconds
+
+        path = self._path(session['_id'])
+        written = 0
+        try:
+            with open(path, 'r+b') as staged:
+                # Drop any bytes left by an interrupted chunk that was never acknowledged
+                staged.truncate(offset)
+                staged.seek(offset)
+                while True:
+                    if time.monotonic() > deadline:
+                        # The lease may now belong to a retry; stop before touching its bytes
+                        raise UploadSessionError('Chunk took too long', status=408, offset=offset)
+                    data = stream.read(min(UPLOAD_SESSION_IO_SIZE, limit - written + 1))
+                    if not data:
+                        break
+                    written += len(data)
+                    if written > limit:
+                        staged.truncate(offset)
+                        raise UploadSessionError('Chunk is larger than allowed', status=413, offset=offset)
+                    staged.write(data)
+                staged.flush()
+                os.fsync(staged.fileno())
+        except BaseException:
+            self._release(session['_id'], token)
+            raise
+
+        now = datetime.utcnow()
+        updated = self._release(session['_id'], token, {
+            'offset': offset + written,
+            'updated_at': now,
+            'expires_at': now + self.ttl
+        })
+        if updated is None:
+            raise self._conflict(session['_id'], 'Chunk took too long')
+        return updated
+
+    def complete(self, session, store):
+        """Hand the fully received staging file to store(file) and record the stored object
+
+        If store fails the session is left 'uploaded' so the client can retry the finalize; if the
+        lease is lost while storing, UploadSessionError(409) is raised and the staging file is kept.
+        """
+        token = self._claim(session['_id'], {
+            'offset': session['size'],
+            'status': {'$in': ['uploading', 'uploaded']}
+        })
+        if token is None:
+            raise self._conflict(session['_id'], 'Upload is not fully received or is being finalized')
+
+        path = self._path(session['_id'])
+        try:
+            with open(path, 'rb') as staged:
+                result = store(staged)
+        except Exception as e:
+            logger.warning('Failed to store upload %s: %s', session['_id'], e)
+            self._release(session['_id'], token, {
+                'status': 'uploaded',
+                'error': str(e),
+                'updated_at': datetime.utcnow()
+            })
+            raise UploadSessionError('Failed to store the upload; retry the finalize', status=500,
+                                     offset=session['size'])
+
+        completed = self._release(session['_id'], token, {
+            'status': 'complete',
+            'result': result,
+            'error': None,
+            'updated_at': datetime.utcnow()
+        })
+        if completed is None:
+            # The lease expired during store and another finalize holds it; that one owns the staging file
+            raise self._conflict(session['_id'], 'Upload is being finalized by another request')
+        os.remove(path)
+        return completed
+
+    def _sweep(self):
+        # Staging files outlive sessions removed by the TTL index; drop stale ones at most hourly
+        if time.time() - self.swept_at < 3600 or not os.path.isdir(self.folder):
+            return
+        self.swept_at = time.time()
+        cutoff = self.swept_at - self.ttl.total_seconds()
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError as e:
+                logger.warning('Failed to remove stale upload %s: %s', entry.path, e)
+
+# Shared session store used by the upload routes
+resumable_uploads = ResumableUploads()
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+import threading
+import hashlib
+import logging
+import math
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', 5))
+REVOCATION_REBUILD_SECONDS = float(os.getenv('REVOCATION_REBUILD_SECONDS', 3600))
+REVOCATION_FILTER_CAPACITY = int(os.getenv('REVOCATION_FILTER_CAPACITY', 100000))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv('REVOCATION_FILTER_ERROR_RATE', 0.001))
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class TokenDenylist:
+    """Revoked JWT ids: stored in a TTL collection, checked against a per-worker filter and exact set"""
+
+    def __init__(self, sync_seconds=REVOCATION_SYNC_SECONDS, rebuild_seconds=REVOCATION_REBUILD_SECONDS,
+                 capacity=REVOCATION_FILTER_CAPACITY, error_rate=REVOCATION_FILTER_ERROR_RATE):
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        # (filter, exact jti map) swapped as one reference so readers never see a half-built pair
+        self.index = (BloomFilter(capacity, error_rate), {})
+        self.synced_until = None
+        self.synced_at = None
+        self.rebuilt_at = None
+
+    @property
+    def collection(self):
+        from models.user import revoked_tokens_collection
+        return revoked_tokens_collection
+
+    def ensure_indexes(self):
+        """Create the incremental sync index and the TTL index that drops expired revocations"""
+        self.collection.create_index([('revoked_at', ASCENDING)])
+        self.collection.create_index('expires_at', expireAfterSeconds=0, name='expires_at_ttl')
+
+    def revoke(self, jti, user_id=None, expires_at=None):
+        """Revoke a token until it would have expired anyway"""
+        revoked_at = datetime.utcnow()
+        expires_at = expires_at or revoked_at + timedelta(days=30)
+        try:
+            self.collection.insert_one({
+                '_id': jti,
+                'user_id': user_id,
+                'revoked_at': revoked_at,
+                'expires_at': expires_at
+            })
+        except DuplicateKeyError:
+            pass
+        with self.lock:
+            self._add(jti, expires_at)
+
+    def is_revoked(self, jti):
+        """Per-request check: memory only, apart from a periodic incremental sync"""
+        self.sync()
+        bloom, revoked = self.index
+        if jti not in bloom:
+            return False
+        expires_at = revoked.get(jti)
+        return expires_at is not None and expires_at > datetime.utcnow()
+
+    def sync(self, force=False):
+        """Pull revocations made by other workers since the last sync"""
+        now = time.monotonic()
+        if not force and self.synced_at is not None and now - self.synced_at < self.sync_seconds:
+            return
+        # Only one thread syncs; the others keep answering from memory
+        if not self.lock.acquire(blocking=force):
+            return
+        try:
+            if self.rebuilt_at is None or now - self.rebuilt_at >= self.rebuild_seconds:
+                self._rebuild()
+            else:
+                # Overlap by one interval so writes with slightly skewed clocks are not missed
+                since = self.synced_until - timedelta(seconds=self.sync_seconds)
+                self.synced_until = self._load({'revoked_at': {'$gte': since}}, self.index, self.synced_until)
+            self.synced_at = now
+        except Exception as e:
+            logger.warning('Failed to sync revoked tokens: %s', e)
+        finally:
+            self.lock.release()
+
+    def _rebuild(self):
+        # Start over so expired revocations leave the filter; the live index keeps answering meanwhile
+        index = (BloomFilter(self.capacity, self.error_rate), {})
+        synced_until = self._load({'expires_at': {'$gt': datetime.utcnow()}}, index, datetime.utcnow())
+        self.index = index
+        self.synced_until = synced_until
+        self.rebuilt_at = time.monotonic()
+
+    def _load(self, query, index, synced_until):
+        """Add matching revocations to index; returns the newest revoked_at seen"""
+        for token in self.collection.find(query, {'expires_at': 1, 'revoked_at': 1}):
+            self._add(token['_id'], token['expires_at'], index)
+            synced_until = max(synced_until, token['revoked_at'])
+        return synced_until
+
+    def _add(self, jti, expires_at, index=None):
+        bloom, revoked = index or self.index
+        bloom.add(jti)
+        revoked[jti] = expires_at
+
+# Shared denylist consulted by the JWT blocklist loader
+token_denylist = TokenDenylist()
@@ -0,0 +1,217 @@
+from datetime import datetime
+from flask import has_request_context, request
+from pymongo import monitoring, ASCENDING, DESCENDING
+from services.metrics import command_collection
+import threading
+import logging
+import random
+import queue
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+SLOW_QUERY_LOG_SIZE_BYTES = int(os.getenv('SLOW_QUERY_LOG_SIZE_BYTES', 16 * 1024 * 1024))
+
+# Where each command keeps the filter that decides which documents it touches
+FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'aggregate': 'pipeline'
+}
+
+# Commands the server can explain
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+
+# Driver/session fields that must not be sent back inside an explain
+SESSION_FIELDS = {'lsid', 'txnNumber', '$db', '$clusterTime', '$readPreference', 'autocommit', 'startTransaction'}
+
+def redact(value):
+    """Replace every value in a filter with '?', keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in/$nin/$or lists collapse to the shape of their distinct elements so list length does not matter
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return '?'
+
+def filter_shape(command_name, command):
+    """Redacted filter (or pipeline) of a command as a stable JSON string"""
+    if command_name in ('update', 'delete'):
+        # Batched writes share a shape, so the first statement stands for all of them
+        statements = command.get(f'{command_name}s') or [{}]
+        target = statements[0].get('q', {})
+    else:
+        target = command.get(FILTER_FIELDS.get(command_name), {})
+    return json.dumps(redact(target), sort_keys=True)
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Records MongoDB commands slower than a threshold in a capped collection"""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_THRESHOLD_MS, explain_sample_rate=SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+                 size_bytes=SLOW_QUERY_LOG_SIZE_BYTES):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.size_bytes = size_bytes
+        self.pending = {}
+        # Open tailable cursors (the Mongo stream transport); their getMores wait for data by design
+        self.tailable_cursors = set()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = None
+        self.db = None
+        self.client = None
+
+    def set_database(self, db):
+        """Store entries in db and run explains through its client"""
+        self.db = db
+        self.client = db.client
+
+    @property
+    def collection(self):
+        return self.db['slow_queries']
+
+    def ensure_indexes(self):
+        """Create the capped log collection and its lookup indexes"""
+        if 'slow_queries' not in self.db.list_collection_names():
+            try:
+                self.db.create_collection('slow_queries', capped=True, size=self.size_bytes)
+            except NotImplementedError:
+                # mongomock has no capped collections; a plain one behaves the same for reads
+                pass
+        self.collection.create_index([('occurred_at', DESCENDING)])
+        self.collection.create_index([('collection', ASCENDING), ('occurred_at', DESCENDING)])
+
+    def started(self, event):
+        # Skip the log's own writes and the explains it runs so they are never logged recursively
+        if event.command_name == 'explain':
+            return
+        key = (event.request_id, event.connection_id)
+        if event.command_name == 'getMore' and event.command.get('getMore') in self.tailable_cursors:
+            # A tailable-await getMore blocks until new documents arrive; only watch for the cursor closing
+            with self.lock:
+                self.pending[key] = ('tailable', event.command['getMore'])
+            return
+        if event.command_name == 'killCursors':
+            with self.lock:
+                self.tailable_cursors.difference_update(event.command.get('cursors', []))
+        collection = command_collection(event.command_name, event.command)
+        if collection == 'slow_queries':
+            return
+        # Listeners run on the thread that issued the command, so the request context is still available
+        endpoint = method = None
+        if has_request_context():
+            endpoint, method = request.endpoint, request.method
+        with self.lock:
+            self.pending[key] = (event.command, event.database_name, collection, endpoint, method)
+
+    def _finish(self, event, status):
+        with self.lock:
+            started = self.pending.pop((event.request_id, event.connection_id), None)
+        if started is None:
+            return
+        cursor_id = ((getattr(event, 'reply', None) or {}).get('cursor') or {}).get('id')
+        if started[0] == 'tailable':
+            if status == 'failed' or not cursor_id:
+                with self.lock:
+                    self.tailable_cursors.discard(started[1])
+            return
+        command, database, collection, endpoint, method = started
+        if event.command_name == 'find' and command.get('tailable'):
+            # Later getMores on this cursor are waits for new data, not slow queries
+            if status == 'succeeded' and cursor_id:
+                with self.lock:
+                    self.tailable_cursors.add(cursor_id)
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        entry = {
+            'command': event.command_name,
+            'database': database,
+            'collection': collection,
+            'endpoint': endpoint,
+            'method': method,
+            'filter_shape': filter_shape(event.command_name, command),
+            'duration_ms': round(duration_ms, 3),
+            'status': status,
+            'occurred_at': datetime.utcnow()
+        }
+        explain = event.command_name in EXPLAINABLE_COMMANDS and random.random() < self.explain_sample_rate
+        self.enqueue(entry, command if explain else None)
+
+    def succeeded(self, event):
+        self._finish(event, 'succeeded')
+
+    def failed(self, event):
+        self._finish(event, 'failed')
+
+    def enqueue(self, entry, command=None):
+        """Write an entry (explaining command first) off the request thread"""
+        if self.db is None:
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        self.queue.put((entry, command))
+
+    def wait(self):
+        """Block until every queued entry has been written"""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            entry, command = self.queue.get()
+            try:
+                if command is not None:
+                    entry['explain'] = self.explain(entry['database'], command)
+                self.collection.insert_one(entry)
+            except Exception as e:
+                logger.warning('Failed to record slow query on %s: %s', entry.get('collection'), e)
+            finally:
+                self.queue.task_done()
+
+    def explain(self, database, command):
+        """Query planner output for a command (the winning plan is enough to spot a collection scan)"""
+        command = {key: value for key, value in command.items() if key not in SESSION_FIELDS}
+        try:
+            result = self.client[database].command({'explain': command, 'verbosity': 'queryPlanner'})
+        except Exception as e:
+            return {'error': str(e)}
+        planner = result.get('queryPlanner', {})
+        return {
+            'namespace': planner.get('namespace'),
+            'winning_plan': planner.get('winningPlan'),
+            'rejected_plans': len(planner.get('rejectedPlans', []))
+        }
+
+    def find(self, collection=None, endpoint=None, min_duration_ms=None, since=None, limit=50):
+        """Most recent entries, optionally filtered"""
+        query = {}
+        if collection:
+            query['collection'] = collection
+        if endpoint:
+            query['endpoint'] = endpoint
+        if min_duration_ms is not None:
+            query['duration_ms'] = {'$gte': min_duration_ms}
+        if since:
+            query['occurred_at'] = {'$gte': since}
+        entries = []
+        for entry in self.collection.find(query).sort('occurred_at', DESCENDING).limit(limit):
+            entry['_id'] = str(entry['_id'])
+            entry['occurred_at'] = entry['occurred_at'].isoformat()
+            entries.append(entry)
+        return entries
+
+# Registered with pymongo before any MongoClient is created (see app.py)
+slow_query_log = SlowQueryLog()
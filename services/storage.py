@@ -0,0 +1,257 @@
+from werkzeug.utils import safe_join
+import threading
+import tempfile
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'cloudinary' if os.getenv('CLOUDINARY_CLOUD_NAME') else 'local')
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+STORAGE_CHUNK_SIZE = int(os.getenv('STORAGE_CHUNK_SIZE', 64 * 1024))
+STORAGE_BASE_URL = os.getenv('STORAGE_BASE_URL', '/api/upload/files')
+
+def hash_stream(stream, chunk_size=STORAGE_CHUNK_SIZE):
+    """SHA-256 and size of a seekable stream, read in chunks and rewound"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+class LocalStorage:
+    """Stores uploads on disk under sharded directories, written in chunks and renamed into place"""
+
+    name = 'local'
+
+    def __init__(self, root=UPLOAD_FOLDER, base_url=STORAGE_BASE_URL, chunk_size=STORAGE_CHUNK_SIZE):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _shard(filename):
+        # Two levels of 256 directories keep any one directory small
+        digest = hashlib.md5(filename.encode('utf-8')).hexdigest()
+        return digest[:2], digest[2:4]
+
+    def locate(self, public_id):
+        """Stored (sharded) id of an object saved under public_id"""
+        prefix, filename = os.path.split(public_id)
+        return '/'.join(part for part in (prefix, *self._shard(filename), filename) if part)
+
+    def path(self, public_id):
+        """Absolute path of a stored object, or None if public_id escapes the storage root"""
+        return safe_join(self.root, public_id)
+
+    def url(self, public_id):
+        return f"{self.base_url}/{public_id}"
+
+    def url_for(self, public_id):
+        """URL an object saved under public_id has (or will have once saved)"""
+        return self.url(self.locate(public_id))
+
+    def save(self, stream, public_id, folder=None, **options):
+        """Copy stream to disk in chunks; the object only appears once it is complete"""
+        public_id = self.locate(public_id)
+        path = self.path(public_id)
+        if path is None:
+            raise ValueError(f'Invalid public id: {public_id}')
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    size += len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        return {
+            'public_id': public_id,
+            'secure_url': self.url(public_id),
+            'bytes': size
+        }
+
+    def delete(self, public_id):
+        """Remove a stored object, returning False if it does not exist"""
+        path = self.path(public_id)
+        if path is None or not os.path.isfile(path):
+            return False
+        os.remove(path)
+        return True
+
+class CloudinaryStorage:
+    """Streams uploads to Cloudinary, applying its transformations on their side"""
+
+    name = 'cloudinary'
+
+    def __init__(self, cloud_name=None, api_key=None, api_secret=None):
+        import cloudinary
+        cloudinary.config(
+            cloud_name=cloud_name or os.getenv('CLOUDINARY_CLOUD_NAME'),
+            api_key=api_key or os.getenv('CLOUDINARY_API_KEY'),
+            api_secret=api_secret or os.getenv('CLOUDINARY_API_SECRET')
+        )
+
+    def locate(self, public_id):
+        """Cloudinary stores objects under the public id they were saved with"""
+        return public_id
+
+    def save(self, stream, public_id, folder=None, **options):
+        import cloudinary.uploader
+        if folder:
+            options['folder'] = folder
+        return cloudinary.uploader.upload(stream, public_id=public_id, **options)
+
+    def url_for(self, public_id):
+        import cloudinary.utils
+        return cloudinary.utils.cloudinary_url(public_id, secure=True)[0]
+
+    def delete(self, public_id):
+        import cloudinary.uploader
+        return cloudinary.uploader.destroy(public_id).get('result') == 'ok'
+
+class UploadStorage:
+    """Delegates uploads to the backend selected by STORAGE_BACKEND"""
+
+    backends = {
+        'local': LocalStorage,
+        'cloudinary': CloudinaryStorage
+    }
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        """Create the backend named by app.config['STORAGE_BACKEND']"""
+        name = app.config.get('STORAGE_BACKEND', STORAGE_BACKEND)
+        if name not in self.backends:
+            raise ValueError(f'Unknown storage backend: {name}')
+        if name == 'local':
+            backend = LocalStorage(root=app.config.get('UPLOAD_FOLDER', UPLOAD_FOLDER))
+        else:
+            backend = self.backends[name]()
+        self.set_backend(backend)
+        logger.info('Upload storage backend: %s', name)
+
+    def set_backend(self, backend):
+        """Replace the backend (tests use a LocalStorage in a temporary directory)"""
+        with self.lock:
+            self.backend = backend
+
+    def _backend(self):
+        if self.backend is None:
+            self.set_backend(LocalStorage())
+        return self.backend
+
+    @property
+    def name(self):
+        return self._backend().name
+
+    def save(self, stream, public_id, folder=None, **options):
+        """Store a file-like object and return {'public_id', 'secure_url', ...}"""
+        return self._backend().save(stream, public_id, folder=folder, **options)
+
+    def locate(self, public_id):
+        """Stored id of an object saved under public_id (what clients use to delete it)"""
+        return self._backend().locate(public_id)
+
+    def url_for(self, public_id):
+        """URL of an object saved under public_id, known before the save completes"""
+        return self._backend().url_for(public_id)
+
+    def delete(self, public_id):
+        """Delete a stored object, returning whether it existed"""
+        return self._backend().delete(public_id)
+
+    def save_content(self, stream, prefix, user_id, ext='', **options):
+        """Store content once under its SHA-256; identical uploads add the user's reference to the same object"""
+        from models.upload import UploadBlob
+        content_hash, size = hash_stream(stream)
+        blob = UploadBlob.acquire(content_hash, user_id)
+        deduplicated = blob is not None
+        if not deduplicated:
+            result = self.save(stream, f"{prefix}/{content_hash}{ext.lower()}", **options)
+            blob = UploadBlob.register(content_hash, result['public_id'], result['secure_url'], size, user_id)
+        return {
+            'public_id': blob['public_id'],
+            'secure_url': blob['url'],
+            'bytes': blob['size'],
+            'content_hash': content_hash,
+            'deduplicated': deduplicated
+        }
+
+    def release(self, public_id, user_id, admin=False):
+        """Drop the user's reference to an upload, deleting the object once nothing references it
+
+        Raises PermissionError if the user holds no reference; returns False if nothing was found.
+        Admins may delete objects outside the upload indexes whose owner cannot be told from the name.
+        """
+        from models.upload import UploadBlob, UploadImage
+        if UploadBlob.find_by_public_id(public_id) is None:
+            image = UploadImage.find_by_public_id(public_id)
+            if image is not None:
+                # Processed images go with all of their variants
+                if image['user_id'] != user_id:
+                    raise PermissionError('Upload belongs to another user')
+                for variant in image['public_ids']:
+                    self.delete(variant)
+                UploadImage.remove(image['_id'])
+                return True
+            # Not indexed (uploads from before the upload indexes): the owner comes from the name
+            if not admin and not self._owns_unindexed(public_id, user_id):
+                raise PermissionError('Upload belongs to another user')
+            return self.delete(public_id)
+        removed = UploadBlob.release(public_id, user_id)
+        if removed is None:
+            raise PermissionError('No upload of this file by the user')
+        if removed:
+            self.delete(public_id)
+        return True
+
+    @staticmethod
+    def _owns_unindexed(public_id, user_id):
+        """Whether an object outside the upload indexes belongs to the user, judged by its name
+
+        Names start with the owner's id, except course materials stored before uploads were
+        indexed (course-materials/{course_id}_{type}_...), which belong to the course's creator.
+        """
+        name = os.path.basename(public_id)
+        if name.startswith(f'{user_id}_'):
+            return True
+        if 'course-materials' not in public_id.split('/')[:-1]:
+            return False
+        from bson import ObjectId
+        from models.course import Course
+        course_id = name.split('_', 1)[0]
+        course = Course.find_by_id(course_id) if ObjectId.is_valid(course_id) else None
+        return course is not None and course.created_by is not None and str(course.created_by) == str(user_id)
+
+    def local_path(self, public_id):
+        """Disk path of an object held by the local backend, else None"""
+        backend = self._backend()
+        return backend.path(public_id) if isinstance(backend, LocalStorage) else None
+
+# Shared storage used by the upload routes
+upload_storage = UploadStorage()
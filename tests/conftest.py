@@ -1,4 +1,5 @@
 import pytest
+import copy
 import os
 import sys
 from unittest.mock import patch, MagicMock
@@ -11,8 +12,13 @@ os.environ['TESTING'] = 'true'
 os.environ['SECRET_KEY'] = 'test-secret-key'
 os.environ['JWT_SECRET_KEY'] = 'test-jwt-secret-key'
 os.environ['MONGODB_URI'] = 'mongodb://localhost:27017/ecofarmquest_test'
+# Fail any request that repeats the same query shape too often (N+1)
+os.environ.setdefault('QUERY_COUNTER_MODE', 'raise')
+# Uploads go to local disk so the tests never need a Cloudinary account
+os.environ.setdefault('STORAGE_BACKEND', 'local')
 
 from app import app
+from scripts.fixture_data import TEST_USER_DATA, TEST_COURSE_DATA, TEST_ACHIEVEMENT_DATA, TEST_DISCUSSION_DATA
 
 @pytest.fixture(scope='session')
 def test_app():
@@ -37,59 +43,22 @@ def auth_headers():
 @pytest.fixture
 def test_user_data():
     """Test user data"""
-    return {
-        'name': 'Test Farmer',
-        'email': 'test@example.com',
-        'password': 'TestPassword123',
-        'phone': '+91 98765 43210',
-        'location': 'Test Village',
-        'farm_size': '5 acres',
-        'primary_crops': ['Rice', 'Wheat'],
-        'farming_experience': '10 years',
-        'water_source': 'borewell'
-    }
+    return copy.deepcopy(TEST_USER_DATA)
 
 @pytest.fixture
 def test_course_data():
     """Test course data"""
-    return {
-        'title': 'Test Course',
-        'description': 'A test course for unit testing',
-        'category': 'water',
-        'duration': '2 hours',
-        'difficulty': 2,
-        'thumbnail': '🌊',
-        'color': '#2196F3',
-        'certificate': 'Test Certificate'
-    }
+    return copy.deepcopy(TEST_COURSE_DATA)
 
 @pytest.fixture
 def test_achievement_data():
     """Test achievement data"""
-    return {
-        'name': 'Test Achievement',
-        'description': 'This is a test achievement for unit testing',
-        'icon': '🏆',
-        'points': 100,
-        'category': 'learning',
-        'requirements': {
-            'courses_completed': 1,
-            'lessons_completed': 5
-        },
-        'rarity': 'common'
-    }
+    return copy.deepcopy(TEST_ACHIEVEMENT_DATA)
 
 @pytest.fixture
 def test_discussion_data():
     """Test discussion data"""
-    return {
-        'title': 'Test Discussion',
-        'content': 'This is a test discussion for unit testing',
-        'category': 'general',
-        'author_id': 'test-user-id',
-        'author_name': 'Test Farmer',
-        'author_avatar': '🐄'
-    }
+    return copy.deepcopy(TEST_DISCUSSION_DATA)
 
 @pytest.fixture
 def mock_user():
@@ -7,8 +7,17 @@ from datetime import datetime
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from flask_jwt_extended import create_access_token
 from app import app
 from models.user import User
+from models.community import (
+    Achievement as CommunityAchievement, UserAchievement, AchievementLeaderboard, Discussion,
+    achievements_collection, user_achievements_collection, achievement_leaderboard_collection, discussions_collection
+)
+from models.learning_event import LearningEvent, learning_events_collection
+from models.progress import user_progress_collection
+from models.notification import notifications_collection
+from services.achievements import achievement_engine, parse_requirement, UnknownRequirementError
 try:
     from models.achievement import Achievement
     _ACHIEVEMENT_MODEL_AVAILABLE = True
@@ -331,5 +340,201 @@ class TestAchievementsAPI(unittest.TestCase):
         self.assertIn('rarities', data['data'])
         self.assertIsInstance(data['data']['rarities'], list)
 
+class TestAchievementRuleEngine(unittest.TestCase):
+    """Test cases for incremental achievement unlocking"""
+
+    def setUp(self):
+        """Create a user and a few threshold achievements"""
+        self.app = app.test_client()
+        self.user = User(name='Rule Farmer', email='rule-farmer@example.com').save()
+        self.user_id = self.user.id
+        with app.app_context():
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_id)}'}
+        self.achievements = [
+            CommunityAchievement(name='Rule First Lesson', category='rule-test', points=5,
+                        requirement={'lessons_completed': 1}).save(),
+            CommunityAchievement(name='Rule Three Lessons', category='rule-test', points=20,
+                        requirement={'lessons_completed': 3}).save(),
+            CommunityAchievement(name='Rule Graduate', category='rule-test', points=50,
+                        requirement={'type': 'courses_completed', 'value': 1}).save()
+        ]
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.user.delete()
+        achievements_collection.delete_many({'category': 'rule-test'})
+        achievement_engine.invalidate()
+        for collection in (learning_events_collection, user_progress_collection,
+                           user_achievements_collection, notifications_collection):
+            collection.delete_many({'user_id': self.user_id})
+
+    def unlocked_names(self):
+        names = {achievement.id: achievement.name for achievement in self.achievements}
+        return {names[unlock.achievement_id] for unlock in UserAchievement.find_by_user_id(self.user_id)
+                if unlock.achievement_id in names}
+
+    def test_parse_requirement_formats(self):
+        """Test both requirement shapes map onto learning_stats fields"""
+        self.assertEqual(parse_requirement({'lessons_completed': 3}), {'completed_lessons': 3.0})
+        self.assertEqual(parse_requirement({'type': 'learning_streak', 'value': 7}), {'learning_streak': 7.0})
+        self.assertEqual(parse_requirement({}), {})
+
+    def test_unknown_requirement_type_fails_loudly(self):
+        """Test a requirement no stat is kept for is rejected instead of never unlocking"""
+        with self.assertRaises(UnknownRequirementError):
+            parse_requirement({'type': 'streak', 'value': 7})
+        with self.assertRaises(UnknownRequirementError):
+            CommunityAchievement(name='Rule Unknown', category='rule-test',
+                                 requirement={'type': 'planted_trees', 'value': 3}).save()
+        self.assertIsNone(achievements_collection.find_one({'name': 'Rule Unknown'}))
+
+    def test_stored_unknown_requirement_is_skipped(self):
+        """Test a bad stored achievement does not break the projections that evaluate rules"""
+        achievements_collection.insert_one({'name': 'Rule Photos', 'category': 'rule-test', 'is_active': True,
+                                            'requirement': {'type': 'photos_uploaded', 'value': 1}})
+        achievement_engine.invalidate()
+        with self.assertLogs('services.achievements', level='ERROR'):
+            LearningEvent.record(self.user_id, 'lesson_completed', course_id='c1', lesson_id='l1', points=10)
+        self.assertEqual(self.unlocked_names(), {'Rule First Lesson'})
+
+    def test_activity_counters_unlock_achievements(self):
+        """Test perfect quizzes and night study are counted from the events"""
+        self.achievements += [
+            CommunityAchievement(name='Rule Perfect Quiz', category='rule-test', points=5,
+                                 requirement={'type': 'perfect_quizzes', 'value': 1}).save(),
+            CommunityAchievement(name='Rule Night Owl', category='rule-test', points=5,
+                                 requirement={'type': 'night_study', 'value': 2}).save()
+        ]
+        night = datetime(2024, 3, 4, 23, 30)
+        LearningEvent.record(self.user_id, 'quiz_submitted', quiz_id='q1', score=100, points=10, occurred_at=night)
+        self.assertEqual(self.unlocked_names(), {'Rule Perfect Quiz'})
+        LearningEvent.record(self.user_id, 'quiz_submitted', quiz_id='q2', score=60, points=5,
+                             occurred_at=night.replace(hour=2))
+        self.assertEqual(self.unlocked_names(), {'Rule Perfect Quiz', 'Rule Night Owl'})
+        self.assertEqual(User.find_by_id(self.user_id).learning_stats['perfect_quizzes'], 1)
+
+    def test_community_actions_unlock_achievements(self):
+        """Test discussions started are counted on the author's stats"""
+        self.achievements.append(CommunityAchievement(name='Rule Discussion Leader', category='rule-test', points=5,
+                                                      requirement={'type': 'discussions_started', 'value': 2}).save())
+        try:
+            for i in range(2):
+                Discussion(title=f'Rule discussion {i}', content='Soil tips', category='rule-test',
+                           author_id=self.user_id, author_name='Rule Farmer').save()
+        finally:
+            discussions_collection.delete_many({'author_id': self.user_id})
+        self.assertEqual(User.find_by_id(self.user_id).learning_stats['discussions_started'], 2)
+        self.assertEqual(self.unlocked_names(), {'Rule Discussion Leader'})
+
+    def test_rules_crossed_only_returns_new_thresholds(self):
+        """Test the threshold index only yields rules between the old and new value"""
+        crossed = achievement_engine.rules_crossed('completed_lessons', 1, 3)
+        self.assertEqual([rule.achievement.name for rule in crossed
+                          if rule.achievement.category == 'rule-test'], ['Rule Three Lessons'])
+
+    def test_events_unlock_achievements_once(self):
+        """Test learning events unlock achievements as thresholds are crossed"""
+        LearningEvent.record(self.user_id, 'lesson_completed', course_id='c1', lesson_id='l1', points=10)
+        self.assertEqual(self.unlocked_names(), {'Rule First Lesson'})
+
+        LearningEvent.record_many(self.user_id, [
+            LearningEvent(user_id=self.user_id, type='lesson_completed', course_id='c1', lesson_id=f'l{i}', points=10)
+            for i in (2, 3)
+        ] + [LearningEvent(user_id=self.user_id, type='course_completed', course_id='c1', points=50)])
+        self.assertEqual(self.unlocked_names(), {'Rule First Lesson', 'Rule Three Lessons', 'Rule Graduate'})
+        self.assertEqual(user_achievements_collection.count_documents({'user_id': self.user_id}), 3)
+        self.assertEqual(notifications_collection.count_documents(
+            {'user_id': self.user_id, 'category': 'achievement'}), 3)
+
+    def test_my_achievements_reports_progress(self):
+        """Test the user's achievement list combines unlocks and progress"""
+        LearningEvent.record(self.user_id, 'lesson_completed', course_id='c1', lesson_id='l1', points=10)
+
+        response = self.app.get('/api/achievements/my-achievements', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        achievements = {a['name']: a for a in json.loads(response.data)['data']['achievements']}
+        self.assertTrue(achievements['Rule First Lesson']['unlocked'])
+        self.assertFalse(achievements['Rule Three Lessons']['unlocked'])
+        self.assertAlmostEqual(achievements['Rule Three Lessons']['progress'], 100 / 3)
+
+    def test_check_uses_stored_stats(self):
+        """Test the check endpoint evaluates server-side stats rather than the reported value"""
+        User.find_by_id(self.user_id).update_learning_stats({'completed_courses': 0})
+        response = self.app.post('/api/achievements/check', headers=self.headers,
+                                 json={'type': 'course_completed', 'value': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['data']['new_achievements'], [])
+
+        User.find_by_id(self.user_id).update_learning_stats({'completed_courses': 1})
+        response = self.app.post('/api/achievements/check', headers=self.headers,
+                                 json={'type': 'course_completed'})
+        names = [a['name'] for a in json.loads(response.data)['data']['new_achievements']]
+        self.assertEqual(names, ['Rule Graduate'])
+
+class TestAchievementLeaderboard(unittest.TestCase):
+    """Test cases for the achievement leaderboard view"""
+
+    def setUp(self):
+        """Create three users with different unlocks"""
+        self.app = app.test_client()
+        achievement_leaderboard_collection.delete_many({})
+        self.users = [User(name=f'Board Farmer {i}', email=f'board-{i}@example.com', location='Board Village',
+                           avatar={'emoji': '🐄', 'name': 'Gaay', 'type': 'Dairy Expert'}).save()
+                      for i in range(3)]
+        self.user_ids = [user.id for user in self.users]
+        badges = [CommunityAchievement(_id=f'board-badge-{i}', points=points) for i, points in enumerate([10, 20, 30])]
+        # user 0: two badges (30 pts), user 1: two badges (50 pts), user 2: one badge (30 pts)
+        for user_id, badge in [(0, 0), (0, 1), (1, 1), (1, 2), (2, 2)]:
+            UserAchievement.unlock(self.user_ids[user_id], badges[badge])
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for user in self.users:
+            user.delete()
+        user_achievements_collection.delete_many({'user_id': {'$in': self.user_ids}})
+        achievement_leaderboard_collection.delete_many({})
+
+    def test_top_k_rank_order(self):
+        """Test rows are ranked by unlocks then points"""
+        top = AchievementLeaderboard.find_top(limit=2)
+        self.assertEqual([entry.user_id for entry in top], [self.user_ids[1], self.user_ids[0]])
+        self.assertEqual([entry.rank for entry in top], [1, 2])
+        self.assertEqual(top[0].total_points, 50)
+        self.assertEqual(top[0].user_name, 'Board Farmer 1')
+        self.assertEqual(top[0].user_avatar, '🐄')
+
+    def test_my_rank_and_repeat_unlock(self):
+        """Test a user's rank is read from the view and repeat unlocks are not counted"""
+        UserAchievement.unlock(self.user_ids[2], CommunityAchievement(_id='board-badge-2', points=30))
+        entry = AchievementLeaderboard.find_by_user_id(self.user_ids[2])
+        self.assertEqual((entry.rank, entry.achievements_unlocked), (3, 1))
+
+        UserAchievement.unlock(self.user_ids[2], CommunityAchievement(_id='board-badge-3', points=40))
+        entry = AchievementLeaderboard.find_by_user_id(self.user_ids[2])
+        self.assertEqual((entry.rank, entry.achievements_unlocked, entry.total_points), (1, 2, 70))
+        self.assertIsNone(AchievementLeaderboard.find_by_user_id('nobody'))
+
+    def test_rebuild_matches_incremental_view(self):
+        """Test the full rebuild produces the same rows as incremental updates"""
+        incremental = [entry.to_dict() for entry in AchievementLeaderboard.find_top()]
+        achievement_leaderboard_collection.update_many({}, {'$set': {'total_points': 0}})
+        self.assertEqual(AchievementLeaderboard.rebuild(), 3)
+        rebuilt = [entry.to_dict() for entry in AchievementLeaderboard.find_top()]
+        strip = lambda rows: [{k: v for k, v in row.items() if k != 'updated_at'} for row in rows]
+        self.assertEqual(strip(rebuilt), strip(incremental))
+
+    def test_leaderboard_endpoint(self):
+        """Test the endpoint returns top-K and the caller's rank"""
+        response = self.app.get('/api/achievements/leaderboard?limit=1')
+        data = json.loads(response.data)['data']
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['user_id'] for entry in data['leaderboard']], [self.user_ids[1]])
+        self.assertIsNone(data['my_rank'])
+
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_ids[2])}'}
+        data = json.loads(self.app.get('/api/achievements/leaderboard?limit=1', headers=headers).data)['data']
+        self.assertEqual(data['my_rank']['rank'], 3)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch, PropertyMock
 import json
 import os
 import sys
@@ -13,8 +14,10 @@ os.environ['SECRET_KEY'] = 'test-secret-key'
 os.environ['JWT_SECRET_KEY'] = 'test-jwt-secret-key'
 os.environ['MONGODB_URI'] = 'mongodb://localhost:27017/ecofarmquest_test'
 
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
 from app import app
-from models.user import User
+from models.user import User, revoked_tokens_collection
+from services.revocation import BloomFilter, TokenDenylist, token_denylist
 
 class TestAuthAPI(unittest.TestCase):
     """Test cases for authentication API endpoints"""
@@ -259,5 +262,76 @@ class TestAuthAPI(unittest.TestCase):
         data = json.loads(response.data)
         self.assertEqual(data['status'], 'success')
 
+class TestTokenRevocation(unittest.TestCase):
+    """Test cases for logout token revocation"""
+
+    def setUp(self):
+        """Create a user and a token pair"""
+        self.app = app.test_client()
+        self.user = User(name='Revoked Farmer', email='revoked-farmer@example.com').save()
+        with app.app_context():
+            self.access_token = create_access_token(identity=self.user.id)
+            self.refresh_token = create_refresh_token(identity=self.user.id)
+        self.headers = {'Authorization': f'Bearer {self.access_token}'}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        revoked_tokens_collection.delete_many({'user_id': self.user.id})
+        self.user.delete()
+
+    def test_logout_revokes_tokens(self):
+        """Test access and refresh tokens stop working after logout"""
+        self.assertEqual(self.app.get('/api/auth/me', headers=self.headers).status_code, 200)
+        response = self.app.post('/api/auth/logout', headers=self.headers, json={'refresh_token': self.refresh_token})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.app.get('/api/auth/me', headers=self.headers).status_code, 401)
+        response = self.app.post('/api/auth/refresh', headers={'Authorization': f'Bearer {self.refresh_token}'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(revoked_tokens_collection.count_documents({'user_id': self.user.id}), 2)
+
+    def test_other_workers_sync_revocations(self):
+        """Test a worker picks up revocations written by another worker"""
+        other_worker = TokenDenylist(sync_seconds=0)
+        other_worker.sync(force=True)
+        with app.app_context():
+            jti = decode_token(self.access_token)['jti']
+        self.assertFalse(other_worker.is_revoked(jti))
+
+        token_denylist.revoke(jti, self.user.id)
+        other_worker.sync(force=True)
+        self.assertTrue(other_worker.is_revoked(jti))
+
+    def test_revocations_stay_visible_during_rebuild(self):
+        """Test a rebuild does not report revoked tokens as valid while it reloads"""
+        worker = TokenDenylist(sync_seconds=0, rebuild_seconds=0)
+        with app.app_context():
+            jti = decode_token(self.access_token)['jti']
+        token_denylist.revoke(jti, self.user.id)
+        worker.sync(force=True)
+
+        seen_during_rebuild = []
+        find = revoked_tokens_collection.find
+
+        def find_and_check(*args, **kwargs):
+            seen_during_rebuild.append(worker.is_revoked(jti))
+            return find(*args, **kwargs)
+
+        with patch.object(type(worker), 'collection', new_callable=PropertyMock) as collection:
+            collection.return_value.find.side_effect = find_and_check
+            worker.sync(force=True)
+
+        self.assertEqual(seen_during_rebuild, [True])
+        self.assertTrue(worker.is_revoked(jti))
+
+    def test_bloom_filter(self):
+        """Test the filter has no false negatives and few false positives"""
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'member-{i}')
+        self.assertTrue(all(f'member-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
 if __name__ == '__main__':
     unittest.main()
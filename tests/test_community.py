@@ -7,9 +7,18 @@ from datetime import datetime
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from flask_jwt_extended import create_access_token
+from services.profiles import ProfilePropagator, profile_propagator
 from app import app
 from models.user import User
-from models.community import Discussion
+from datetime import timedelta
+from models.community import (
+    Discussion, DiscussionReply, CommunityStats, Leaderboard, leaderboard_collection, location_partitions,
+    leaderboard_daily_collection, leaderboard_windows_collection, discussions_collection, replies_collection,
+    community_stats_collection, user_activity_collection
+)
+from models.learning_event import LearningEvent, learning_events_collection
+from models.progress import user_progress_collection
 
 class TestCommunityAPI(unittest.TestCase):
     """Test cases for community API endpoints"""
@@ -300,5 +309,308 @@ class TestCommunityAPI(unittest.TestCase):
         self.assertIn('total_replies', data['data']['stats'])
         self.assertIn('active_users', data['data']['stats'])
 
+class TestCommunityStats(unittest.TestCase):
+    """Test cases for incrementally maintained community statistics"""
+
+    def setUp(self):
+        """Start from reconciled counters"""
+        self.app = app.test_client()
+        self.user = User(name='Stats Farmer', email='stats-farmer@example.com').save()
+        self.baseline = CommunityStats.reconcile()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        discussions_collection.delete_many({'category': 'stats-test'})
+        replies_collection.delete_many({'author_id': self.user.id})
+        for collection in (learning_events_collection, user_progress_collection):
+            collection.delete_many({'user_id': self.user.id})
+        user_activity_collection.delete_many({'_id': {'$in': [self.user.id, 'stats-author']}})
+        self.user.delete()
+        community_stats_collection.delete_many({})
+
+    def test_writes_update_counters(self):
+        """Test discussions, replies and progress update the counters without aggregation"""
+        discussion = Discussion(title='Stats', category='stats-test', author_id='stats-author').save()
+        DiscussionReply(discussion_id=discussion.id, author_id=self.user.id, content='Reply').save()
+        LearningEvent.record(self.user.id, 'lesson_completed', course_id='c1', lesson_id='l1', points=10)
+
+        stats = CommunityStats.get()
+        self.assertEqual(stats['total_discussions'], self.baseline['total_discussions'] + 1)
+        self.assertEqual(stats['total_replies'], self.baseline['total_replies'] + 1)
+        self.assertEqual(stats['total_knowledge_points'], self.baseline['total_knowledge_points'] + 10)
+        self.assertEqual(stats['active_users'], self.baseline['active_users'] + 2)
+        self.assertIn({'name': 'stats-test', 'count': 1}, stats['top_categories'])
+
+    def test_active_users_counted_once_per_window(self):
+        """Test repeat activity does not recount a user, but returning after the window does"""
+        old = datetime.utcnow() - timedelta(days=60)
+        CommunityStats.record_activity(self.user.id, old)
+        self.assertEqual(CommunityStats.get()['active_users'], self.baseline['active_users'])
+
+        CommunityStats.record_activity(self.user.id)
+        CommunityStats.record_activity(self.user.id)
+        self.assertEqual(CommunityStats.get()['active_users'], self.baseline['active_users'] + 1)
+
+    def test_reconcile_corrects_drift(self):
+        """Test reconciliation recomputes the counters from the source collections"""
+        Discussion(title='Stats', category='stats-test', author_id='stats-author').save()
+        community_stats_collection.update_one({'_id': 'global'}, {'$inc': {'total_discussions': 100}})
+        stats = CommunityStats.reconcile()
+        self.assertEqual(stats['total_discussions'], self.baseline['total_discussions'] + 1)
+
+    def test_stats_endpoint(self):
+        """Test the endpoint serves the stats document"""
+        response = self.app.get('/api/community/stats')
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.data)['data']['stats']
+        self.assertEqual(stats['total_discussions'], self.baseline['total_discussions'])
+        self.assertIn('top_categories', stats)
+
+class TestPartitionedLeaderboard(unittest.TestCase):
+    """Test cases for location-partitioned leaderboards"""
+
+    def setUp(self):
+        """Create users in two villages of one district"""
+        self.app = app.test_client()
+        self.users = [
+            User(name='North One', email='north-1@example.com', location='North Village, Board District').save(),
+            User(name='North Two', email='north-2@example.com', location='North Village, Board District').save(),
+            User(name='South One', email='south-1@example.com', location='South Village, Board District').save()
+        ]
+        self.user_ids = [user.id for user in self.users]
+        for user_id, points in zip(self.user_ids, [100, 300, 200]):
+            Leaderboard.update_user_rank(user_id, points)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for user in self.users:
+            user.delete()
+        leaderboard_collection.delete_many({'user_id': {'$in': self.user_ids}})
+
+    def test_location_partitions(self):
+        """Test village and district are derived from the location string"""
+        self.assertEqual(location_partitions('Green Valley Village, Nashik, Maharashtra'), {
+            'global': ('all', ''),
+            'village': ('nashik/green-valley-village', 'Green Valley Village'),
+            'district': ('nashik', 'Nashik')
+        })
+        self.assertNotEqual(location_partitions('Green Valley Village, Pune')['village'],
+                            location_partitions('Green Valley Village, Nashik')['village'])
+        self.assertEqual(location_partitions('Green Valley Village')['village'][0], 'green-valley-village')
+        self.assertEqual(location_partitions(''), {'global': ('all', '')})
+
+    def test_partition_ranks(self):
+        """Test a score update places the user on every board with its own ranking"""
+        ranks = Leaderboard.update_user_rank(self.user_ids[0], 250)
+        self.assertEqual(ranks['village'], 2)
+        self.assertEqual(ranks['district'], 2)
+        self.assertEqual(Leaderboard.find_rank(self.user_ids[2], 'village').rank, 1)
+
+        district = Leaderboard.find_by_category('district', partition='board-district')
+        self.assertEqual([entry.user_id for entry in district], [self.user_ids[1], self.user_ids[0], self.user_ids[2]])
+        self.assertEqual([entry.rank for entry in district], [1, 2, 3])
+        village = Leaderboard.find_by_category('village', partition='board-district/north-village')
+        self.assertEqual([entry.user_id for entry in village], [self.user_ids[1], self.user_ids[0]])
+
+    def test_moving_village_changes_partition(self):
+        """Test a user who moves is placed on the new village board only"""
+        self.users[0].update_profile({'location': 'South Village, Board District'})
+        Leaderboard.update_user_rank(self.user_ids[0], 100)
+        north = Leaderboard.find_by_category('village', partition='board-district/north-village')
+        self.assertEqual([entry.user_id for entry in north], [self.user_ids[1]])
+        self.assertEqual(Leaderboard.find_rank(self.user_ids[0], 'village').partition, 'board-district/south-village')
+
+    def test_moving_removes_rows_on_old_partitions(self):
+        """Test a move drops the user's rows left on old partitions and boards they no longer have"""
+        leaderboard_collection.drop_index('user_id_1_category_1')
+        self.addCleanup(Leaderboard.ensure_indexes)
+        leaderboard_collection.insert_one({'user_id': self.user_ids[0], 'category': 'village',
+                                           'partition': 'north-village', 'points': 100})
+        self.users[0].update_profile({'location': 'South Village'})
+        Leaderboard.update_user_rank(self.user_ids[0], 100)
+
+        rows = leaderboard_collection.find({'user_id': self.user_ids[0]})
+        self.assertEqual(sorted((row['category'], row['partition']) for row in rows),
+                         [('global', 'all'), ('village', 'south-village')])
+
+    def test_ensure_indexes_removes_duplicate_rows(self):
+        """Test legacy duplicate rows are removed so the unique board index can be created"""
+        leaderboard_collection.drop_index('user_id_1_category_1')
+        leaderboard_collection.insert_one({'user_id': self.user_ids[0], 'category': 'global', 'partition': 'all',
+                                           'points': 5, 'updated_at': datetime.utcnow() - timedelta(days=1)})
+        Leaderboard.ensure_indexes()
+        rows = list(leaderboard_collection.find({'user_id': self.user_ids[0], 'category': 'global'}))
+        self.assertEqual([row['points'] for row in rows], [100])
+        self.assertTrue(leaderboard_collection.index_information()['user_id_1_category_1'].get('unique'))
+
+    def test_village_endpoint_defaults_to_own_board(self):
+        """Test the village board is chosen from the caller's location"""
+        response = self.app.get('/api/community/leaderboard?category=village')
+        self.assertEqual(response.status_code, 400)
+
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_ids[2])}'}
+        data = json.loads(self.app.get('/api/community/leaderboard?category=village', headers=headers).data)['data']
+        self.assertEqual(data['partition'], 'board-district/south-village')
+        self.assertEqual(data['my_rank']['rank'], 1)
+
+class TestWindowedLeaderboard(unittest.TestCase):
+    """Test cases for rolling weekly and monthly leaderboards"""
+
+    def setUp(self):
+        """Create two users with points spread over the last two weeks"""
+        self.users = [User(name=f'Window Farmer {i}', email=f'window-{i}@example.com').save() for i in range(2)]
+        self.user_ids = [user.id for user in self.users]
+        self.now = datetime.utcnow()
+        day = lambda days_ago: (self.now - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+        Leaderboard.add_daily_points(self.user_ids[0], {day(0): 10, day(3): 20, day(10): 40})
+        Leaderboard.add_daily_points(self.user_ids[1], {day(1): 50})
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for user in self.users:
+            user.delete()
+        for collection in (leaderboard_collection, leaderboard_daily_collection):
+            collection.delete_many({'user_id': {'$in': self.user_ids}})
+        leaderboard_windows_collection.delete_many({})
+        Leaderboard.roll_windows(today=self.now)
+
+    def points(self, user_id, window):
+        entry = Leaderboard.find_rank(user_id, window)
+        return entry.points if entry else None
+
+    def test_window_totals(self):
+        """Test each window only counts the days it covers"""
+        self.assertEqual(self.points(self.user_ids[0], 'weekly'), 30)
+        self.assertEqual(self.points(self.user_ids[0], 'monthly'), 70)
+        weekly = [entry.user_id for entry in Leaderboard.find_by_category('weekly') if entry.user_id in self.user_ids]
+        self.assertEqual(weekly, [self.user_ids[1], self.user_ids[0]])
+
+    def test_rollover_expires_oldest_days(self):
+        """Test moving the window forward subtracts only the days that fell out"""
+        Leaderboard.roll_windows(today=self.now + timedelta(days=5))
+        self.assertEqual(leaderboard_windows_collection.find_one({'_id': 'weekly'})['start_day'],
+                         (self.now - timedelta(days=1)).strftime('%Y-%m-%d'))
+        self.assertEqual(self.points(self.user_ids[0], 'weekly'), 10)
+        self.assertEqual(self.points(self.user_ids[1], 'weekly'), 50)
+
+        Leaderboard.roll_windows(today=self.now + timedelta(days=7))
+        self.assertIsNone(self.points(self.user_ids[0], 'weekly'))
+        self.assertIsNone(self.points(self.user_ids[1], 'weekly'))
+        self.assertEqual(self.points(self.user_ids[0], 'monthly'), 70)
+
+    def test_buckets_outlive_the_window(self):
+        """Test daily buckets expire well after the monthly window has rolled past them"""
+        bucket = leaderboard_daily_collection.find_one({'user_id': self.user_ids[1]})
+        day = datetime.strptime(bucket['day'], '%Y-%m-%d')
+        self.assertGreaterEqual(bucket['expires_at'] - day, timedelta(days=37))
+
+    def test_learning_events_feed_windows(self):
+        """Test points from learning events reach the rolling boards"""
+        LearningEvent.record(self.user_ids[1], 'quiz_submitted', quiz_id='q1', points=5)
+        self.assertEqual(self.points(self.user_ids[1], 'weekly'), 55)
+        for collection in (learning_events_collection, user_progress_collection):
+            collection.delete_many({'user_id': self.user_ids[1]})
+
+class TestReplyPagination(unittest.TestCase):
+    """Test cases for cursor-paginated reply threads"""
+
+    def setUp(self):
+        """Create a thread with five replies from one author"""
+        self.app = app.test_client()
+        self.author = User(name='Thread Farmer', email='thread-farmer@example.com',
+                           avatar={'emoji': '🐄', 'name': 'Gaay', 'type': 'Dairy Expert'}).save()
+        self.discussion = Discussion(title='Thread', category='pagination-test', author_id=self.author.id).save()
+        created_at = datetime.utcnow()
+        replies_collection.insert_many([{
+            'discussion_id': self.discussion.id,
+            'author_id': self.author.id,
+            'author_name': 'Old Name',
+            'content': f'Reply {i}',
+            # Two replies share a timestamp so the _id tie-breaker is exercised
+            'created_at': created_at + timedelta(seconds=i // 2)
+        } for i in range(5)])
+
+    def tearDown(self):
+        """Clean up after tests"""
+        replies_collection.delete_many({'discussion_id': self.discussion.id})
+        discussions_collection.delete_many({'category': 'pagination-test'})
+        user_activity_collection.delete_many({'_id': self.author.id})
+        self.author.delete()
+
+    def test_cursor_pages_cover_thread(self):
+        """Test walking the cursor returns every reply once, in order"""
+        contents, cursor = [], None
+        while True:
+            replies, cursor = DiscussionReply.find_page(self.discussion.id, cursor=cursor, limit=2)
+            contents.extend(reply.content for reply in replies)
+            if not cursor:
+                break
+        self.assertEqual(contents, [f'Reply {i}' for i in range(5)])
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.app.get(f'/api/community/discussions/{self.discussion.id}/replies?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_zero_limit_still_pages(self):
+        """Test a limit below one is raised to one so no reply is skipped"""
+        response = self.app.get(f'/api/community/discussions/{self.discussion.id}/replies?limit=0')
+        data = json.loads(response.data)['data']
+        self.assertEqual([reply['content'] for reply in data['replies']], ['Reply 0'])
+
+        response = self.app.get(f"/api/community/discussions/{self.discussion.id}/replies?limit=-5&cursor={data['next_cursor']}")
+        data = json.loads(response.data)['data']
+        self.assertEqual([reply['content'] for reply in data['replies']], ['Reply 1'])
+
+    def test_replies_hydrated_with_current_profile(self):
+        """Test replies show the author's current name rather than the stored copy"""
+        self.author.update_profile({'name': 'New Name'})
+        response = self.app.get(f'/api/community/discussions/{self.discussion.id}?limit=3')
+        discussion = json.loads(response.data)['data']['discussion']
+        self.assertEqual([reply['author_name'] for reply in discussion['replies']], ['New Name'] * 3)
+        self.assertEqual([reply['author_avatar'] for reply in discussion['replies']], ['🐄'] * 3)
+        self.assertEqual(discussion['author_name'], 'New Name')
+
+        response = self.app.get(f"/api/community/discussions/{self.discussion.id}/replies?cursor={discussion['next_cursor']}")
+        data = json.loads(response.data)['data']
+        self.assertEqual([reply['content'] for reply in data['replies']], ['Reply 3', 'Reply 4'])
+        self.assertIsNone(data['next_cursor'])
+
+class TestProfilePropagation(unittest.TestCase):
+    """Test cases for propagating name/avatar changes to denormalized copies"""
+
+    def setUp(self):
+        """Create a user with a discussion and a few replies carrying their old name"""
+        self.user = User(name='Before Name', email='propagate@example.com',
+                         avatar={'emoji': '🐔', 'name': 'Murgi', 'type': 'Poultry Expert'}).save()
+        self.discussion = Discussion(title='Propagate', category='propagation-test', author_id=self.user.id,
+                                     author_name='Before Name', author_avatar='🐔').save()
+        for i in range(5):
+            DiscussionReply(discussion_id=self.discussion.id, author_id=self.user.id,
+                            author_name='Before Name', content=f'Reply {i}').save()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        replies_collection.delete_many({'discussion_id': self.discussion.id})
+        discussions_collection.delete_many({'category': 'propagation-test'})
+        user_activity_collection.delete_many({'_id': self.user.id})
+        self.user.delete()
+
+    def test_update_profile_propagates_in_background(self):
+        """Test a name and avatar change reaches discussions and replies"""
+        self.user.update_profile({'name': 'After Name', 'avatar': {'emoji': '🐐', 'name': 'Bakri', 'type': 'Goat Expert'}})
+        profile_propagator.wait()
+        self.assertEqual(Discussion.find_by_id(self.discussion.id).author_avatar, '🐐')
+        self.assertEqual(replies_collection.count_documents(
+            {'discussion_id': self.discussion.id, 'author_name': 'After Name'}), 5)
+
+    def test_propagation_is_chunked(self):
+        """Test stale copies are rewritten in chunks and already-current copies are skipped"""
+        propagator = ProfilePropagator(chunk_size=2, throttle_seconds=0)
+        replies_collection.update_one({'discussion_id': self.discussion.id}, {'$set': {'author_name': 'After Name'}})
+        self.assertEqual(propagator.propagate(self.user.id, {'name': 'After Name'}), 5)
+        self.assertEqual(propagator.propagate(self.user.id, {'name': 'After Name'}), 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,13 +3,24 @@ import json
 import os
 import sys
 from datetime import datetime
+from unittest.mock import patch
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
 from models.user import User
-from models.course import Course
+from models.course import Course, Quiz
+from services.grading import CompiledQuiz, GradingError, quiz_grader
+from services.identity import identity_map
+from services.query_counter import query_counter, QueryBudgetExceeded
+from flask_jwt_extended import create_access_token
+from models.course import Lesson, lessons_collection, courses_collection
+from models.progress import (
+    CourseProgress, LessonProgress, UserProgress, course_progress_collection, lesson_progress_collection,
+    user_progress_collection
+)
+from models.learning_event import learning_events_collection
 
 class TestCoursesAPI(unittest.TestCase):
     """Test cases for courses API endpoints"""
@@ -252,5 +263,193 @@ class TestCoursesAPI(unittest.TestCase):
         self.assertEqual(data['status'], 'error')
         self.assertIn('required', data['message'])
 
+class TestQuizGrading(unittest.TestCase):
+    """Test cases for the compiled quiz grading engine"""
+
+    def setUp(self):
+        """Create a quiz with mixed question types and weights"""
+        self.quiz = Quiz(
+            course_id='grading-course',
+            lesson_id='grading-lesson',
+            passing_score=70,
+            questions=[
+                {'question_type': 'multiple_choice', 'correct_answer': 2, 'points': 1},
+                {'question_type': 'true_false', 'correct_answer': True, 'points': 2},
+                {'question_type': 'text', 'correct_answer': ['Drip Irrigation', 'drip'], 'points': 3}
+            ]
+        )
+        self.quiz.save()
+
+    def tearDown(self):
+        """Clean up the quiz"""
+        quiz_grader.invalidate(self.quiz.id)
+
+    def test_grade_uses_point_weights(self):
+        """Test that scores are weighted by question points"""
+        result = CompiledQuiz(self.quiz).grade([2, 'false', '  drip irrigation! '])
+        self.assertEqual(result['correct_answers'], 2)
+        self.assertEqual(result['earned_points'], 4)
+        self.assertEqual(result['total_points'], 6)
+        self.assertFalse(result['passed'])
+
+    def test_grade_batch(self):
+        """Test grading several submissions in one pass"""
+        results = CompiledQuiz(self.quiz).grade_batch([
+            ['2', 'yes', 'Drip'],
+            [0],
+            []
+        ])
+        self.assertEqual([r['earned_points'] for r in results], [6, 0, 0])
+        self.assertTrue(results[0]['passed'])
+
+    def test_only_integral_choices_match(self):
+        """Test that fractional or boolean choices count as wrong rather than being truncated"""
+        results = CompiledQuiz(self.quiz).grade_batch([[2.0], [2.7], [True], [' 2 '], [{'choice': 2}]])
+        self.assertEqual([r['correct_answers'] for r in results], [1, 0, 0, 1, 0])
+
+    def test_malformed_answers_rejected(self):
+        """Test that a non-list answers payload is a 400, not a server error"""
+        with self.assertRaises(GradingError):
+            CompiledQuiz(self.quiz).grade({'0': 2})
+        with app.app_context():
+            token = create_access_token(identity='grading-user')
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+        for body in ({'answers': {'0': 2}}, {'answers': 2}, ['answers']):
+            response = client.post(f'/api/courses/grading-course/quiz/{self.quiz.id}/submit',
+                                   headers=headers, json=body)
+            self.assertEqual(response.status_code, 400)
+
+    def test_cache_invalidated_on_save(self):
+        """Test that saving a quiz recompiles its answer key"""
+        self.assertEqual(quiz_grader.get(self.quiz.id).total_points, 6)
+        self.quiz.questions[0]['points'] = 4
+        self.quiz.save()
+        self.assertEqual(quiz_grader.get(self.quiz.id).total_points, 9)
+
+    def test_unknown_quiz(self):
+        """Test that unknown or malformed quiz ids return None"""
+        self.assertIsNone(quiz_grader.get('test-quiz-id'))
+
+class TestIdentityMap(unittest.TestCase):
+    """Test cases for the request-scoped identity map"""
+
+    def setUp(self):
+        """Enroll a user in a two-lesson course"""
+        self.app = app.test_client()
+        self.user_id = 'identity-map-user'
+        self.course = Course(title='Identity Map Course').save()
+        self.lessons = [Lesson(course_id=self.course.id, title=f'Lesson {i}', order=i).save() for i in range(2)]
+        CourseProgress(user_id=self.user_id, course_id=self.course.id).save()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        courses_collection.delete_many({'title': 'Identity Map Course'})
+        lessons_collection.delete_many({'course_id': self.course.id})
+        for collection in (course_progress_collection, lesson_progress_collection,
+                           user_progress_collection, learning_events_collection):
+            collection.delete_many({'user_id': self.user_id})
+
+    def stored_progress(self):
+        return course_progress_collection.find_one({'user_id': self.user_id, 'course_id': self.course.id})
+
+    def test_repeated_loads_share_instance(self):
+        """Test loads by natural key return one instance per request"""
+        with app.test_request_context():
+            first = CourseProgress.find_by_user_and_course(self.user_id, self.course.id)
+            self.assertIs(CourseProgress.find_by_user_and_course(self.user_id, self.course.id), first)
+            self.assertIs(CourseProgress.find_by_user_id(self.user_id)[0], first)
+        self.assertIsNot(CourseProgress.find_by_user_and_course(self.user_id, self.course.id),
+                         CourseProgress.find_by_user_and_course(self.user_id, self.course.id))
+
+    def test_saves_coalesce_until_flush(self):
+        """Test saves of a loaded instance are written once, when the map is flushed"""
+        with app.test_request_context():
+            progress = CourseProgress.find_by_user_and_course(self.user_id, self.course.id)
+            progress.complete_lesson(self.lessons[0].id)
+            progress.calculate_progress(2)
+            self.assertEqual(self.stored_progress()['completed_lessons'], [])
+            self.assertEqual(identity_map.flush(), 1)
+        self.assertEqual(self.stored_progress()['completed_lessons'], [self.lessons[0].id])
+        self.assertEqual(self.stored_progress()['progress_percentage'], 50)
+
+    def test_request_flushes_before_response(self):
+        """Test a route's deferred saves are persisted before its response is returned"""
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_id)}'}
+        for lesson in self.lessons:
+            response = self.app.post(f'/api/courses/{self.course.id}/lessons/{lesson.id}/complete',
+                                     headers=headers, json={'time_spent': 5})
+            self.assertEqual(response.status_code, 200)
+        stored = self.stored_progress()
+        self.assertTrue(stored['is_completed'])
+        self.assertEqual(len(stored['completed_lessons']), 2)
+        self.assertTrue(LessonProgress.find_by_user_and_lesson(self.user_id, self.lessons[1].id).is_completed)
+
+    def test_failed_flush_returns_500(self):
+        """Test a deferred save that cannot be written fails the request instead of being dropped"""
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_id)}'}
+        with patch.object(CourseProgress, '_write', side_effect=IOError('write failed')):
+            response = self.app.post(f'/api/courses/{self.course.id}/lessons/{self.lessons[0].id}/complete',
+                                     headers=headers, json={'time_spent': 5})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json()['status'], 'error')
+        # The flush runs before metrics record the request, so the 500 is what gets counted
+        metrics_body = self.app.get('/api/metrics').data.decode('utf-8')
+        self.assertIn('http_requests_total{blueprint="courses",endpoint="courses.complete_lesson",'
+                      'method="POST",status="500"}', metrics_body)
+
+    def test_flush_writes_only_changed_fields(self):
+        """Test a flush does not overwrite fields incremented elsewhere during the request"""
+        UserProgress(user_id=self.user_id).save()
+        with app.test_request_context():
+            progress = UserProgress.find_by_user_id(self.user_id)
+            progress.certificates += 1
+            progress.save()
+            user_progress_collection.update_one({'user_id': self.user_id}, {'$inc': {'knowledge_points': 25}})
+            self.assertEqual(identity_map.flush(), 1)
+        stored = user_progress_collection.find_one({'user_id': self.user_id})
+        self.assertEqual(stored['certificates'], 1)
+        self.assertEqual(stored['knowledge_points'], 25)
+
+class TestQueryBudget(unittest.TestCase):
+    """Test cases for N+1 detection and per-endpoint query budgets"""
+
+    def setUp(self):
+        """Enroll a user in several courses"""
+        self.app = app.test_client()
+        query_counter.install_mongomock()
+        self.user_id = 'query-budget-user'
+        self.courses = [Course(title='Query Budget Course').save() for _ in range(8)]
+        for course in self.courses:
+            CourseProgress(user_id=self.user_id, course_id=course.id).save()
+        with app.app_context():
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_id)}'}
+
+    def tearDown(self):
+        """Clean up after tests"""
+        courses_collection.delete_many({'title': 'Query Budget Course'})
+        course_progress_collection.delete_many({'user_id': self.user_id})
+
+    def test_my_courses_within_budget(self):
+        """Test enrolled courses are loaded in one batch, whatever the number of courses"""
+        with query_counter.assert_max_queries(4) as scope:
+            response = self.app.get('/api/courses/my-courses', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['data']['courses']), 8)
+        self.assertEqual(scope.commands[('courses', 'find', '{"_id": {"$in": ["?"]}}')], 1)
+
+    def test_repeated_shape_detected(self):
+        """Test a query issued once per item in a loop is reported as N+1"""
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_counter.assert_max_queries(repeat_threshold=5, label='loop'):
+                for course in self.courses:
+                    Course.find_by_id(course.id)
+        self.assertIn('find on courses with filter {"_id": "?"} repeated 8 times', str(raised.exception))
+
+        with query_counter.assert_max_queries(max_queries=1):
+            Course.find_by_ids([course.id for course in self.courses])
+
 if __name__ == '__main__':
     unittest.main()
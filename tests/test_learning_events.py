@@ -0,0 +1,113 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import learning_event
+from models.learning_event import LearningEvent, learning_events_collection
+from models.progress import (
+    UserProgress, CourseProgress, LessonProgress, user_progress_collection, course_progress_collection,
+    lesson_progress_collection
+)
+from models.user import User
+
+class TestLearningEventLog(unittest.TestCase):
+    """Test cases for the bucketed learning event log and its projections"""
+
+    def setUp(self):
+        """Create a user to project learning stats onto"""
+        self.user = User(name='Log Farmer', email='log-farmer@example.com').save()
+        self.user_id = self.user.id
+        self.start = datetime.utcnow() - timedelta(days=3)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.user.delete()
+        for collection in (learning_events_collection, user_progress_collection, course_progress_collection,
+                           lesson_progress_collection):
+            collection.delete_many({'user_id': self.user_id})
+
+    def record_history(self):
+        LearningEvent.record(self.user_id, 'course_enrolled', course_id='c1', occurred_at=self.start)
+        LearningEvent.record_many(self.user_id, [
+            LearningEvent(type='lesson_completed', course_id='c1', lesson_id='l1', points=10,
+                          occurred_at=self.start + timedelta(days=1)),
+            LearningEvent(type='course_completed', course_id='c1', points=50,
+                          occurred_at=self.start + timedelta(days=1, minutes=1)),
+            LearningEvent(type='quiz_submitted', course_id='c1', quiz_id='q1', score=100, points=10,
+                          occurred_at=self.start + timedelta(days=2))
+        ])
+
+    def test_events_are_bucketed_per_user_per_day(self):
+        """Test that events land in one document per day"""
+        self.record_history()
+        buckets = list(learning_events_collection.find({'user_id': self.user_id}))
+        self.assertEqual(len(buckets), 3)
+        self.assertEqual(sum(bucket['count'] for bucket in buckets), 4)
+        self.assertEqual(len(list(LearningEvent.find_by_user_id(self.user_id))), 4)
+
+    def test_full_bucket_rolls_over(self):
+        """Test that a full bucket starts a new document for the same day"""
+        original_size = learning_event.LEARNING_EVENTS_BUCKET_SIZE
+        learning_event.LEARNING_EVENTS_BUCKET_SIZE = 2
+        try:
+            for _ in range(3):
+                LearningEvent.record(self.user_id, 'quiz_submitted', points=1, occurred_at=self.start)
+        finally:
+            learning_event.LEARNING_EVENTS_BUCKET_SIZE = original_size
+        counts = sorted(b['count'] for b in learning_events_collection.find({'user_id': self.user_id}))
+        self.assertEqual(counts, [1, 2])
+
+    def test_projections_are_updated_incrementally(self):
+        """Test that UserProgress and User.learning_stats follow the log"""
+        self.record_history()
+        progress = UserProgress.find_by_user_id(self.user_id)
+        self.assertEqual(progress.total_courses, 1)
+        self.assertEqual(progress.completed_lessons, 1)
+        self.assertEqual(progress.completed_courses, 1)
+        self.assertEqual(progress.knowledge_points, 70)
+        # Enrolling is not learning activity, so the streak starts at the first lesson
+        self.assertEqual(progress.learning_streak, 2)
+        stats = User.find_by_id(self.user_id).learning_stats
+        self.assertEqual(stats['knowledge_points'], 70)
+        self.assertEqual(stats['certificates'], 1)
+
+    def test_rebuild_matches_incremental_projection(self):
+        """Test that projections can be rebuilt from the log alone"""
+        self.record_history()
+        CourseProgress(user_id=self.user_id, course_id='c1').save()
+        user_progress_collection.update_one({'user_id': self.user_id}, {'$set': {'knowledge_points': 0}})
+
+        stats = LearningEvent.rebuild_projections(self.user_id)
+
+        self.assertEqual(stats['knowledge_points'], 70)
+        self.assertEqual(UserProgress.find_by_user_id(self.user_id).knowledge_points, 70)
+        course_progress = CourseProgress.find_by_user_and_course(self.user_id, 'c1')
+        self.assertEqual(course_progress.completed_lessons, ['l1'])
+        self.assertTrue(course_progress.is_completed)
+
+    def test_rebuild_keeps_progress_from_before_the_log(self):
+        """Test that a rebuild seeds the log from legacy progress instead of resetting it"""
+        UserProgress(user_id=self.user_id, total_courses=1, completed_lessons=1, knowledge_points=120).save()
+        CourseProgress(user_id=self.user_id, course_id='c0', completed_lessons=['l0']).save()
+        LessonProgress(user_id=self.user_id, course_id='c0', lesson_id='l0', is_completed=True,
+                       completed_at=self.start).save()
+        LearningEvent.record(self.user_id, 'quiz_submitted', quiz_id='q1', points=10,
+                             occurred_at=self.start + timedelta(days=1))
+
+        stats = LearningEvent.rebuild_projections(self.user_id)
+
+        self.assertEqual(stats['knowledge_points'], 130)
+        self.assertEqual(stats['total_courses'], 1)
+        self.assertEqual(stats['completed_lessons'], 1)
+        self.assertEqual(stats['learning_streak'], 2)
+        self.assertEqual(CourseProgress.find_by_user_and_course(self.user_id, 'c0').completed_lessons, ['l0'])
+        # Seeding happens once; a second rebuild gives the same totals
+        self.assertEqual(LearningEvent.seed_from_progress(self.user_id), 0)
+        self.assertEqual(LearningEvent.rebuild_projections(self.user_id)['knowledge_points'], 130)
+
+if __name__ == '__main__':
+    unittest.main()
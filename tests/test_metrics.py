@@ -0,0 +1,153 @@
+import unittest
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from flask_jwt_extended import create_access_token
+from models.user import User
+from routes.admin import ADMIN_EMAILS
+from services.metrics import MongoCommandMetrics, MetricsRegistry, command_collection, mongodb_commands_total
+from services.slow_queries import SlowQueryLog, slow_query_log, filter_shape
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test cases for the Prometheus metrics endpoint"""
+
+    def setUp(self):
+        """Set up test client"""
+        self.app = app.test_client()
+
+    def test_request_metrics_exposed(self):
+        """Test route latency, status counts and in-flight gauges are exposed"""
+        self.app.get('/api/community/stats')
+        response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        body = response.data.decode('utf-8')
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{blueprint="community",endpoint="community.get_community_stats",'
+                      'method="GET",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{blueprint="community",'
+                      'endpoint="community.get_community_stats",method="GET",le="+Inf"}', body)
+        # The scrape itself is the only request in flight
+        self.assertIn('http_requests_in_flight{blueprint="",endpoint="metrics"} 1', body)
+        self.assertIn('http_requests_in_flight{blueprint="community",endpoint="community.get_community_stats"} 0', body)
+
+    def test_histogram_format(self):
+        """Test histogram buckets are cumulative with sum and count"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, route='a"b')
+        lines = registry.expose().splitlines()
+        self.assertIn('latency_seconds_bucket{route="a\\"b",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="a\\"b",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="a\\"b",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{route="a\\"b"} 3', lines)
+        self.assertIn('latency_seconds_sum{route="a\\"b"} 5.55', lines)
+
+    def test_mongo_command_listener(self):
+        """Test commands are counted per collection, including getMore"""
+        self.assertEqual(command_collection('find', {'find': 'users', 'filter': {}}), 'users')
+        self.assertEqual(command_collection('getMore', {'getMore': 12, 'collection': 'lessons'}), 'lessons')
+        self.assertEqual(command_collection('ping', {'ping': 1}), '')
+
+        listener = MongoCommandMetrics()
+        key = ('metrics_test', 'find', 'succeeded')
+        before = mongodb_commands_total.values.get(key, 0)
+        for request_id in (1, 2):
+            listener.started(SimpleNamespace(command_name='find', command={'find': 'metrics_test'},
+                                             request_id=request_id, connection_id=('localhost', 27017)))
+            listener.succeeded(SimpleNamespace(command_name='find', duration_micros=1500,
+                                               request_id=request_id, connection_id=('localhost', 27017)))
+        self.assertEqual(mongodb_commands_total.values[key], before + 2)
+        self.assertEqual(listener.pending, {})
+
+class TestSlowQueryLog(unittest.TestCase):
+    """Test cases for the slow-query log and its admin endpoint"""
+
+    def setUp(self):
+        """Create an admin user and a log writing to the shared collection"""
+        self.app = app.test_client()
+        self.admin = User(name='Query Admin', email='query-admin@example.com').save()
+        ADMIN_EMAILS.add('query-admin@example.com')
+        with app.app_context():
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=self.admin.id)}'}
+        self.log = SlowQueryLog(threshold_ms=50, explain_sample_rate=0)
+        self.log.set_database(slow_query_log.db)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        slow_query_log.collection.delete_many({'collection': 'slow_query_test'})
+        ADMIN_EMAILS.discard('query-admin@example.com')
+        self.admin.delete()
+
+    def _command(self, request_id, duration_ms, command):
+        self.log.started(SimpleNamespace(command_name='find', command=command, database_name='ecofarm-quest',
+                                         request_id=request_id, connection_id=('localhost', 27017)))
+        self.log.succeeded(SimpleNamespace(command_name='find', duration_micros=duration_ms * 1000,
+                                           request_id=request_id, connection_id=('localhost', 27017)))
+
+    def test_filter_shape_redacts_values(self):
+        """Test values are redacted while fields and operators are kept"""
+        shape = filter_shape('find', {'find': 'discussions', 'filter': {
+            '$or': [{'title': {'$regex': 'rice', '$options': 'i'}}, {'content': {'$regex': 'rice', '$options': 'i'}}]
+        }})
+        self.assertEqual(shape, '{"$or": [{"title": {"$options": "?", "$regex": "?"}}, '
+                                '{"content": {"$options": "?", "$regex": "?"}}]}')
+        self.assertEqual(filter_shape('find', {'find': 'users', 'filter': {'_id': {'$in': [1, 2, 3]}}}),
+                         '{"_id": {"$in": ["?"]}}')
+        self.assertEqual(filter_shape('update', {'update': 'users', 'updates': [{'q': {'email': 'a@b.c'}, 'u': {}}]}),
+                         '{"email": "?"}')
+
+    def test_slow_commands_logged_with_endpoint(self):
+        """Test only commands over the threshold are logged, attributed to the route"""
+        with app.test_request_context('/api/community/discussions?search=rice'):
+            self._command(1, 20, {'find': 'slow_query_test', 'filter': {'title': 'fast'}})
+            self._command(2, 120, {'find': 'slow_query_test', 'filter': {'title': 'rice'}})
+        self.log.wait()
+
+        response = self.app.get('/api/admin/slow-queries?collection=slow_query_test', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        entries = response.get_json()['data']['slow_queries']
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['endpoint'], 'community.get_discussions')
+        self.assertEqual(entries[0]['filter_shape'], '{"title": "?"}')
+        self.assertEqual(entries[0]['duration_ms'], 120)
+        self.assertNotIn('rice', str(entries[0]))
+        self.assertEqual(self.log.pending, {})
+
+    def test_tailable_getmore_not_logged(self):
+        """Test the stream transport's tailable-await getMores are not logged as slow queries"""
+        connection = ('localhost', 27017)
+        self.log.started(SimpleNamespace(command_name='find', database_name='ecofarm-quest', request_id=1,
+                                         connection_id=connection, command={
+                                             'find': 'slow_query_test', 'filter': {}, 'tailable': True, 'awaitData': True
+                                         }))
+        self.log.succeeded(SimpleNamespace(command_name='find', duration_micros=1000, request_id=1,
+                                           connection_id=connection, reply={'cursor': {'id': 42}}))
+        for request_id, cursor_id in ((2, 42), (3, 0)):
+            self.log.started(SimpleNamespace(command_name='getMore', database_name='ecofarm-quest',
+                                             request_id=request_id, connection_id=connection,
+                                             command={'getMore': 42, 'collection': 'slow_query_test'}))
+            self.log.succeeded(SimpleNamespace(command_name='getMore', duration_micros=1000 * 1000,
+                                               request_id=request_id, connection_id=connection,
+                                               reply={'cursor': {'id': cursor_id}}))
+        self.log.wait()
+
+        self.assertEqual(slow_query_log.collection.count_documents({'collection': 'slow_query_test'}), 0)
+        self.assertEqual(self.log.tailable_cursors, set())
+        self.assertEqual(self.log.pending, {})
+
+    def test_admin_required(self):
+        """Test non-admin users cannot read the log"""
+        ADMIN_EMAILS.discard('query-admin@example.com')
+        response = self.app.get('/api/admin/slow-queries', headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.app.get('/api/admin/slow-queries').status_code, 401)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.notification import (
+    Notification, notifications_collection, notifications_archive_collection
+)
+
+class TestNotificationRetention(unittest.TestCase):
+    """Test cases for notification retention and archival"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.user_id = 'retention-test-user'
+
+    def tearDown(self):
+        """Clean up after tests"""
+        notifications_collection.delete_many({'user_id': self.user_id})
+        notifications_archive_collection.delete_many({'user_id': self.user_id})
+
+    def test_save_keeps_dates_as_datetimes(self):
+        """Test that updates do not overwrite dates with ISO strings"""
+        notification = Notification.create_notification(self.user_id, 'Title', 'Message')
+        notification.is_read = True
+        notification.read_at = datetime.utcnow()
+        notification.save()
+
+        stored = notifications_collection.find_one({'user_id': self.user_id})
+        self.assertIsInstance(stored['created_at'], datetime)
+        self.assertIsInstance(stored['read_at'], datetime)
+
+    def test_legacy_string_dates_are_parsed(self):
+        """Test that notifications saved with ISO string dates still load"""
+        notification = Notification(created_at='2025-01-01T10:00:00', read_at='2025-01-02T10:00:00')
+        self.assertEqual(notification.created_at, datetime(2025, 1, 1, 10, 0))
+        self.assertEqual(notification.to_dict()['read_at'], '2025-01-02T10:00:00')
+
+    def test_ensure_indexes_creates_ttl_index(self):
+        """Test that read notifications are covered by a TTL index"""
+        Notification.ensure_indexes()
+        index = notifications_collection.index_information()['read_at_ttl']
+        self.assertIn('expireAfterSeconds', index)
+        self.assertEqual(index['partialFilterExpression'], {'is_read': True})
+
+    def test_delete_old_notifications(self):
+        """Test deleting old read notifications"""
+        notifications_collection.insert_one({
+            'user_id': self.user_id,
+            'is_read': True,
+            'created_at': datetime.utcnow() - timedelta(days=60)
+        })
+        self.assertEqual(Notification.delete_old_notifications(days=30), 1)
+
+    def test_archive_old_notifications_in_batches(self):
+        """Test that cold read notifications are moved to the archive"""
+        old_read_at = datetime.utcnow() - timedelta(days=10)
+        notifications_collection.insert_many([
+            {'user_id': self.user_id, 'is_read': True, 'read_at': old_read_at, 'created_at': old_read_at}
+            for _ in range(5)
+        ])
+        notifications_collection.insert_one({'user_id': self.user_id, 'is_read': False, 'created_at': old_read_at})
+        notifications_collection.insert_one({
+            'user_id': self.user_id, 'is_read': True, 'read_at': datetime.utcnow(), 'created_at': old_read_at
+        })
+
+        archived = Notification.archive_old_notifications(days=7, batch_size=2)
+
+        self.assertEqual(archived, 5)
+        self.assertEqual(notifications_collection.count_documents({'user_id': self.user_id}), 2)
+        self.assertEqual(notifications_archive_collection.count_documents({'user_id': self.user_id}), 5)
+        archived_doc = notifications_archive_collection.find_one({'user_id': self.user_id})
+        self.assertIn('archived_at', archived_doc)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import app
+from models.community import Discussion, DiscussionReply, discussions_collection, replies_collection
+from models.notification import Notification, notifications_collection
+from services.events import EventBroker, event_broker
+
+class TestEventBroker(unittest.TestCase):
+    """Test cases for the in-process event broker"""
+
+    def setUp(self):
+        """Set up a fresh broker"""
+        self.broker = EventBroker(history_size=10)
+
+    def test_publish_delivers_to_recipients_only(self):
+        """Test that events only reach subscribed recipients"""
+        alice = self.broker.subscribe('alice')
+        bob = self.broker.subscribe('bob')
+
+        self.broker.publish('notification', {'title': 'Hi'}, ['alice'])
+
+        self.assertEqual(alice.get(timeout=0.1).data, {'title': 'Hi'})
+        self.assertIsNone(bob.get(timeout=0.01))
+
+    def test_replay_after_last_event_id(self):
+        """Test replaying events missed since Last-Event-ID"""
+        first = self.broker.publish('notification', {'n': 1}, ['alice'])
+        self.broker.publish('notification', {'n': 2}, ['alice'])
+        self.broker.publish('notification', {'n': 3}, ['bob'])
+
+        missed = self.broker.replay('alice', first.id)
+
+        self.assertEqual([event.data for event in missed], [{'n': 2}])
+
+    def test_unsubscribe(self):
+        """Test that unsubscribed clients stop receiving events"""
+        subscription = self.broker.subscribe('alice')
+        self.broker.unsubscribe(subscription)
+        self.assertNotIn('alice', self.broker.subscribers)
+
+class TestStreamAPI(unittest.TestCase):
+    """Test cases for the Server-Sent Events endpoint"""
+
+    def setUp(self):
+        """Set up test client"""
+        self.app = app.test_client()
+        self.user_id = 'stream-test-user'
+        with app.app_context():
+            self.access_token = create_access_token(identity=self.user_id)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        notifications_collection.delete_many({'user_id': self.user_id})
+        discussions_collection.delete_many({'author_id': self.user_id})
+        replies_collection.delete_many({'author_id': 'stream-replier'})
+
+    def read_events(self, response, count):
+        """Read the first `count` chunks from a streaming response"""
+        chunks = []
+        for chunk in response.response:
+            chunks.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+            if len(chunks) >= count:
+                break
+        response.close()
+        return chunks
+
+    def test_stream_unauthorized(self):
+        """Test that the stream requires a JWT"""
+        response = self.app.get('/api/stream')
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_replays_missed_events(self):
+        """Test reconnecting with Last-Event-ID replays notifications and replies"""
+        first = Notification.create_notification(self.user_id, 'First', 'Message')
+        discussion = Discussion(title='Thread', author_id=self.user_id, participants=[self.user_id]).save()
+        Notification.create_notification(self.user_id, 'Second', 'Message')
+        DiscussionReply(discussion_id=discussion.id, author_id='stream-replier', content='Reply').save()
+
+        last_event_id = [e for e in event_broker.history if e.data.get('id') == first.id][0].id
+        response = self.app.get(
+            f'/api/stream?jwt={self.access_token}',
+            headers={'Last-Event-ID': last_event_id},
+            buffered=False
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/event-stream'))
+        chunks = self.read_events(response, 3)
+        self.assertTrue(chunks[0].startswith('retry:'))
+        self.assertIn('event: notification', chunks[1])
+        self.assertIn('Second', chunks[1])
+        self.assertIn('event: discussion_reply', chunks[2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import json
+import os
+import sys
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from app import app
+from services.progress_sync import parse_event
+from models.course import Course, Lesson, Quiz, lessons_collection, courses_collection, quizzes_collection
+from models.progress import (
+    CourseProgress, UserProgress, course_progress_collection, lesson_progress_collection,
+    user_progress_collection, sync_receipts_collection
+)
+
+class TestProgressSyncAPI(unittest.TestCase):
+    """Test cases for the bulk offline progress sync endpoint"""
+
+    def setUp(self):
+        """Set up an enrolled user with a two-lesson course and a quiz"""
+        self.app = app.test_client()
+        self.user_id = 'sync-test-user'
+        with app.app_context():
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=self.user_id)}'}
+
+        self.course = Course(title='Sync Course').save()
+        self.lessons = [Lesson(course_id=self.course.id, title=f'Lesson {i}', order=i).save() for i in range(2)]
+        self.quiz = Quiz(
+            course_id=self.course.id,
+            lesson_id=self.lessons[0].id,
+            questions=[{'question_type': 'multiple_choice', 'correct_answer': 1, 'points': 1}]
+        ).save()
+        CourseProgress(user_id=self.user_id, course_id=self.course.id).save()
+        UserProgress(user_id=self.user_id).save()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        courses_collection.delete_many({'title': 'Sync Course'})
+        lessons_collection.delete_many({'course_id': self.course.id})
+        quizzes_collection.delete_many({'course_id': self.course.id})
+        for collection in (course_progress_collection, lesson_progress_collection,
+                           user_progress_collection, sync_receipts_collection):
+            collection.delete_many({'user_id': self.user_id})
+
+    def sync(self, events):
+        response = self.app.post('/api/sync/progress',
+                                 data=json.dumps({'events': events}),
+                                 content_type='application/json',
+                                 headers=self.headers)
+        return response.status_code, json.loads(response.data)
+
+    def test_sync_applies_events_in_order_and_dedupes(self):
+        """Test that a batch is applied once and replays are ignored"""
+        events = [
+            {'idempotency_key': 'k3', 'type': 'lesson_completed', 'course_id': self.course.id,
+             'lesson_id': self.lessons[1].id, 'occurred_at': '2025-01-02T09:00:00Z'},
+            {'idempotency_key': 'k1', 'type': 'lesson_completed', 'course_id': self.course.id,
+             'lesson_id': self.lessons[0].id, 'occurred_at': '2025-01-01T09:00:00Z'},
+            {'idempotency_key': 'k2', 'type': 'quiz_submitted', 'course_id': self.course.id,
+             'quiz_id': self.quiz.id, 'answers': [1], 'occurred_at': '2025-01-01T10:00:00Z'},
+            {'idempotency_key': 'k1', 'type': 'lesson_completed', 'course_id': self.course.id,
+             'lesson_id': self.lessons[0].id, 'occurred_at': '2025-01-01T09:00:00Z'}
+        ]
+
+        status, data = self.sync(events)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['data']['applied'], ['k1', 'k2', 'k3'])
+        self.assertEqual(data['data']['duplicates'], ['k1'])
+        self.assertEqual(data['data']['quiz_results']['k2']['score'], 100)
+        progress = data['data']['user_progress']
+        self.assertEqual(progress['completed_lessons'], 2)
+        self.assertEqual(progress['completed_courses'], 1)
+        self.assertEqual(progress['knowledge_points'], 10 + 10 + 10 + 50)
+        self.assertTrue(data['data']['course_progress'][0]['is_completed'])
+
+        status, data = self.sync(events[:3])
+        self.assertEqual(data['data']['applied'], [])
+        self.assertEqual(sorted(data['data']['duplicates']), ['k1', 'k2', 'k3'])
+        self.assertEqual(data['data']['user_progress']['knowledge_points'], 80)
+
+    def test_sync_rejects_unenrolled_course(self):
+        """Test that events for courses the user is not enrolled in are rejected and retryable"""
+        events = [{'idempotency_key': 'other', 'type': 'lesson_completed',
+                   'course_id': 'not-enrolled', 'lesson_id': 'lesson'}]
+        status, data = self.sync(events)
+        self.assertEqual(status, 200)
+        self.assertEqual(data['data']['rejected'][0]['idempotency_key'], 'other')
+        self.assertEqual(sync_receipts_collection.count_documents({'user_id': self.user_id}), 0)
+
+    def test_sync_invalid_event(self):
+        """Test that malformed events reject the batch"""
+        status, data = self.sync([{'type': 'lesson_completed'}])
+        self.assertEqual(status, 400)
+        self.assertIn('idempotency_key', data['message'])
+
+    def test_sync_rejects_only_malformed_events(self):
+        """Test that bad answers or time_spent reject that event, not the whole batch"""
+        events = [
+            {'idempotency_key': 'bad-answers', 'type': 'quiz_submitted', 'course_id': self.course.id,
+             'quiz_id': self.quiz.id, 'answers': '1'},
+            {'idempotency_key': 'bad-time', 'type': 'lesson_completed', 'course_id': self.course.id,
+             'lesson_id': self.lessons[1].id, 'time_spent': '5'},
+            {'idempotency_key': 'good', 'type': 'lesson_completed', 'course_id': self.course.id,
+             'lesson_id': self.lessons[0].id, 'time_spent': 5}
+        ]
+        status, data = self.sync(events)
+        self.assertEqual(status, 200)
+        self.assertEqual(data['data']['applied'], ['good'])
+        self.assertEqual([r['idempotency_key'] for r in data['data']['rejected']], ['bad-answers', 'bad-time'])
+        self.assertIn('answers must be a list', data['data']['rejected'][0]['reason'])
+
+    def test_parse_event_converts_offset_to_utc(self):
+        """Test that a client timestamp with a non-UTC offset is converted, not truncated"""
+        event = parse_event({'idempotency_key': 'ist', 'type': 'lesson_completed', 'course_id': 'c',
+                             'lesson_id': 'l', 'occurred_at': '2024-05-01T10:00:00+05:30'})
+        self.assertEqual(event['occurred_at'], datetime(2024, 5, 1, 4, 30))
+        self.assertIsNone(event['occurred_at'].tzinfo)
+
+        event = parse_event({'idempotency_key': 'naive', 'type': 'lesson_completed', 'course_id': 'c',
+                             'lesson_id': 'l', 'occurred_at': '2024-05-01T10:00:00'})
+        self.assertEqual(event['occurred_at'], datetime(2024, 5, 1, 10, 0))
+
+    def test_sync_unauthorized(self):
+        """Test syncing without authentication"""
+        response = self.app.post('/api/sync/progress', data=json.dumps({'events': []}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+if __name__ == '__main__':
+    unittest.main()
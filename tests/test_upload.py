@@ -3,13 +3,24 @@ import json
 import os
 import sys
 import io
+import shutil
+import tempfile
+import uuid
 from datetime import datetime
+from unittest.mock import patch
+from bson import ObjectId
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from flask_jwt_extended import create_access_token
 from app import app
 from models.user import User
+from models.course import courses_collection
+from models.upload import UploadBlob
+from services.storage import LocalStorage, upload_storage
+from services.images import image_pipeline
+from services.resumable import ResumableUploads, UploadSessionError, resumable_uploads
 
 class TestUploadAPI(unittest.TestCase):
     """Test cases for upload API endpoints"""
@@ -390,5 +401,324 @@ class TestUploadAPI(unittest.TestCase):
         self.assertEqual(data['status'], 'error')
         self.assertIn('required', data['message'])
 
+class TestLocalStorage(unittest.TestCase):
+    """Test cases for the local filesystem storage backend"""
+
+    def setUp(self):
+        """Point the upload storage at a temporary directory"""
+        self.app = app.test_client()
+        self.root = tempfile.mkdtemp()
+        self.storage = LocalStorage(root=self.root, chunk_size=4)
+        self.previous_backend = upload_storage.backend
+        upload_storage.set_backend(self.storage)
+        with app.app_context():
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity="storage-test-user")}'}
+
+    def tearDown(self):
+        """Restore the storage backend and remove stored files"""
+        upload_storage.set_backend(self.previous_backend)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_save_writes_sharded_file_in_chunks(self):
+        """Test that a saved object lands in a sharded directory with no partial files left"""
+        result = self.storage.save(io.BytesIO(b'course material bytes'), 'course-materials/notes.pdf')
+
+        prefix, first, second, filename = result['public_id'].split('/')
+        self.assertEqual((prefix, filename), ('course-materials', 'notes.pdf'))
+        self.assertEqual((len(first), len(second)), (2, 2))
+        self.assertEqual(result['bytes'], 21)
+        self.assertEqual(result['secure_url'], f"/api/upload/files/{result['public_id']}")
+        with open(self.storage.path(result['public_id']), 'rb') as stored:
+            self.assertEqual(stored.read(), b'course material bytes')
+        directory = os.path.dirname(self.storage.path(result['public_id']))
+        self.assertEqual(os.listdir(directory), ['notes.pdf'])
+
+    def test_failed_save_leaves_no_file(self):
+        """Test that an interrupted stream does not leave a partial object behind"""
+        class BrokenStream:
+            def __init__(self):
+                self.reads = 0
+
+            def read(self, size):
+                self.reads += 1
+                if self.reads > 2:
+                    raise IOError('connection reset')
+                return b'data'
+
+        with self.assertRaises(IOError):
+            self.storage.save(BrokenStream(), 'certificates/broken.pdf')
+
+        leftovers = [files for _, _, files in os.walk(self.root) if files]
+        self.assertEqual(leftovers, [])
+
+    def test_path_rejects_traversal(self):
+        """Test that public ids cannot escape the storage root"""
+        self.assertIsNone(self.storage.path('../outside.txt'))
+        self.assertFalse(self.storage.delete('../outside.txt'))
+
+    def test_upload_serve_and_delete_round_trip(self):
+        """Test uploading a certificate, downloading it and deleting it offline"""
+        content = b'%PDF-1.4 test ' + uuid.uuid4().bytes
+        response = self.app.post('/api/upload/certificate',
+                                 data={'course_id': 'course-1', 'file': (io.BytesIO(content), 'cert.pdf')},
+                                 headers=self.headers,
+                                 content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)['data']
+        self.assertEqual(data['course_id'], 'course-1')
+        self.assertTrue(data['public_id'].startswith('certificates/'))
+
+        response = self.app.get(data['url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, content)
+        response.close()
+
+        response = self.app.delete('/api/upload/delete',
+                                   data=json.dumps({'public_id': data['public_id']}),
+                                   content_type='application/json',
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.app.get(data['url']).status_code, 404)
+
+    def user_headers(self, user_id):
+        with app.app_context():
+            return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+    def upload_certificate(self, content, headers=None):
+        response = self.app.post('/api/upload/certificate',
+                                 data={'course_id': 'course-1', 'file': (io.BytesIO(content), 'cert.pdf')},
+                                 headers=headers or self.headers,
+                                 content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)['data']
+
+    def delete(self, public_id, headers=None):
+        return self.app.delete('/api/upload/delete',
+                               data=json.dumps({'public_id': public_id}),
+                               content_type='application/json',
+                               headers=headers or self.headers)
+
+    def test_identical_uploads_share_one_blob(self):
+        """Test that re-uploading identical content reuses the stored object until its last reference goes"""
+        other_headers = self.user_headers('storage-test-other-user')
+        content = b'%PDF-1.4 dedup ' + uuid.uuid4().bytes
+        first = self.upload_certificate(content)
+        second = self.upload_certificate(content, other_headers)
+
+        self.assertFalse(first['deduplicated'])
+        self.assertTrue(second['deduplicated'])
+        self.assertEqual(first['public_id'], second['public_id'])
+        self.assertEqual(UploadBlob.find_by_public_id(first['public_id'])['refs'], 2)
+        stored = [files for _, _, files in os.walk(self.root) if files]
+        self.assertEqual(len(stored), 1)
+
+        self.assertEqual(self.delete(first['public_id']).status_code, 200)
+        self.assertEqual(self.app.get(first['url']).status_code, 200)
+
+        # Repeating the delete cannot drop the other user's reference
+        self.assertEqual(self.delete(first['public_id']).status_code, 403)
+        self.assertEqual(self.app.get(first['url']).status_code, 200)
+
+        self.assertEqual(self.delete(first['public_id'], other_headers).status_code, 200)
+        self.assertIsNone(UploadBlob.find_by_public_id(first['public_id']))
+        self.assertEqual(self.app.get(first['url']).status_code, 404)
+
+    def test_delete_rejects_other_users_files(self):
+        """Test that files outside the blob index can only be deleted by the user they belong to"""
+        self.storage.save(io.BytesIO(b'avatar'), 'avatars/someone-else_abc_300.jpg')
+        public_id = self.storage.locate('avatars/someone-else_abc_300.jpg')
+
+        self.assertEqual(self.delete(public_id).status_code, 403)
+        self.assertEqual(self.delete(public_id, self.user_headers('someone-else')).status_code, 200)
+        self.assertEqual(self.delete(public_id, self.user_headers('someone-else')).status_code, 404)
+
+    def test_legacy_course_material_deletable_by_course_creator(self):
+        """Test that course materials named by course id can be deleted by the course's creator"""
+        creator_id = str(ObjectId())
+        course_id = str(courses_collection.insert_one({'title': 'Legacy course', 'created_by': creator_id}).inserted_id)
+        self.addCleanup(courses_collection.delete_one, {'_id': ObjectId(course_id)})
+        self.storage.save(io.BytesIO(b'notes'), f'course-materials/{course_id}_document_abc.pdf')
+        public_id = self.storage.locate(f'course-materials/{course_id}_document_abc.pdf')
+
+        self.assertEqual(self.delete(public_id).status_code, 403)
+        self.assertEqual(self.delete(public_id, self.user_headers(creator_id)).status_code, 200)
+        self.assertEqual(self.delete(public_id, self.user_headers(creator_id)).status_code, 404)
+
+    def test_resumable_upload_survives_interruption(self):
+        """Test creating a session, resuming from the reported offset and finalizing"""
+        content = b'%PDF-1.4 large material ' + uuid.uuid4().bytes * 4
+        response = self.app.post('/api/upload/sessions',
+                                 data=json.dumps({'course_id': 'course-1', 'filename': 'guide.pdf',
+                                                  'size': len(content)}),
+                                 content_type='application/json',
+                                 headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        location = response.headers['Location']
+        self.assertEqual(response.headers['Upload-Offset'], '0')
+
+        def patch(offset, chunk):
+            return self.app.patch(location, data=chunk,
+                                  content_type='application/offset+octet-stream',
+                                  headers={**self.headers, 'Upload-Offset': str(offset)})
+
+        self.assertEqual(patch(0, content[:30]).status_code, 200)
+
+        # A client that lost the acknowledgement asks where to resume
+        response = self.app.head(location, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Upload-Offset'], '30')
+        self.assertEqual(response.headers['Upload-Length'], str(len(content)))
+
+        response = patch(0, content[:30])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.headers['Upload-Offset'], '30')
+
+        response = patch(30, content[30:])
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)['data']
+        self.assertEqual(data['status'], 'complete')
+        self.assertEqual(data['course_id'], 'course-1')
+
+        response = self.app.get(data['url'])
+        self.assertEqual(response.data, content)
+        response.close()
+        self.assertEqual(patch(len(content), b'x').status_code, 409)
+        self.assertFalse(os.path.exists(resumable_uploads._path(data['upload_id'])))
+
+    def test_resumable_chunk_cannot_exceed_declared_size(self):
+        """Test that bytes beyond the declared length are rejected and discarded"""
+        uploads = ResumableUploads(folder=self.root)
+        session = uploads.create('storage-test-user', 'notes.pdf', 10)
+
+        with self.assertRaises(UploadSessionError) as context:
+            uploads.write_chunk(session, 0, io.BytesIO(b'x' * 11))
+
+        self.assertEqual(context.exception.status, 413)
+        self.assertEqual(os.path.getsize(uploads._path(session['_id'])), 0)
+
+    def test_concurrent_chunk_cannot_touch_staging_file(self):
+        """Test that a chunk arriving while another holds the write lease is rejected before writing"""
+        uploads = ResumableUploads(folder=self.root)
+        session = uploads.create('storage-test-user', 'notes.pdf', 10)
+        uploads.write_chunk(session, 0, io.BytesIO(b'abcd'))
+        session = uploads.get(session['_id'], 'storage-test-user')
+        uploads._claim(session['_id'], {})
+
+        with self.assertRaises(UploadSessionError) as context:
+            uploads.write_chunk(session, 4, io.BytesIO(b'efgh'))
+
+        self.assertEqual(context.exception.status, 409)
+        with open(uploads._path(session['_id']), 'rb') as staged:
+            self.assertEqual(staged.read(), b'abcd')
+
+    def test_finalize_that_lost_its_lease_conflicts(self):
+        """Test that a finalize whose lease expired while storing returns 409 and keeps the staging file"""
+        uploads = ResumableUploads(folder=self.root)
+        session = uploads.create('storage-test-user', 'notes.pdf', 4)
+        uploads.write_chunk(session, 0, io.BytesIO(b'abcd'))
+        session = uploads.get(session['_id'], 'storage-test-user')
+
+        def store(staged):
+            # Another finalize takes over once the lease runs out
+            uploads.collection.update_one({'_id': session['_id']}, {'$set': {'lease': 'retry'}})
+            return {'public_id': 'course-materials/notes.pdf'}
+
+        with self.assertRaises(UploadSessionError) as context:
+            uploads.complete(session, store)
+
+        self.assertEqual(context.exception.status, 409)
+        self.assertTrue(os.path.isfile(uploads._path(session['_id'])))
+
+    def test_failed_finalize_can_be_retried(self):
+        """Test that a storage failure on the last chunk leaves the upload finalizable"""
+        content = b'%PDF-1.4 retry ' + uuid.uuid4().bytes
+        response = self.app.post('/api/upload/sessions',
+                                 data=json.dumps({'course_id': 'course-1', 'filename': 'guide.pdf',
+                                                  'size': len(content)}),
+                                 content_type='application/json',
+                                 headers=self.headers)
+        location = response.headers['Location']
+
+        with patch.object(upload_storage, 'save_content', side_effect=IOError('storage unavailable')):
+            response = self.app.patch(location, data=content,
+                                      content_type='application/offset+octet-stream',
+                                      headers={**self.headers, 'Upload-Offset': '0'})
+        self.assertEqual(response.status_code, 500)
+
+        response = self.app.get(location, headers=self.headers)
+        self.assertEqual(json.loads(response.data)['data']['status'], 'uploaded')
+
+        response = self.app.post(f'{location}/complete', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)['data']
+        self.assertEqual(data['status'], 'complete')
+        response = self.app.get(data['url'])
+        self.assertEqual(response.data, content)
+        response.close()
+
+    def make_jpeg(self, size=(800, 600)):
+        """Create an in-memory JPEG carrying an EXIF camera tag"""
+        from PIL import Image
+        exif = Image.Exif()
+        exif[0x010F] = 'Test Camera'
+        image = io.BytesIO()
+        Image.new('RGB', size, (40, 160, 60)).save(image, 'JPEG', exif=exif)
+        image.seek(0)
+        return image
+
+    def test_avatar_variants_are_processed_in_background(self):
+        """Test that an avatar returns variant URLs at once and they are stored EXIF-free"""
+        from PIL import Image
+        response = self.app.post('/api/upload/avatar',
+                                 data={'file': (self.make_jpeg(), 'me.jpg')},
+                                 headers=self.headers,
+                                 content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 202)
+        data = json.loads(response.data)['data']
+        self.assertTrue(data['processing'])
+        self.assertEqual(set(data['variants']), {'300.webp', '300.jpg', 'thumbnail.jpg'})
+
+        image_pipeline.wait(timeout=30)
+
+        response = self.app.get(data['variants']['300.jpg'])
+        self.assertEqual(response.status_code, 200)
+        with Image.open(io.BytesIO(response.data)) as avatar:
+            self.assertEqual(avatar.size, (300, 300))
+            self.assertEqual(len(avatar.getexif()), 0)
+        response.close()
+        for url in (data['variants']['300.webp'], data['variants']['thumbnail.jpg']):
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            response.close()
+
+    def test_deleting_avatar_removes_every_variant(self):
+        """Test that the returned avatar id deletes the stored file and all of its variants"""
+        response = self.app.post('/api/upload/avatar',
+                                 data={'file': (self.make_jpeg(), 'me.jpg')},
+                                 headers=self.headers,
+                                 content_type='multipart/form-data')
+        data = json.loads(response.data)['data']
+        image_pipeline.wait(timeout=30)
+        self.assertEqual(data['url'], self.storage.url(data['public_id']))
+
+        self.assertEqual(self.delete(data['public_id'], self.user_headers('someone-else')).status_code, 403)
+        self.assertEqual(self.delete(data['public_id']).status_code, 200)
+        for url in data['variants'].values():
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 404)
+            response.close()
+        self.assertEqual(self.delete(data['public_id']).status_code, 404)
+
+    def test_avatar_rejects_non_image(self):
+        """Test that a file without an image header is rejected before queueing"""
+        response = self.app.post('/api/upload/avatar',
+                                 data={'file': (io.BytesIO(b'not an image'), 'me.jpg')},
+                                 headers=self.headers,
+                                 content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 400)
+
 if __name__ == '__main__':
     unittest.main()
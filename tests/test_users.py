@@ -7,8 +7,12 @@ from datetime import datetime
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from bson import ObjectId
 from app import app
-from models.user import User
+from models.user import User, users_collection
+from models.learning_event import LearningEvent, learning_events_collection
+from models.progress import user_progress_collection
+from services.identity import UserCache, user_cache
 
 class TestUsersAPI(unittest.TestCase):
     """Test cases for users API endpoints"""
@@ -350,5 +354,60 @@ class TestUsersAPI(unittest.TestCase):
         self.assertEqual(data['status'], 'error')
         self.assertIn('not found', data['message'])
 
+class TestUserCache(unittest.TestCase):
+    """Test cases for the per-worker user identity cache"""
+
+    def setUp(self):
+        """Create a user to look up"""
+        self.user = User(name='Cached Farmer', email='cached-farmer@example.com').save()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for collection in (learning_events_collection, user_progress_collection):
+            collection.delete_many({'user_id': self.user.id})
+        self.user.delete()
+
+    def test_repeat_lookups_hit_cache(self):
+        """Test a second lookup is served without reading the database"""
+        before = user_cache.stats()
+        User.find_by_id(self.user.id)
+        users_collection.update_one({'_id': ObjectId(self.user.id)}, {'$set': {'name': 'Changed Behind Cache'}})
+        self.assertEqual(User.find_by_id(self.user.id).name, 'Cached Farmer')
+        after = user_cache.stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+    def test_cached_copies_are_independent(self):
+        """Test mutating a returned user does not change the cached record"""
+        User.find_by_id(self.user.id).learning_stats['knowledge_points'] = 999
+        self.assertEqual(User.find_by_id(self.user.id).learning_stats['knowledge_points'], 0)
+
+    def test_writes_invalidate(self):
+        """Test saves, stat projections and deletes invalidate the cached record"""
+        User.find_by_id(self.user.id)
+        self.user.update_settings({'language': 'hi'})
+        self.assertEqual(User.find_by_id(self.user.id).settings['language'], 'hi')
+
+        LearningEvent.record(self.user.id, 'quiz_submitted', quiz_id='q1', points=7)
+        self.assertEqual(User.find_by_id(self.user.id).learning_stats['knowledge_points'], 7)
+
+        self.user.delete()
+        self.assertIsNone(User.find_by_id(self.user.id))
+
+    def test_ttl_and_eviction(self):
+        """Test entries expire after the TTL and the LRU bound is enforced"""
+        cache = UserCache(max_size=2, ttl_seconds=0)
+        loads = []
+        loader = lambda user_id: loads.append(user_id) or {'_id': user_id}
+        cache.get_or_load('a', loader)
+        cache.get_or_load('a', loader)
+        self.assertEqual(loads, ['a', 'a'])
+
+        cache = UserCache(max_size=2, ttl_seconds=60)
+        for user_id in ('a', 'b', 'c'):
+            cache.get_or_load(user_id, loader)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
 if __name__ == '__main__':
     unittest.main()